@@ -0,0 +1,345 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Compares masked copies of a reference (as written by 'repeats --masked-fasta', with
+# masked bases replaced by Xs), reporting how many bases are masked in both, either or
+# neither, and writing out the intervals masked only in the first file, only in the
+# second, or in both.
+# Run from the src directory as:
+#
+#     python -m QC.compare <mask> <mask> [<mask> ...] [--against <mask> [<mask> ...]]
+#
+# Without --against, every pair of masks given is compared; with it, every mask before
+# --against is compared with every mask after it. Each file is read only once.
+
+
+import os
+import argparse
+import itertools
+
+import numpy as np
+
+from masks import format_intervals
+
+
+BUFFER_SIZE = 2 ** 20
+
+# Bytes of each file scanned for records, and bases of each chromosome compared, at a time
+CHUNK_SIZE = 2 ** 24
+
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+HEADER = ord(">")
+MASKED = ord("X")
+
+# Run states, as 'masked in first' + 2 * 'masked in second'
+ONLY_FIRST = 1
+ONLY_SECOND = 2
+BOTH = 3
+
+INTERVAL_SUFFIXES = {ONLY_FIRST: "_only_f1", ONLY_SECOND: "_only_f2", BOTH: "_overlaps"}
+
+
+class MaskedReference(object):
+
+	"""
+	A memory-mapped masked reference FASTA, indexed by the byte ranges of its records.
+	"""
+
+	def __init__(self, path, chunk_size = CHUNK_SIZE):
+
+		self.path = path
+
+		if os.path.getsize(path) == 0:
+			self.data = np.zeros(0, dtype = np.uint8)
+		else:
+			self.data = np.memmap(path, dtype = np.uint8, mode = "r")
+
+		(headers, header_ends) = self.find_headers(chunk_size)
+
+		self.names = [self.data[start + 1:end].tostring().rstrip("\r")
+			for (start, end) in zip(headers, header_ends)]
+		self.sequence_starts = [end + 1 for end in header_ends]
+		self.sequence_ends = headers[1:] + [len(self.data)]
+
+
+	def find_headers(self, chunk_size):
+
+		"""
+		Scans the file in chunks of chunk_size bytes, and returns lists of the positions of
+		the '>' starting each header line and of the end of each of those lines.
+		"""
+
+		headers = []
+		header_ends = []
+		line_start = 0
+
+		for chunk_start in xrange(0, len(self.data), chunk_size):
+			chunk_end = min(chunk_start + chunk_size, len(self.data))
+			line_ends = np.flatnonzero(self.data[chunk_start:chunk_end] == NEWLINE) + \
+				chunk_start
+			if chunk_end == len(self.data) and self.data[-1] != NEWLINE:
+				line_ends = np.append(line_ends, len(self.data))
+			if len(line_ends) == 0:
+				continue
+
+			starts = np.concatenate(([line_start], line_ends[:-1] + 1))
+			line_start = int(line_ends[-1]) + 1
+
+			# Only a '>' at the start of a line begins a record
+			is_header = np.zeros(len(starts), dtype = bool)
+			non_empty = line_ends > starts
+			is_header[non_empty] = self.data[starts[non_empty]] == HEADER
+			headers.extend(starts[is_header].tolist())
+			header_ends.extend(line_ends[is_header].tolist())
+
+		return (headers, header_ends)
+
+
+	def masked_blocks(self, index, block_size = CHUNK_SIZE):
+
+		"""
+		Yields boolean arrays which are True at each masked base of the indexth record, for
+		block_size bases at a time (the last block may be shorter).
+		"""
+
+		pending = []
+		pending_size = 0
+
+		for chunk_start in xrange(self.sequence_starts[index], self.sequence_ends[index],
+			block_size):
+			chunk_end = min(chunk_start + block_size, self.sequence_ends[index])
+			sequence = self.data[chunk_start:chunk_end]
+			pending.append(sequence[(sequence != NEWLINE) & (sequence != CARRIAGE_RETURN)]
+				== MASKED)
+			pending_size += len(pending[-1])
+
+			if pending_size >= block_size:
+				masked = np.concatenate(pending)
+				pending = [masked[block_size:]]
+				pending_size -= block_size
+				yield masked[:block_size]
+
+		if pending_size > 0:
+			yield np.concatenate(pending)
+
+		return
+
+
+def mask_runs(first_masked, second_masked):
+
+	"""
+	Returns arrays (states, starts, ends) describing each maximal run of bases with the same
+	state (see ONLY_FIRST etc.), with 0-based starts and exclusive ends.
+	"""
+
+	states = first_masked.view(np.int8) + 2 * second_masked.view(np.int8)
+	if len(states) == 0:
+		empty = np.zeros(0, dtype = np.int64)
+		return (states, empty, empty)
+
+	changes = np.flatnonzero(states[1:] != states[:-1]) + 1
+	starts = np.concatenate(([0], changes))
+	ends = np.concatenate((changes, [len(states)]))
+
+	return (states[starts], starts, ends)
+
+
+class Comparison(object):
+
+	"""
+	Running totals for one pair of masks. Bases are 'agree' if masked in both; the interval
+	counts are the number of maximal runs masked only in first, only in second, or in both.
+	"""
+
+	def __init__(self, first_path, second_path, out_dir = None):
+
+		self.first_path = first_path
+		self.second_path = second_path
+
+		self.agree = 0
+		self.only_first = 0
+		self.only_second = 0
+		self.total = 0
+		self.interval_counts = dict((state, 0) for state in INTERVAL_SUFFIXES)
+
+		# [state, start, end] of the last run of the chromosome being added, which may
+		# continue into its next block
+		self.open_run = None
+
+		if out_dir is None:
+			out_dir = os.path.dirname(first_path)
+		out_prefix = os.path.join(out_dir, os.path.basename(first_path) + "_x_" + \
+			os.path.basename(second_path))
+		self.out_paths = dict((state, out_prefix + suffix)
+			for (state, suffix) in INTERVAL_SUFFIXES.items())
+		self.out_files = {}
+
+
+	def open(self):
+
+		self.out_files = dict((state, open(path, "w", BUFFER_SIZE))
+			for (state, path) in self.out_paths.items())
+
+
+	def close(self):
+
+		for out_file in self.out_files.values():
+			out_file.close()
+
+
+	def add_block(self, name, offset, first_masked, second_masked):
+
+		"""
+		Adds the next block of bases of chromosome 'name', which starts 'offset' bases into
+		it. end_chromosome must be called once the whole chromosome has been added.
+		"""
+
+		both = np.count_nonzero(first_masked & second_masked)
+		self.agree += both
+		self.only_first += np.count_nonzero(first_masked) - both
+		self.only_second += np.count_nonzero(second_masked) - both
+		self.total += len(first_masked)
+
+		(states, starts, ends) = mask_runs(first_masked, second_masked)
+		if len(states) == 0:
+			return
+		starts += offset
+		ends += offset
+
+		# A run still open from the previous block either carries on into this one, or
+		# ended with it
+		if self.open_run is not None:
+			if self.open_run[0] == states[0]:
+				starts[0] = self.open_run[1]
+			else:
+				self.write_runs(name, *[np.array([x]) for x in self.open_run])
+
+		self.open_run = [states[-1], starts[-1], ends[-1]]
+		self.write_runs(name, states[:-1], starts[:-1], ends[:-1])
+
+		return
+
+
+	def end_chromosome(self, name):
+
+		if self.open_run is not None:
+			self.write_runs(name, *[np.array([x]) for x in self.open_run])
+		self.open_run = None
+
+		return
+
+
+	def write_runs(self, name, states, starts, ends):
+
+		for (state, out_file) in self.out_files.items():
+			selected = states == state
+			self.interval_counts[state] += np.count_nonzero(selected)
+			out_file.write(format_intervals(name, starts[selected], ends[selected]))
+
+		return
+
+
+	def summary(self):
+
+		return ("Agree: %d\nIn f1 but not f2: %d\nIn f2 but not f1: %d\n\nTotal bases: %d\n\n"
+			% (self.agree, self.only_first, self.only_second, self.total)) + \
+			("overlap: %d\nf1: %d\nf2: %d\n\n" % (self.interval_counts[BOTH],
+			self.interval_counts[ONLY_FIRST], self.interval_counts[ONLY_SECOND]))
+
+
+def compare_masks(pairs, out_dir = None, block_size = CHUNK_SIZE):
+
+	"""
+	Compares each (first, second) pair of masked reference paths in 'pairs', writing the
+	only_f1, only_f2 and overlaps interval files for each pair, and returns a list of the
+	Comparisons in the same order. All masks must be of the same reference. Every mask is
+	memory-mapped once, and each of its chromosomes decoded once however many pairs it is
+	in, block_size bases at a time, so only one block of each mask is held in memory.
+	"""
+
+	paths = sorted(set(path for pair in pairs for path in pair))
+	masks = dict((path, MaskedReference(path)) for path in paths)
+
+	names = masks[paths[0]].names
+	for path in paths[1:]:
+		if masks[path].names != names:
+			raise Exception("Discrepancy in chromosome names between " + paths[0] + " and " +
+				path + " (files should be masks of the same reference)")
+
+	comparisons = [Comparison(first, second, out_dir) for (first, second) in pairs]
+	try:
+		for comparison in comparisons:
+			comparison.open()
+
+		for (index, name) in enumerate(names):
+			offset = 0
+			for blocks in itertools.izip_longest(*[masks[path].masked_blocks(index,
+				block_size) for path in paths]):
+				lengths = set(-1 if x is None else len(x) for x in blocks)
+				if len(lengths) > 1:
+					raise Exception("Discrepancy in length of chromosome " + name +
+						" between masks")
+
+				masked = dict(zip(paths, blocks))
+				for comparison in comparisons:
+					comparison.add_block(name, offset, masked[comparison.first_path],
+						masked[comparison.second_path])
+				offset += len(blocks[0])
+
+			for comparison in comparisons:
+				comparison.end_chromosome(name)
+	finally:
+		for comparison in comparisons:
+			comparison.close()
+
+	return comparisons
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description = "Compare masked copies of a reference")
+	parser.add_argument("masks", type = str, nargs = "+", help = "masked reference FASTAs")
+	parser.add_argument("--against", type = str, nargs = "+", default = [],
+		help = "compare every mask given before this option with every one given after it")
+	parser.add_argument("-o", "--out-dir", type = str, default = None,
+		help = "directory for interval files (default: alongside the first mask of each pair)")
+	args = parser.parse_args()
+
+	if args.against != []:
+		pairs = [(first, second) for first in args.masks for second in args.against]
+	elif len(args.masks) >= 2:
+		pairs = [(args.masks[i], args.masks[j]) for i in xrange(len(args.masks))
+			for j in xrange(i + 1, len(args.masks))]
+	else:
+		parser.error("At least two masks are required")
+
+	for comparison in compare_masks(pairs, args.out_dir):
+		if len(pairs) > 1:
+			print comparison.first_path, "vs", comparison.second_path
+		print comparison.summary(),
+
+	return
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,108 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Extracts the reference sequence at each location in a file of masked intervals (such as
+# the only_f1, only_f2 and overlaps files written by QC.compare), writing it to stdout in
+# FASTA format. Run from the src directory as:
+#
+#     python -m QC.extract_from_mask <reference> <location file> [-m min_length]
+#
+# Locations may be in any order; the reference is indexed (see fasta_index) rather than
+# scanned, and the index is cached next to it for later runs.
+
+
+import sys
+import argparse
+
+from fasta_index import IndexedFasta
+
+
+BUFFER_SIZE = 2 ** 20
+
+# Shorter locations are not written out
+DEFAULT_MIN_LENGTH = 100
+
+
+def read_locations(location_path):
+
+	"""
+	Generator which yields batches of (name, start, end) tuples, with 1-based inclusive
+	coordinates, from a file with one location per line.
+	"""
+
+	with open(location_path, "r") as f:
+		while True:
+			lines = f.readlines(BUFFER_SIZE)
+			if lines == []:
+				break
+
+			batch = []
+			for line in lines:
+				fields = line.split()
+				if fields == []:
+					continue
+				(start, end) = (int(fields[1]), int(fields[2]))
+				if end < start:
+					raise Exception("End point of location cannot be smaller than start point")
+				batch.append((fields[0], start, end))
+			yield batch
+
+
+def extract_locations(reference_path, location_path, out_file,
+	min_length = DEFAULT_MIN_LENGTH):
+
+	"""
+	Writes each location in 'location_path' at least min_length bases long to out_file
+	as a FASTA record named '<chromosome>_<start>_<end>'. Locations are looked up a batch
+	at a time.
+	"""
+
+	with IndexedFasta(reference_path) as reference:
+		for batch in read_locations(location_path):
+			selected = [(name, start, end) for (name, start, end) in batch
+				if end - start + 1 >= min_length]
+			sequences = reference.fetch_many((name, start - 1, end)
+				for (name, start, end) in selected)
+			out_file.write("".join(">%s_%d_%d\n%s\n" % (name, start, end, sequence)
+				for ((name, start, end), sequence) in zip(selected, sequences)))
+
+	return
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description = "Extract the reference sequence at each \
+		masked location")
+	parser.add_argument("reference", type = str, help = "reference FASTA")
+	parser.add_argument("locations", type = str,
+		help = "file of '<chromosome> <start> <end>' lines (1-based, inclusive)")
+	parser.add_argument("-m", "--min-length", type = int, default = DEFAULT_MIN_LENGTH,
+		help = "shortest location to extract (default: %d)" % DEFAULT_MIN_LENGTH)
+	args = parser.parse_args()
+
+	extract_locations(args.reference, args.locations, sys.stdout, args.min_length)
+
+	return
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,152 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+BUFFER_SIZE = 2 ** 20
+
+# Mapping quality of the alignments kept from the reference shred map
+SHRED_MAPPING_QUALITY = "00"
+
+
+class Alignment(object):
+
+	"""
+	A single alignment line of Smalt's SSAHA output format:
+
+	    <label> <score> <query> <subject> <query start> <query end> <subject start> 
+	        <subject end> <strand> <length> <identity> <query length>
+
+	where the label has the form 'alignment:<type>:<mapping quality>'. Subject (chromosome)
+	names and strands are interned, so that every record aligned to the same chromosome 
+	shares a single string. The tokens of the line are kept as they were read (including 
+	any after the twelfth), and are what fields returns.
+	"""
+
+	__slots__ = ("tokens", "label", "score", "query", "subject", "query_start", "query_end", 
+		"subject_start", "subject_end", "strand", "length", "identity", "query_length")
+
+	def __init__(self, fields):
+
+		if len(fields) < 12:
+			raise Exception("Malformed SSAHA alignment: " + " ".join(fields))
+
+		fields[0] = intern(fields[0])
+		fields[3] = intern(fields[3])
+		fields[8] = intern(fields[8])
+		self.tokens = fields
+
+		self.label = fields[0]
+		self.score = int(fields[1])
+		self.query = fields[2]
+		self.subject = fields[3]
+		self.query_start = int(fields[4])
+		self.query_end = int(fields[5])
+		self.subject_start = int(fields[6])
+		self.subject_end = int(fields[7])
+		self.strand = fields[8]
+		self.length = int(fields[9])
+		self.identity = float(fields[10])
+		self.query_length = int(fields[11])
+
+
+	@property
+	def mapping_quality(self):
+
+		return self.label[self.label.rindex(":") + 1:]
+
+
+	def fields(self):
+
+		return list(self.tokens)
+
+
+def read_alignments(map_path, mapping_quality = None):
+
+	"""
+	Generator which streams the alignments in the Smalt SSAHA-format file at 'map_path', 
+	yielding an Alignment for each one. Lines which are not alignments are skipped, as are 
+	alignments whose mapping quality differs from 'mapping_quality' (if given). Only one 
+	line is held in memory at a time, however large the file.
+	"""
+
+	with open(map_path, "r", BUFFER_SIZE) as f:
+		for line in f:
+			if line[:10].lower() != "alignment:":
+				continue
+
+			fields = line.split()
+			if mapping_quality is not None and \
+				fields[0][fields[0].rindex(":") + 1:] != mapping_quality:
+				continue
+
+			yield Alignment(fields)
+
+
+def format_alignment(alignment):
+
+	"""
+	Returns an alignment as a line in the column layout of the shred repeat files.
+	"""
+
+	fields = alignment.fields()
+
+	return " ".join(fields[:3]) + " " + " ".join(x.rjust(10) for x in fields[3:8]) + " " + \
+		" ".join(fields[8:]) + "\n"
+
+
+def write_repeat_runs(alignments, max_peak, out_path_for_n):
+
+	"""
+	Makes a single pass over 'alignments' (an iterable of Alignments, in the order in which
+	they were output by the aligner), finding each run of consecutive alignments of the 
+	same query. The alignments in each run of length n, for n from 2 to max_peak, are 
+	written to the file at out_path_for_n(n). Every such file is created, even if empty.
+	"""
+
+	out_files = dict((n, open(out_path_for_n(n), "w", BUFFER_SIZE))
+		for n in xrange(2, max_peak + 1))
+
+	def write_run(run, run_length):
+		if run_length in out_files:
+			out_files[run_length].write("".join(format_alignment(alignment) 
+				for alignment in run))
+
+	try:
+		run = []
+		run_length = 0
+		for alignment in alignments:
+			if run_length > 0 and alignment.query != run[0].query:
+				write_run(run, run_length)
+				run = []
+				run_length = 0
+
+			# Runs longer than max_peak are never written, so need not be kept
+			run_length += 1
+			if run_length <= max_peak:
+				run.append(alignment)
+
+		write_run(run, run_length)
+
+	finally:
+		for out_file in out_files.values():
+			out_file.close()
+
+	return
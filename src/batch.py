@@ -0,0 +1,214 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Runs many samples from a manifest, each line of which names a sample and gives the
+# command line main.py would be run with for it, e.g.
+#
+#     # name      subcommand  path             k values  options
+#     sample_1    size        reads/s1.fastq   21 31     -p 4
+#     sample_2    repeats     reads/s2.fastq   31 4      -p 8 -r ref.fasta
+#
+# Relative paths are taken relative to the directory holding the manifest. Each sample is
+# run in a process forked from the batch (so nothing is imported or read again), in an
+# output directory of its own.
+
+
+import os
+import sys
+import math
+import json
+import time
+import shlex
+import multiprocessing
+from collections import namedtuple
+
+from hist_cache import atomic_write
+from scheduler import plan_jobs, run_within_limits
+from inputs import input_extension, PATH_SEPARATOR
+
+
+Sample = namedtuple("Sample", ["name", "argv", "args", "out_dir"])
+
+# Bits Jellyfish uses for each count stored in its hash (its default --counter-len)
+JELLYFISH_COUNTER_BITS = 7
+
+# Files written to each sample's output directory
+LOG_NAME = "log.txt"
+REPORT_NAME = "run_report.json"
+
+SUMMARY_NAME = "batch_summary.json"
+
+
+def read_manifest(manifest_path, parse_args, out_dir):
+
+	"""
+	Returns a list of Samples, one for each line of the manifest stored at 'manifest_path'
+	(see above), using parse_args(argv) to parse the command line given for each.
+	"""
+
+	manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+	samples = []
+	with open(manifest_path, "r") as manifest:
+		for (line_number, line) in enumerate(manifest, 1):
+			fields = shlex.split(line, comments = True)
+			if fields == []:
+				continue
+
+			(name, argv) = (fields[0], fields[1:])
+			if name in [sample.name for sample in samples]:
+				raise Exception("Sample " + name + " appears more than once in manifest " +
+					"(line " + str(line_number) + ")")
+			if argv == [] or argv[0] == "batch":
+				raise Exception("Line " + str(line_number) + " of manifest must give a " +
+					"subcommand other than batch")
+
+			try:
+				args = parse_args(argv)
+			except SystemExit:
+				raise Exception("Could not parse line " + str(line_number) + " of manifest")
+
+			# Each sample runs in its own directory, so paths must not depend on where it is
+			args.path = PATH_SEPARATOR.join(os.path.join(manifest_dir, path)
+				for path in args.path.split(PATH_SEPARATOR))
+			for option in ["reference", "report"]:
+				if getattr(args, option, "") != "":
+					setattr(args, option, os.path.join(manifest_dir, getattr(args, option)))
+
+			samples.append(Sample(name, argv, args, os.path.join(out_dir, name)))
+
+	return samples
+
+
+def jellyfish_memory(hash_size, k_size):
+
+	"""
+	Returns the approximate number of bytes used by the hash of a Jellyfish run counting
+	k-mers of length k_size with a hash of hash_size entries (which Jellyfish rounds up to
+	a power of 2). Each entry holds the k-mer, less the bits implied by its position in the
+	hash, and its count.
+	"""
+
+	size_bits = int(math.ceil(math.log(max(hash_size, 2), 2)))
+	entry_bits = max(2 * k_size - size_bits, 0) + JELLYFISH_COUNTER_BITS + 1
+
+	return (2 ** size_bits) * entry_bits // 8
+
+
+def sample_demand(args):
+
+	"""
+	Returns the (processors, bytes of memory) needed by a sample run with 'args'. Only
+	counting k-mers is taken to need much memory, so samples given as histograms need none.
+	"""
+
+	extension = input_extension(args.path)
+	if extension in ["hgram", "data", "dat"]:
+		return (args.processors, 0)
+
+	if args.counter == "native":
+		return (args.processors, args.native_memory * 1024 ** 2)
+
+	# Several k-mer sizes may be counted at once (see main.calculate_hists_dict)
+	(num_jobs, job_processors) = plan_jobs(len(args.k), args.processors, args.hash_size,
+		args.max_hash_total)
+
+	return (args.processors, num_jobs * max(jellyfish_memory(args.hash_size, k_size)
+		for k_size in args.k))
+
+
+def _run_sample(run, sample):
+
+	"""
+	Runs run(sample) in the sample's own directory, with all output (including that of any
+	processes it starts) going to its log. This is the body of each sample's process.
+	"""
+
+	os.chdir(sample.out_dir)
+	log = open(LOG_NAME, "a")
+	sys.stdout.flush()
+	sys.stderr.flush()
+	os.dup2(log.fileno(), sys.stdout.fileno())
+	os.dup2(log.fileno(), sys.stderr.fileno())
+
+	run(sample)
+
+
+class SampleProcess(object):
+
+	def __init__(self, run, sample):
+
+		if not os.path.isdir(sample.out_dir):
+			os.makedirs(sample.out_dir)
+
+		self.started = time.time()
+		self.process = multiprocessing.Process(target = _run_sample, args = (run, sample))
+		self.process.start()
+		print "Started sample " + sample.name
+
+
+	def poll(self):
+
+		"""
+		Returns None while the sample is running, and then a dict describing how it ended.
+		"""
+
+		exit_status = self.process.exitcode
+		if exit_status is None:
+			return None
+
+		self.process.join()
+
+		return {"exit_status": exit_status, "wall_seconds": time.time() - self.started}
+
+
+def run_batch(samples, run, out_dir, processors, memory_limit = 0):
+
+	"""
+	Runs run(sample) for each of 'samples' in a process of its own, running as many at
+	once as fit within 'processors' and memory_limit bytes (or any amount of memory if 0),
+	given the demands of each (see sample_demand). A sample which fails does not stop the
+	others. The outcome of each sample is saved in <out_dir>/batch_summary.json, and the
+	names of any which failed are returned.
+	"""
+
+	if not os.path.isdir(out_dir):
+		os.makedirs(out_dir)
+
+	summary = {}
+	for (sample, outcome) in run_within_limits(lambda sample: SampleProcess(run, sample),
+		samples, [sample_demand(sample.args) for sample in samples],
+		(processors, memory_limit)):
+
+		outcome.update({"command": sample.argv, "out_dir": sample.out_dir})
+		summary[sample.name] = outcome
+		if outcome["exit_status"] == 0:
+			print "Finished sample " + sample.name
+		else:
+			print "ERROR: sample " + sample.name + " failed with status " + \
+				str(outcome["exit_status"]) + " (see " + os.path.join(sample.out_dir,
+				LOG_NAME) + ")"
+
+		# Kept up to date, so that it shows progress while the batch is still running
+		atomic_write(os.path.join(out_dir, SUMMARY_NAME), json.dumps(summary, indent = 2,
+			sort_keys = True))
+
+	return sorted(name for (name, outcome) in summary.items() if outcome["exit_status"] != 0)
@@ -0,0 +1,194 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from hist_cache import file_content_hash, atomic_write
+
+
+MANIFEST_NAME = "pipeline_manifest.json"
+
+# Suffix of the temporary name each output of a stage is written to
+PARTIAL_SUFFIX = ".partial"
+
+
+def partial_path(path):
+
+	return path + PARTIAL_SUFFIX
+
+
+def file_identity(path):
+
+	stat = os.stat(path)
+
+	return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+class StageManifest(object):
+
+	"""
+	Records which stages of a pipeline have completed, so that an interrupted run can be
+	resumed from the last good stage. The manifest is a JSON file holding, for each
+	completed stage, a fingerprint of its inputs and parameters, and the size, modification
+	time and SHA-1 checksum of each of its outputs.
+
+	A stage is only skipped (when resuming) if it completed with the same fingerprint and
+	its outputs are unchanged since. The fingerprint of an input made by an earlier stage is
+	its recorded checksum, so a stage whose inputs were remade with different contents is
+	run again; other inputs (e.g. the reads) are identified by their path, size and
+	modification time.
+
+	The manifest is rewritten atomically whenever a stage completes, and stages may be run
+	from several threads at once.
+	"""
+
+	def __init__(self, path, resume = False):
+
+		self.path = path
+		self.resume = resume
+		self._lock = threading.Lock()
+
+		self.stages = {}
+		if os.path.isfile(path):
+			with open(path, "r") as f:
+				self.stages = json.load(f)["stages"]
+
+
+	def _save(self):
+
+		atomic_write(self.path, json.dumps({"stages": self.stages}, indent = 2,
+			sort_keys = True))
+
+
+	def _output_checksum(self, path):
+
+		"""
+		Returns the recorded checksum of 'path' if it is an unchanged output of a completed
+		stage, and None otherwise.
+		"""
+
+		if not os.path.isfile(path):
+			return None
+		identity = file_identity(path)
+
+		for record in self.stages.values():
+			output = record["outputs"].get(path)
+			if output is not None and output["size"] == identity["size"] and \
+				output["mtime"] == identity["mtime"]:
+				return output["sha1"]
+
+		return None
+
+
+	def fingerprint(self, inputs, parameters = None):
+
+		"""
+		Returns a digest identifying the files 'inputs' and the dict 'parameters' a stage
+		runs with.
+		"""
+
+		description = [parameters or {}]
+		with self._lock:
+			for path in inputs:
+				path = os.path.abspath(path)
+				checksum = self._output_checksum(path)
+				if checksum is not None:
+					description.append([path, "sha1", checksum])
+				elif os.path.isfile(path):
+					identity = file_identity(path)
+					description.append([path, "stat", identity["size"], identity["mtime"]])
+				else:
+					description.append([path, "missing"])
+
+		return hashlib.sha1(json.dumps(description, sort_keys = True)).hexdigest()
+
+
+	def is_complete(self, name, fingerprint):
+
+		with self._lock:
+			record = self.stages.get(name)
+			if record is None or record["fingerprint"] != fingerprint:
+				return False
+
+			for (path, output) in record["outputs"].items():
+				if not os.path.isfile(path):
+					return False
+				identity = file_identity(path)
+				if identity["size"] != output["size"] or identity["mtime"] != output["mtime"]:
+					return False
+
+		return True
+
+
+	def run(self, name, inputs, outputs, action, parameters = None):
+
+		"""
+		Runs the stage 'name', which reads the files 'inputs' and makes the files 'outputs',
+		unless resuming and it has already completed (see is_complete). Returns whether the
+		stage was run.
+
+		action is called with the list of temporary names (see partial_path) which the
+		outputs should be written to; each is moved into place once the action succeeds.
+		An action may instead move an output into place itself (as the shell scripts do),
+		but no output may be left only partly written under its final name.
+		"""
+
+		outputs = [os.path.abspath(path) for path in outputs]
+		fingerprint = self.fingerprint(inputs, parameters)
+
+		if self.resume and self.is_complete(name, fingerprint):
+			print "Skipping " + name + " (already completed)"
+			return False
+
+		with self._lock:
+			if name in self.stages:
+				del self.stages[name]
+				self._save()
+
+		# Anything left from an earlier attempt could otherwise be taken for this one's output
+		for path in outputs:
+			for stale_path in [path, partial_path(path)]:
+				if os.path.isfile(stale_path):
+					os.remove(stale_path)
+
+		action([partial_path(path) for path in outputs])
+
+		for path in outputs:
+			if os.path.isfile(partial_path(path)):
+				os.rename(partial_path(path), path)
+			elif not os.path.isfile(path):
+				raise Exception("Stage " + name + " did not make " + path)
+
+		record = {"fingerprint": fingerprint, "completed": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"outputs": {}}
+		for path in outputs:
+			record["outputs"][path] = dict(file_identity(path), sha1 = file_content_hash(path))
+
+		with self._lock:
+			self.stages[name] = record
+			self._save()
+
+		return True
@@ -0,0 +1,144 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import gzip
+import bz2
+import subprocess
+from contextlib import contextmanager
+from distutils.spawn import find_executable
+
+
+# The bytes each compressed format starts with
+MAGIC_NUMBERS = [("gzip", "\x1f\x8b"), ("bzip2", "BZh"), ("xz", "\xfd7zXZ\x00")]
+
+EXTENSIONS = {"gz": "gzip", "bz2": "bzip2", "xz": "xz"}
+
+# Programs which decompress each format to stdout, in order of preference
+DECOMPRESSORS = {"gzip": [["pigz", "-dc"], ["gzip", "-dc"]],
+	"bzip2": [["pbzip2", "-dc"], ["bzip2", "-dc"]], "xz": [["xz", "-dc"]]}
+
+
+def detect_compression(path):
+
+	"""
+	Returns the format ("gzip", "bzip2" or "xz") the file stored at 'path' is compressed in,
+	judged by its first few bytes, or None if it is not compressed.
+	"""
+
+	with open(path, "rb") as f:
+		start = f.read(max(len(magic) for (kind, magic) in MAGIC_NUMBERS))
+
+	for (kind, magic) in MAGIC_NUMBERS:
+		if start.startswith(magic):
+			return kind
+
+	return None
+
+
+def strip_compression_extension(path):
+
+	"""
+	Returns 'path' without any extension marking it as compressed (e.g. foo.dat.gz gives
+	foo.dat).
+	"""
+
+	(root, extension) = os.path.splitext(path)
+	if extension[1:] in EXTENSIONS:
+		return root
+
+	return path
+
+
+def base_extension(path):
+
+	"""
+	Returns the extension of the file name in 'path', ignoring any compression extension, so
+	that both foo.dat and foo.dat.gz give 'dat'.
+	"""
+
+	return strip_compression_extension(path).split("/")[-1].split(".")[-1]
+
+
+def decompress_command(kind):
+
+	"""
+	Returns the command (a list of arguments, to which the path of a file is added) of the
+	first installed program in DECOMPRESSORS able to decompress files compressed in the
+	format 'kind' to stdout, or None if none are installed.
+	"""
+
+	for command in DECOMPRESSORS[kind]:
+		if find_executable(command[0]) is not None:
+			return command
+
+	return None
+
+
+@contextmanager
+def open_decompressed(path):
+
+	"""
+	Context manager giving a file object from which the decompressed contents of the file
+	stored at 'path' can be read, whether it is compressed with gzip, bzip2 or xz, or not at
+	all. Where the format's command line decompressor is installed, it is used (so
+	decompression runs alongside the reader, and bzip2 files made of several streams, as
+	written by pbzip2, are read in full); otherwise Python's own modules are used.
+	"""
+
+	kind = detect_compression(path)
+	command = None if kind is None else decompress_command(kind)
+
+	if kind is None:
+		with open(path, "rb") as f:
+			yield f
+
+	elif command is not None:
+		process = subprocess.Popen(command + [path], stdout = subprocess.PIPE, bufsize = -1)
+		try:
+			yield process.stdout
+		finally:
+			process.stdout.close()
+			exit_status = process.wait()
+		if exit_status != 0:
+			raise Exception("Could not decompress " + path + " (" + command[0] +
+				" exited with status " + str(exit_status) + ")")
+
+	elif kind == "gzip":
+		with gzip.open(path, "rb") as f:
+			yield f
+
+	elif kind == "bzip2":
+		with bz2.BZ2File(path, "rb") as f:
+			yield f
+
+	else:
+		try:
+			import lzma
+		except ImportError:
+			try:
+				from backports import lzma
+			except ImportError:
+				raise Exception("Reading " + path + " needs either the xz program or the " +
+					"lzma module (backports.lzma under Python 2)")
+		with lzma.open(path, "rb") as f:
+			yield f
@@ -0,0 +1,168 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import json
+import threading
+
+from hist_cache import atomic_write
+
+
+# Used for any option missing from the settings file
+DEFAULT_SETTINGS = {
+	"x_lower": 1,
+	"x_upper": 2000,
+	"y_lower": 1,
+	"y_upper": 10000000,
+	"x_scale": "linear",
+	"y_scale": "log",
+	"x_label": "k-mer Coverage",
+	"y_label": "k-mer Count Frequency",
+	"desired_border": 0.2,
+	"jellyfish_bin": "",
+	"spades_bin": "",
+	"soap_bin": "",
+	"gap_closer_bin": "",
+	"cache_dir": "",
+	"cache_max_bytes": 1073741824,
+}
+
+# An option can be set for one run through the environment variable ENV_PREFIX + option in
+# upper case, e.g. K_MER_TOOLS_JELLYFISH_BIN
+ENV_PREFIX = "K_MER_TOOLS_"
+
+
+def parse_env_value(value):
+
+	"""
+	Values in the environment are read as JSON where possible (so that numbers keep their
+	type), and otherwise taken as plain strings.
+	"""
+
+	try:
+		return json.loads(value)
+	except ValueError:
+		return value
+
+
+class Settings(object):
+
+	"""
+	The settings for a run, layered so that each of the following overrides the ones before:
+	DEFAULT_SETTINGS, the settings file, the environment and any overrides set for this run
+	(e.g. from command line flags). The file is parsed once and only re-read if its
+	modification time changes; overrides are never written back unless save() is called.
+	"""
+
+	def __init__(self, path, defaults = DEFAULT_SETTINGS, environ = None):
+
+		self.path = path
+		self.defaults = dict(defaults)
+		self.environ = os.environ if environ is None else environ
+		self.overrides = {}
+
+		self._lock = threading.Lock()
+		self._file_stamp = None
+		self._file_settings = {}
+
+
+	def _load_file(self):
+
+		"""
+		Returns the settings in the file, re-reading it only if it has changed since last read.
+		"""
+
+		try:
+			stat = os.stat(self.path)
+			stamp = (stat.st_mtime, stat.st_size)
+		except OSError:
+			stamp = None
+
+		with self._lock:
+			if stamp != self._file_stamp:
+				if stamp is None:
+					self._file_settings = {}
+				else:
+					with open(self.path, "r") as settings_file:
+						self._file_settings = json.load(settings_file)
+				self._file_stamp = stamp
+
+			return self._file_settings
+
+
+	def _environment(self):
+
+		settings = {}
+		for (name, value) in self.environ.items():
+			if name.startswith(ENV_PREFIX):
+				settings[name[len(ENV_PREFIX):].lower()] = parse_env_value(value)
+
+		return settings
+
+
+	def as_dict(self):
+
+		settings = dict(self.defaults)
+		settings.update(self._load_file())
+		settings.update(self._environment())
+		settings.update(self.overrides)
+
+		return settings
+
+
+	def __getitem__(self, option):
+
+		return self.as_dict()[option]
+
+
+	def override(self, option, value):
+
+		"""
+		Sets 'option' to 'value' for the rest of this run only.
+		"""
+
+		if option not in self.defaults:
+			raise Exception("Tried to set unknown setting: " + option)
+
+		self.overrides[option] = value
+
+
+	def save(self, options = None):
+
+		"""
+		Writes the overrides for 'options' (or all overrides) to the settings file, keeping
+		the other values already in it. The file is replaced atomically, so that concurrent
+		runs never see it half written.
+		"""
+
+		if options is None:
+			options = self.overrides.keys()
+
+		settings = dict(self.defaults)
+		settings.update(self._load_file())
+		for option in options:
+			settings[option] = self.overrides[option]
+
+		# Keeps the permissions of the file it replaces (see atomic_write)
+		atomic_write(self.path, json.dumps(settings, sort_keys = True))
+
+		return
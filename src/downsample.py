@@ -0,0 +1,80 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import numpy as np
+
+
+# Points plotted for each spectrum, well beyond what a figure can show distinctly
+DEFAULT_MAX_POINTS = 2000
+
+
+def visible_points(x, y, lower, upper):
+
+	"""
+	Returns the points of the series (x, y), whose x values are in increasing order, which
+	lie between lower and upper, together with the nearest point beyond each (if any), so
+	that a line through them still runs to the edges of the plot.
+	"""
+
+	start = max(np.searchsorted(x, lower, "left") - 1, 0)
+	end = min(np.searchsorted(x, upper, "right") + 1, len(x))
+
+	return (x[start:end], y[start:end])
+
+
+def downsample_series(x, y, max_points = DEFAULT_MAX_POINTS, lower = None, upper = None,
+	log_scale = False):
+
+	"""
+	Returns the series (x, y), whose x values are in increasing order, reduced to about
+	max_points points (or left whole if max_points is 0) in a way which keeps its shape when
+	plotted. Only the points visible between lower and upper (if given) are kept (see
+	visible_points); these are then split into max_points / 2 buckets of equal width along
+	the x-axis (in log space if log_scale is set), and only the lowest and highest point in
+	each bucket are kept, so that every peak and trough is still drawn where it really is.
+	"""
+
+	x = np.asarray(x)
+	y = np.asarray(y)
+
+	if lower is not None and upper is not None:
+		(x, y) = visible_points(x, y, lower, upper)
+
+	if max_points <= 0 or len(x) <= max_points:
+		return (x, y)
+
+	position = x.astype(np.float64)
+	if log_scale:
+		position = np.log(np.maximum(position, np.finfo(np.float64).tiny))
+
+	num_buckets = max(max_points // 2, 1)
+	edges = np.linspace(position[0], position[-1], num_buckets + 1)
+	buckets = np.clip(np.searchsorted(edges, position, "right") - 1, 0, num_buckets - 1)
+
+	# Within each bucket, points are ordered by y, so the first and last of each are kept
+	order = np.lexsort((y, buckets))
+	firsts = np.flatnonzero(np.concatenate(([True], buckets[order][1:] !=
+		buckets[order][:-1])))
+	lasts = np.concatenate((firsts[1:] - 1, [len(order) - 1]))
+	keep = np.unique(np.concatenate((order[firsts], order[lasts], [0, len(x) - 1])))
+
+	return (x[keep], y[keep])
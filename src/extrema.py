@@ -0,0 +1,121 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import numpy as np
+
+
+class ExtremaEngine(object):
+
+	"""
+	Caches the work done while searching for the extrema of a single (padded) k-mer spectrum.
+
+	Smoothed arrays, candidate extrema and scores are all memoised, so a (window, order)
+	pair is only ever evaluated once, however many times the parameter search revisits it.
+	"""
+
+	def __init__(self, frequencies):
+
+		self.frequencies = np.asarray(frequencies, dtype = np.int64)
+
+		self._smoothed = {}
+		self._candidates = {}
+
+		# (window_size, order_num, num_peaks_desired) -> score, filled in by the search
+		self.scores = {}
+
+
+	def smoothed(self, window_size):
+
+		"""
+		Returns the moving average of the frequencies over 'window_size' points, truncated
+		to integers and cut to the length of the frequencies.
+		"""
+
+		window_size = int(window_size)
+
+		if window_size not in self._smoothed:
+			# 'same' convolution returns an array the length of the window when the window is
+			# longer than the data, of which only the first n points (one for each frequency)
+			# are kept
+			window = np.ones(window_size) / float(window_size)
+			smoothed = np.convolve(self.frequencies, window, 'same')[:len(self.frequencies)]
+			smoothed = smoothed.astype(np.int64)
+
+			self._smoothed[window_size] = smoothed
+
+		return self._smoothed[window_size]
+
+
+	def candidate_extrema(self, window_size, order_num):
+
+		"""
+		Returns a tuple (min_list, max_list) of the positions of the relative minima and
+		maxima of the smoothed data, ignoring the first of each.
+		"""
+
+		key = (int(window_size), int(order_num))
+
+		if key not in self._candidates:
+			smoothed = self.smoothed(window_size)
+			min_list = relative_extrema(smoothed, key[1], False).tolist()[1:]
+			max_list = relative_extrema(smoothed, key[1], True).tolist()[1:]
+			self._candidates[key] = (min_list, max_list)
+
+		return self._candidates[key]
+
+
+def sliding_extreme(data, order, maxima):
+
+	"""
+	Returns an array giving, for each point of 'data', the maximum (or minimum, if maxima is
+	not set) of the points up to 'order' either side of it. Windows are built up by
+	repeated doubling, so this takes time proportional to log(order) rather than order.
+	"""
+
+	window = 2 * order + 1
+	if maxima:
+		(reduce, fill) = (np.maximum, np.iinfo(np.int64).min)
+	else:
+		(reduce, fill) = (np.minimum, np.iinfo(np.int64).max)
+
+	extremes = np.full(len(data) + 2 * order, fill, dtype = np.int64)
+	extremes[order:order + len(data)] = data
+
+	# extremes[i] covers the 'span' points starting at i of the padded data
+	span = 1
+	while 2 * span <= window:
+		extremes = reduce(extremes[:-span], extremes[span:])
+		span *= 2
+
+	return reduce(extremes[:len(data)], extremes[window - span:window - span + len(data)])
+
+
+def relative_extrema(data, order, maxima):
+
+	"""
+	Returns the positions of the relative maxima (or minima, if maxima is not set) of
+	'data'. A point is a relative maximum if it is at least as large as every point up to
+	'order' either side of it, i.e. it equals the maximum of that window. This gives the
+	same result as scipy.signal.argrelextrema with np.greater_equal (or np.less_equal).
+	"""
+
+	return np.nonzero(data == sliding_extreme(data, order, maxima))[0]
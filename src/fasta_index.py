@@ -0,0 +1,297 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import mmap
+import collections
+
+import numpy as np
+
+from hist_cache import atomic_write
+
+
+INDEX_SUFFIX = ".fai"
+
+# Bytes of the reference scanned at once while building an index
+CHUNK_SIZE = 2 ** 26
+
+NEWLINE = ord("\n")
+CARRIAGE_RETURN = ord("\r")
+HEADER = ord(">")
+
+# One line of a .fai file, as written by 'samtools faidx'
+IndexEntry = collections.namedtuple("IndexEntry",
+	["name", "length", "offset", "line_bases", "line_width"])
+
+
+class _RecordBuilder(object):
+
+	"""
+	Accumulates the index entry of one record while its lines are scanned.
+	"""
+
+	def __init__(self, name, offset):
+
+		self.name = name
+		self.offset = offset
+		self.length = 0
+		self.line_bases = None
+		self.line_width = None
+		self.short_line_seen = False
+
+
+	def add_lines(self, starts, bases, widths):
+
+		if len(bases) == 0:
+			return
+
+		if self.line_bases is None:
+			self.offset = int(starts[0])
+			self.line_bases = int(bases[0])
+			self.line_width = int(widths[0])
+
+		# Only the last line of a record may be shorter than the rest (or empty)
+		if self.short_line_seen and bases.any():
+			raise Exception("Different line lengths in FASTA record " + self.name)
+		irregular = np.flatnonzero((bases != self.line_bases) |
+			((widths != self.line_width) & (bases == self.line_bases)))
+		if len(irregular) > 0:
+			first = irregular[0]
+			if bases[first] > self.line_bases or bases[first + 1:].any():
+				raise Exception("Different line lengths in FASTA record " + self.name)
+			self.short_line_seen = True
+
+		self.length += int(bases.sum())
+
+
+	def entry(self):
+
+		return IndexEntry(self.name, self.length, self.offset, self.line_bases or 0,
+			self.line_width or 0)
+
+
+def build_index(reference_path, chunk_size = CHUNK_SIZE):
+
+	"""
+	Scans the FASTA file at 'reference_path' in chunks of chunk_size bytes, and returns a
+	list of the IndexEntry of each record, in file order. As with 'samtools faidx', every
+	line of a record but the last must have the same length.
+	"""
+
+	if os.path.getsize(reference_path) == 0:
+		return []
+
+	data = np.memmap(reference_path, dtype = np.uint8, mode = "r")
+	entries = []
+	record = None
+	line_start = 0
+
+	for chunk_start in xrange(0, len(data), chunk_size):
+		chunk_end = min(chunk_start + chunk_size, len(data))
+		line_ends = np.flatnonzero(data[chunk_start:chunk_end] == NEWLINE) + chunk_start
+		if chunk_end == len(data) and data[-1] != NEWLINE:
+			line_ends = np.append(line_ends, len(data))
+		if len(line_ends) == 0:
+			continue
+
+		starts = np.concatenate(([line_start], line_ends[:-1] + 1))
+		line_start = int(line_ends[-1]) + 1
+
+		# Line content excludes the newline, and any carriage return before it
+		widths = line_ends - starts + 1
+		has_return = np.zeros(len(starts), dtype = bool)
+		non_empty = line_ends > starts
+		has_return[non_empty] = data[line_ends[non_empty] - 1] == CARRIAGE_RETURN
+		bases = line_ends - starts - has_return
+
+		is_header = np.zeros(len(starts), dtype = bool)
+		is_header[non_empty] = data[starts[non_empty]] == HEADER
+		headers = np.flatnonzero(is_header).tolist()
+
+		segment_start = 0
+		for header in headers + [len(starts)]:
+			if segment_start < header:
+				if record is None:
+					raise Exception("FASTA file does not start with a header: " +
+						reference_path)
+				record.add_lines(starts[segment_start:header], bases[segment_start:header],
+					widths[segment_start:header])
+
+			if header < len(starts):
+				if record is not None:
+					entries.append(record.entry())
+				name = data[starts[header] + 1:starts[header] + bases[header]].tostring()
+				record = _RecordBuilder((name.split() or [""])[0], int(line_ends[header]) + 1)
+
+			segment_start = header + 1
+
+	if record is not None:
+		entries.append(record.entry())
+
+	return entries
+
+
+def read_index(index_path):
+
+	entries = []
+	with open(index_path, "r") as f:
+		for line in f:
+			fields = line.rstrip("\n").split("\t")
+			if len(fields) >= 5:
+				entries.append(IndexEntry(fields[0], *[int(x) for x in fields[1:5]]))
+
+	return entries
+
+
+def write_index(entries, index_path):
+
+	atomic_write(index_path, "".join("%s\t%d\t%d\t%d\t%d\n" % entry for entry in entries))
+
+
+def load_index(reference_path, index_path = None):
+
+	"""
+	Returns the index entries of the FASTA file at 'reference_path', reading them from its
+	.fai file if that is at least as new as the reference. Otherwise the index is built,
+	and cached in the .fai file for next time if its directory is writable.
+	"""
+
+	if index_path is None:
+		index_path = reference_path + INDEX_SUFFIX
+
+	if os.path.isfile(index_path) and \
+		os.path.getmtime(index_path) >= os.path.getmtime(reference_path):
+		return read_index(index_path)
+
+	entries = build_index(reference_path)
+	try:
+		write_index(entries, index_path)
+	except (IOError, OSError):
+		pass
+
+	return entries
+
+
+class IndexedFasta(object):
+
+	"""
+	Random access to the sequences of a memory-mapped FASTA file, using its faidx-compatible
+	index to find the bytes holding any region without reading those before it.
+	"""
+
+	def __init__(self, reference_path, index_path = None):
+
+		self.path = reference_path
+		self.entries = collections.OrderedDict((entry.name, entry)
+			for entry in load_index(reference_path, index_path))
+
+		self._file = open(reference_path, "rb")
+		if os.path.getsize(reference_path) > 0:
+			self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+		else:
+			self._data = ""
+
+
+	def close(self):
+
+		if not isinstance(self._data, str):
+			self._data.close()
+		self._file.close()
+
+
+	def __enter__(self):
+
+		return self
+
+
+	def __exit__(self, exc_type, exc_value, traceback):
+
+		self.close()
+
+
+	def names(self):
+
+		return self.entries.keys()
+
+
+	def lengths(self):
+
+		return dict((name, entry.length) for (name, entry) in self.entries.items())
+
+
+	def _byte_offset(self, entry, position):
+
+		return entry.offset + (position // entry.line_bases) * entry.line_width + \
+			position % entry.line_bases
+
+
+	def fetch(self, name, start = 0, end = None):
+
+		"""
+		Returns the bases of chromosome 'name' from 0-based start up to (but not including)
+		end, or to the end of the chromosome if end is None.
+		"""
+
+		if name not in self.entries:
+			raise Exception("Chromosome not in reference: " + name)
+
+		entry = self.entries[name]
+		if end is None:
+			end = entry.length
+		if not 0 <= start <= end <= entry.length:
+			raise Exception("Region " + name + ":" + str(start + 1) + "-" + str(end) +
+				" is outside the reference")
+		if start == end:
+			return ""
+
+		sequence = self._data[self._byte_offset(entry, start):
+			self._byte_offset(entry, end - 1) + 1]
+		if entry.line_width > entry.line_bases:
+			sequence = sequence.replace("\n", "").replace("\r", "")
+
+		return sequence
+
+
+	def fetch_region(self, region):
+
+		"""
+		Returns the bases of a region given as 'name', or 'name:start-end' with 1-based,
+		inclusive coordinates (as for 'samtools faidx').
+		"""
+
+		if ":" not in region or region in self.entries:
+			return self.fetch(region)
+
+		(name, interval) = region.rsplit(":", 1)
+		(start, end) = interval.replace(",", "").split("-")
+
+		return self.fetch(name, int(start) - 1, int(end))
+
+
+	def fetch_many(self, locations):
+
+		"""
+		Returns the bases of each (name, start, end) region in 'locations' (0-based, half
+		open), in the order given.
+		"""
+
+		return [self.fetch(name, start, end) for (name, start, end) in locations]
@@ -0,0 +1,316 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import io
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from histogram import Histogram
+from inputs import expand_inputs
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "k_mer_tools")
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+INDEX_NAME = "index.json"
+
+# Locked (with flock) around each update to the index, so that runs sharing the cache do
+# not lose each other's updates
+LOCK_NAME = "index.lock"
+
+# Serialises updates to the index between threads of the same process
+_index_lock = threading.Lock()
+
+# Seconds after which a cache hit records its use in the index again. Between these, hits
+# only read the index, so entries are evicted in order of last use to within this.
+LAST_USED_INTERVAL = 60
+
+
+def file_content_hash(file_path, block_size = 2 ** 20):
+
+	"""
+	Returns the SHA-1 digest of the contents of the file stored at 'file_path'.
+	"""
+
+	digest = hashlib.sha1()
+	with open(file_path, "rb") as f:
+		for block in iter(lambda: f.read(block_size), b""):
+			digest.update(block)
+
+	return digest.hexdigest()
+
+
+def current_umask():
+
+	# The umask can only be read by setting it, so this is done once, before any threads
+	# start (see NEW_FILE_MODE)
+	umask = os.umask(0)
+	os.umask(umask)
+
+	return umask
+
+
+# The permissions open gives a new file
+NEW_FILE_MODE = 0666 & ~current_umask()
+
+
+def atomic_write(path, data, mode = None):
+
+	"""
+	Writes the string 'data' to a temporary file next to 'path', then renames it into place
+	so that readers never see a partially written file. The file is given the permissions
+	'mode' before it is renamed, or by default those of the file it replaces (or, if there
+	is none, those open would give a new file).
+	"""
+
+	if mode is None:
+		try:
+			mode = os.stat(path).st_mode & 0777
+		except OSError:
+			mode = NEW_FILE_MODE
+
+	(fd, tmp_path) = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)),
+		prefix = "." + os.path.basename(path) + ".")
+	try:
+		with os.fdopen(fd, "wb") as tmp_file:
+			tmp_file.write(data)
+		os.chmod(tmp_path, mode)
+		os.rename(tmp_path, path)
+	except:
+		os.remove(tmp_path)
+		raise
+
+	return
+
+
+def atomic_write_json(path, data):
+
+	atomic_write(path, json.dumps(data))
+
+	return
+
+
+class HistogramCache(object):
+
+	"""
+	An on-disk cache of histograms, keyed by the identity of the input file (its path, size
+	and modification time, or optionally a hash of its contents) together with the k-mer
+	size, hash size and version of the counter used.
+
+	Each histogram is stored as a .npy array of (occurrence, frequency) rows, which is
+	memory-mapped when loaded. An index (index.json) records the size and last use of every
+	entry, and the least recently used entries are evicted once the cache exceeds max_bytes.
+	The index is only updated while holding a lock on index.lock, so several processes may
+	share the cache. Entries which cannot be loaded are dropped, and treated as missing.
+	"""
+
+	def __init__(self, cache_dir = DEFAULT_CACHE_DIR, max_bytes = DEFAULT_MAX_BYTES):
+
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.index_path = os.path.join(cache_dir, INDEX_NAME)
+		self.lock_path = os.path.join(cache_dir, LOCK_NAME)
+
+		# Another run may create it at the same time
+		try:
+			os.makedirs(cache_dir)
+		except OSError:
+			if not os.path.isdir(cache_dir):
+				raise
+
+
+	def key(self, input_file_path, k_size, hash_size = None, counter_version = None,
+		content_hash = False):
+
+		"""
+		Returns the cache key for the histogram of 'input_file_path' (which may give several
+		files, see inputs.expand_inputs) at the given k-mer size. hash_size and
+		counter_version should be None if the input is already a histogram.
+		"""
+
+		identities = []
+		for path in expand_inputs(input_file_path):
+			if content_hash:
+				identities.append(["sha1", file_content_hash(path)])
+			else:
+				stat = os.stat(path)
+				identities.append(["stat", os.path.realpath(path), stat.st_size, stat.st_mtime])
+
+		# A single file is identified as it always has been, so its entries stay valid
+		identity = identities[0] if len(identities) == 1 else identities
+
+		description = json.dumps([identity, k_size, hash_size, counter_version])
+
+		return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+	def _read_index(self):
+
+		try:
+			with open(self.index_path, "r") as index_file:
+				return json.load(index_file)
+		except (IOError, ValueError):
+			return {}
+
+
+	@contextmanager
+	def _locked_index(self):
+
+		"""
+		Context manager giving the index, for reading and updating, while holding the locks
+		which keep other threads and processes from updating it at the same time.
+		"""
+
+		with _index_lock:
+			with open(self.lock_path, "a") as lock_file:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+				try:
+					yield self._read_index()
+				finally:
+					fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+	def _entry_path(self, key):
+
+		return os.path.join(self.cache_dir, key + ".npy")
+
+
+	def get(self, key):
+
+		"""
+		Returns the cached Histogram for 'key', or None if it is not present.
+		"""
+
+		return self._load(self._read_index(), key)
+
+
+	def get_family(self, family):
+
+		"""
+		Returns the most recently used cached Histogram stored with the given family (see
+		put), or None if there is none.
+		"""
+
+		index = self._read_index()
+		keys = [key for key in index if index[key].get("family") == family]
+		for key in sorted(keys, key = lambda k: index[k]["last_used"], reverse = True):
+			hist = self._load(index, key)
+			if hist is not None:
+				return hist
+
+		return None
+
+
+	def _load(self, index, key):
+
+		"""
+		Returns the Histogram stored under 'key' in 'index' (as read from the index file), or
+		None if it is not present or cannot be loaded. Use is recorded in the index file if
+		it was last recorded more than LAST_USED_INTERVAL seconds ago.
+		"""
+
+		if key not in index or not os.path.isfile(self._entry_path(key)):
+			return None
+
+		try:
+			pairs = np.load(self._entry_path(key), mmap_mode = "r")
+			hist = Histogram.from_arrays(pairs[:, 0], pairs[:, 1])
+		except (IOError, OSError, ValueError, IndexError):
+			# A damaged entry (e.g. truncated by a full disk) is dropped so that the
+			# histogram is computed and stored again
+			self._drop(key, index[key])
+			return None
+
+		now = time.time()
+		if now - index[key]["last_used"] > LAST_USED_INTERVAL:
+			with self._locked_index() as locked_index:
+				if key in locked_index:
+					locked_index[key]["last_used"] = now
+					atomic_write_json(self.index_path, locked_index)
+
+		return hist
+
+
+	def _drop(self, key, entry):
+
+		"""
+		Removes 'key' from the cache, unless its index entry has changed from 'entry' (i.e.
+		it has since been stored again).
+		"""
+
+		with self._locked_index() as index:
+			if index.get(key) == entry:
+				del index[key]
+				if os.path.isfile(self._entry_path(key)):
+					os.remove(self._entry_path(key))
+				atomic_write_json(self.index_path, index)
+
+		return
+
+
+	def put(self, key, hist, source = "", family = None):
+
+		"""
+		Stores 'hist' under 'key', then evicts old entries if the cache has grown too large.
+		'family' optionally names a group of entries which may stand in for each other (e.g.
+		the same reads counted by different versions of Jellyfish), see get_family.
+		"""
+
+		(occurrences, frequencies) = hist.items()
+		observed = frequencies != 0
+		pairs = np.column_stack((occurrences[observed], frequencies[observed]))
+
+		npy = io.BytesIO()
+		np.save(npy, pairs)
+		atomic_write(self._entry_path(key), npy.getvalue())
+
+		with self._locked_index() as index:
+			index[key] = {"bytes": os.path.getsize(self._entry_path(key)),
+				"last_used": time.time(), "source": source, "family": family}
+			self._evict(index, keep = key)
+			atomic_write_json(self.index_path, index)
+
+		return
+
+
+	def _evict(self, index, keep = None):
+
+		total_bytes = sum(entry["bytes"] for entry in index.values())
+		for key in sorted(index, key = lambda k: index[k]["last_used"]):
+			if total_bytes <= self.max_bytes:
+				break
+			if key == keep:
+				continue
+			total_bytes -= index[key]["bytes"]
+			del index[key]
+			if os.path.isfile(self._entry_path(key)):
+				os.remove(self._entry_path(key))
+
+		return
@@ -0,0 +1,266 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import numpy as np
+
+
+# Occurrences above this value are kept in the sparse tail rather than the dense array.
+# Matches the default --high value of 'jellyfish histo'.
+DEFAULT_DENSE_LIMIT = 10000
+
+# Whether each byte value counts as whitespace between numbers
+IS_WHITESPACE = np.zeros(256, dtype = bool)
+IS_WHITESPACE[[ord(c) for c in " \t\n\r"]] = True
+
+
+def count_fields(text):
+
+	"""
+	Returns the number of whitespace-separated fields in the string 'text'.
+	"""
+
+	if text == "":
+		return 0
+
+	is_space = IS_WHITESPACE[np.frombuffer(text, dtype = np.uint8)]
+
+	return int(np.count_nonzero(is_space[:-1] & ~is_space[1:]) + (not is_space[0]))
+
+
+class Histogram(object):
+
+	"""
+	A k-mer spectrum, i.e. the frequency with which each occurrence value was observed.
+
+	Occurrences 1 to dense_limit are stored in a dense NumPy array (so that 'dense[i]' is the
+	frequency of occurrence i + 1, with unobserved occurrences set to 0). Any occurrences
+	above dense_limit are folded out into a sparse tail of (occurrence, frequency) arrays,
+	so that a long high-coverage tail does not have to be padded out one value at a time.
+	"""
+
+	def __init__(self, dense, tail_occ = None, tail_freq = None):
+
+		self.dense = np.asarray(dense, dtype = np.int64)
+
+		if tail_occ is None:
+			tail_occ = np.zeros(0, dtype = np.int64)
+			tail_freq = np.zeros(0, dtype = np.int64)
+
+		self.tail_occ = np.asarray(tail_occ, dtype = np.int64)
+		self.tail_freq = np.asarray(tail_freq, dtype = np.int64)
+
+		if len(self.tail_occ) != len(self.tail_freq):
+			raise Exception("Histogram tail occurrences and frequencies differ in length")
+
+
+	@classmethod
+	def from_arrays(cls, occurrences, frequencies, dense_limit = DEFAULT_DENSE_LIMIT):
+
+		"""
+		Builds a Histogram from parallel arrays of occurrences and frequencies. Occurrences
+		below 1 carry no k-mer words and are discarded.
+		"""
+
+		occurrences = np.asarray(occurrences, dtype = np.int64).ravel()
+		frequencies = np.asarray(frequencies, dtype = np.int64).ravel()
+
+		if len(occurrences) != len(frequencies):
+			raise Exception("Occurrence and frequency arrays differ in length")
+
+		keep = occurrences >= 1
+		occurrences = occurrences[keep]
+		frequencies = frequencies[keep]
+
+		in_dense = occurrences <= dense_limit
+		dense_occ = occurrences[in_dense]
+		if len(dense_occ) > 0:
+			dense = np.bincount(dense_occ - 1, weights = frequencies[in_dense],
+				minlength = dense_occ.max()).astype(np.int64)
+		else:
+			dense = np.zeros(0, dtype = np.int64)
+
+		tail_occ = occurrences[~in_dense]
+		tail_freq = frequencies[~in_dense]
+		order = np.argsort(tail_occ, kind = "mergesort")
+		tail_occ = tail_occ[order]
+		tail_freq = tail_freq[order]
+
+		# Collapse any repeated tail occurrences, and drop empty ones
+		if len(tail_occ) > 0:
+			(tail_occ, first) = np.unique(tail_occ, return_index = True)
+			tail_freq = np.add.reduceat(tail_freq, first)
+			nonzero = tail_freq != 0
+			tail_occ = tail_occ[nonzero]
+			tail_freq = tail_freq[nonzero]
+
+		return cls(dense, tail_occ, tail_freq)
+
+
+	@classmethod
+	def from_dict(cls, hist_dict, dense_limit = DEFAULT_DENSE_LIMIT):
+
+		"""
+		Builds a Histogram from a dict with occurrences as keys and frequencies as values.
+		"""
+
+		occurrences = np.fromiter(hist_dict.iterkeys(), dtype = np.int64, count = len(hist_dict))
+		frequencies = np.fromiter(hist_dict.itervalues(), dtype = np.int64,
+			count = len(hist_dict))
+
+		return cls.from_arrays(occurrences, frequencies, dense_limit)
+
+
+	@classmethod
+	def from_hgram(cls, hgram_path, dense_limit = DEFAULT_DENSE_LIMIT):
+
+		"""
+		Loads a .hgram file (one "occurrence frequency" pair per line, as output by
+		'jellyfish histo') directly into a Histogram.
+		"""
+
+		with open(hgram_path, "rb") as hgram_file:
+			return cls._from_text(hgram_file.read(), hgram_path, dense_limit)
+
+
+	@classmethod
+	def from_string(cls, hgram_text, dense_limit = DEFAULT_DENSE_LIMIT):
+
+		"""
+		Parses text in .hgram format (e.g. the output of 'jellyfish histo') in a single pass.
+		"""
+
+		return cls._from_text(hgram_text, "histogram text", dense_limit)
+
+
+	@classmethod
+	def _from_text(cls, text, source, dense_limit):
+
+		values = np.fromstring(text, dtype = np.int64, sep = " ")
+
+		# NumPy stops quietly at anything it cannot read as a number
+		if len(values) != count_fields(text) or len(values) % 2 != 0:
+			raise Exception("Malformed .hgram data: " + source)
+
+		pairs = values.reshape(-1, 2)
+
+		return cls.from_arrays(pairs[:, 0], pairs[:, 1], dense_limit)
+
+
+	@property
+	def max_occurrence(self):
+
+		if len(self.tail_occ) > 0:
+			return int(self.tail_occ[-1])
+
+		return len(self.dense)
+
+
+	def items(self):
+
+		"""
+		Returns arrays (occurrences, frequencies) covering the dense range followed by the
+		sparse tail.
+		"""
+
+		occurrences = np.concatenate((np.arange(1, len(self.dense) + 1, dtype = np.int64),
+			self.tail_occ))
+		frequencies = np.concatenate((self.dense, self.tail_freq))
+
+		return (occurrences, frequencies)
+
+
+	def padded(self):
+
+		"""
+		Returns arrays (occurrences, frequencies) for every occurrence in the dense range,
+		such that the data points are spaced at unit length along the x-axis.
+		"""
+
+		return (np.arange(1, len(self.dense) + 1, dtype = np.int64), self.dense)
+
+
+	def total_kmer_words(self):
+
+		"""
+		Returns the total number of k-mer words, i.e. the sum of occurrence * frequency.
+		"""
+
+		(occurrences, frequencies) = self.items()
+
+		return int(np.dot(occurrences, frequencies))
+
+
+	def distinct_kmers(self):
+
+		return int(self.dense.sum() + self.tail_freq.sum())
+
+
+	def to_string(self):
+
+		"""
+		Returns the histogram as text in .hgram format, listing only observed occurrences.
+		"""
+
+		(occurrences, frequencies) = self.items()
+		observed = frequencies != 0
+
+		return "".join("%d %d\n" % pair for pair in
+			zip(occurrences[observed].tolist(), frequencies[observed].tolist()))
+
+
+	def to_dict(self):
+
+		(occurrences, frequencies) = self.items()
+		observed = frequencies != 0
+
+		return dict(zip(occurrences[observed].tolist(), frequencies[observed].tolist()))
+
+
+	def __getitem__(self, occurrence):
+
+		if 1 <= occurrence <= len(self.dense):
+			return int(self.dense[occurrence - 1])
+
+		index = np.searchsorted(self.tail_occ, occurrence)
+		if index < len(self.tail_occ) and self.tail_occ[index] == occurrence:
+			return int(self.tail_freq[index])
+
+		return 0
+
+
+	def __eq__(self, other):
+
+		if not isinstance(other, Histogram):
+			return NotImplemented
+
+		return np.array_equal(np.trim_zeros(self.dense, "b"), np.trim_zeros(other.dense, "b")) \
+			and np.array_equal(self.tail_occ, other.tail_occ) \
+			and np.array_equal(self.tail_freq, other.tail_freq)
+
+
+	def __ne__(self, other):
+
+		result = self.__eq__(other)
+		if result is NotImplemented:
+			return result
+
+		return not result
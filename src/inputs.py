@@ -0,0 +1,124 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# The data for a run may be given as a single file, or as several files (e.g. the read
+# files of one sample) separated by commas, each of which may be a glob pattern, e.g.
+#
+#     reads/lane_*.fastq.gz
+#     sample_1.fastq.bz2,sample_2.fastq.bz2
+#
+# Read files may be compressed with gzip, bzip2 or xz.
+
+
+import os
+import glob
+import pipes
+
+from compression import detect_compression, decompress_command, base_extension, \
+	DECOMPRESSORS
+
+
+# Separates the files (or patterns) given as the data for a run
+PATH_SEPARATOR = ","
+
+
+def expand_inputs(path_spec):
+
+	"""
+	Returns the list of files given by 'path_spec' (see above), with the matches of each
+	pattern in sorted order. A file which exists is always taken as it is, whatever its name.
+	"""
+
+	if os.path.isfile(path_spec):
+		return [path_spec]
+
+	paths = []
+	for pattern in path_spec.split(PATH_SEPARATOR):
+		if pattern == "":
+			continue
+		matches = sorted(glob.glob(pattern))
+		if matches == []:
+			raise Exception("No input files found matching " + pattern)
+		paths += matches
+
+	return paths
+
+
+def input_stem(path_spec):
+
+	"""
+	Returns the name which files made from the data given by 'path_spec' (e.g. its .hgram and
+	.jf files and _reads directory) are named after: that of its first file, up to the first
+	'.' (so reads.fastq.gz gives 'reads').
+	"""
+
+	return expand_inputs(path_spec)[0].split("/")[-1].split(".")[0]
+
+
+def input_extension(path_spec):
+
+	"""
+	Returns the extension (ignoring any compression extension) of the first file or pattern
+	in 'path_spec', which is taken to be the type of all the data given by it.
+	"""
+
+	if os.path.isfile(path_spec):
+		return base_extension(path_spec)
+
+	return base_extension(path_spec.split(PATH_SEPARATOR)[0])
+
+
+def jellyfish_input_args(path_spec, processors, generators_path):
+
+	"""
+	Returns the arguments which give 'jellyfish count' the reads in the files given by
+	path_spec. Uncompressed files are read by Jellyfish itself, up to 'processors' at a
+	time. Compressed files are instead listed in a generator file, written to
+	generators_path, holding a command to decompress each to stdout: Jellyfish runs up to
+	'processors' of these at once, reading their output through pipes, so counting starts
+	straight away and the reads are never decompressed to disk.
+	"""
+
+	(plain_paths, commands) = ([], [])
+	for path in expand_inputs(path_spec):
+		kind = detect_compression(path)
+		if kind is None:
+			plain_paths.append(path)
+			continue
+
+		command = decompress_command(kind)
+		if command is None:
+			raise Exception("Cannot decompress " + path + ": none of " + ", ".join(
+				decompressor[0] for decompressor in DECOMPRESSORS[kind]) + " is installed")
+		commands.append(" ".join(pipes.quote(arg) for arg in command +
+			[os.path.abspath(path)]))
+
+	args = []
+	if commands != []:
+		with open(generators_path, "w") as generators:
+			generators.write("".join(command + "\n" for command in commands))
+		args += ["-g", generators_path, "-G", str(max(1, min(len(commands), processors)))]
+
+	if len(plain_paths) > 1:
+		args += ["-F", str(max(1, min(len(plain_paths), processors)))]
+
+	return args + plain_paths
@@ -0,0 +1,365 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import sys
+import json
+import time
+import errno
+import resource
+import threading
+import subprocess
+from contextlib import contextmanager
+
+from hist_cache import atomic_write
+
+
+# ru_maxrss is in bytes on OS X, but kilobytes elsewhere
+MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+# ru_inblock and ru_oublock count 512 byte blocks
+BLOCK_SIZE = 512
+
+PROGRESS_WIDTH = 79
+
+
+
+def usage_summary(usage):
+
+	"""
+	Returns a dict of the CPU time, peak resident set size and bytes read and written
+	(as counted by the filesystem, so not including reads served from the page cache) in
+	the resource.struct_rusage 'usage'.
+	"""
+
+	return {"user_seconds": usage.ru_utime, "system_seconds": usage.ru_stime,
+		"cpu_seconds": usage.ru_utime + usage.ru_stime,
+		"peak_rss_bytes": usage.ru_maxrss * MAXRSS_SCALE,
+		"bytes_read": usage.ru_inblock * BLOCK_SIZE,
+		"bytes_written": usage.ru_oublock * BLOCK_SIZE}
+
+
+def usage_difference(end, start, cumulative_peak = True):
+
+	"""
+	Returns the change from 'start' to 'end' (both dicts from usage_summary), except that
+	the peak resident set size is the high-water mark at the end. If cumulative_peak is not
+	set (as for the usage of children, whose peak is the largest of any child reaped so
+	far), the peak is only given if it rose between the two, and is None otherwise.
+	"""
+
+	difference = dict((key, end[key] - start[key]) for key in end)
+	difference["peak_rss_bytes"] = end["peak_rss_bytes"]
+	if not cumulative_peak and end["peak_rss_bytes"] <= start["peak_rss_bytes"]:
+		difference["peak_rss_bytes"] = None
+
+	return difference
+
+
+def exit_status(status):
+
+	"""
+	Returns the exit status given by a status from os.wait4, as subprocess reports it (i.e.
+	minus the signal number if the process was killed by a signal).
+	"""
+
+	if os.WIFSIGNALED(status):
+		return -os.WTERMSIG(status)
+
+	return os.WEXITSTATUS(status)
+
+
+class InstrumentedProcess(subprocess.Popen):
+
+	"""
+	A subprocess.Popen which, once the process exits, records its wall time, resource usage
+	and exit status as a stage of 'report', however it is found to have exited (through
+	poll, wait or communicate). The process is reaped with wait4, so the usage recorded is
+	that of the process itself (and of any processes it waited for), whatever else this
+	process's other children are doing at the time.
+	"""
+
+	def __init__(self, report, name, args, **kwargs):
+
+		self._report = report
+		self._record = report._start_stage(name, "process",
+			{"args": [str(arg) for arg in args]})
+		self._reap_lock = threading.Lock()
+		try:
+			subprocess.Popen.__init__(self, args, **kwargs)
+		except Exception as e:
+			report._finish_stage(self._record, {"error": repr(e)})
+			raise
+
+
+	def poll(self):
+
+		return self._reap(os.WNOHANG)
+
+
+	def wait(self):
+
+		return self._reap(0)
+
+
+	def _reap(self, options):
+
+		"""
+		Reaps the process with wait4 (called with 'options'), recording it once it has
+		exited. Returns its exit status, or None if it is still running.
+		"""
+
+		with self._reap_lock:
+			if self.returncode is not None:
+				return self.returncode
+
+			while True:
+				try:
+					(pid, status, usage) = os.wait4(self.pid, options)
+					break
+				except OSError as e:
+					if e.errno == errno.EINTR:
+						continue
+					if e.errno != errno.ECHILD:
+						raise
+					# Reaped elsewhere (e.g. if SIGCHLD is ignored), so only known to be done,
+					# taken as succeeding as subprocess does
+					(pid, status, usage) = (self.pid, 0, None)
+					break
+
+			if pid == 0:
+				return None
+
+			self.returncode = exit_status(status)
+			details = {} if usage is None else usage_summary(usage)
+			details["exit_status"] = self.returncode
+			self._report._finish_stage(self._record, details)
+
+		return self.returncode
+
+
+class RunReport(object):
+
+	"""
+	Records every stage of a run: external processes (started through call or popen) and
+	steps in Python (wrapped in stage). For each it keeps the wall time, CPU time, peak
+	resident set size, bytes read and written, and the exit status (for processes) or any
+	exception raised (for Python steps). The whole record can be saved as JSON.
+
+	Python steps share this process with any others running at the same time in other
+	threads, so their CPU time and I/O include those, and their peak resident set size is
+	that of the whole process so far. Resource usage of child processes (e.g. the native
+	counter's workers) is reported separately under 'children'.
+	"""
+
+	def __init__(self, command = None):
+
+		self.command = list(sys.argv if command is None else command)
+		self.started = time.time()
+		self.stages = []
+
+		self._lock = threading.Lock()
+		self._running = []
+		self._progress = None
+
+
+	def show_progress(self, stream = sys.stderr):
+
+		"""
+		Keeps a line showing the running stages up to date on 'stream' until close is called.
+		"""
+
+		if self._progress is None:
+			self._progress = ProgressLine(self, stream)
+
+
+	def _start_stage(self, name, kind, details = None):
+
+		record = {"name": name, "kind": kind, "start_seconds": time.time() - self.started}
+		record.update(details or {})
+		with self._lock:
+			self.stages.append(record)
+			self._running.append(record)
+		if self._progress is not None:
+			self._progress.draw()
+
+		return record
+
+
+	def _finish_stage(self, record, details):
+
+		record.update(details)
+		record["wall_seconds"] = time.time() - self.started - record["start_seconds"]
+		with self._lock:
+			self._running.remove(record)
+		if self._progress is not None:
+			self._progress.draw()
+
+		if record.get("exit_status"):
+			print "WARNING: " + record["name"] + " exited with status " + \
+				str(record["exit_status"])
+
+
+	def running(self):
+
+		"""
+		Returns a list of (name, seconds so far) for each stage currently running.
+		"""
+
+		now = time.time() - self.started
+		with self._lock:
+			return [(record["name"], now - record["start_seconds"]) for record in self._running]
+
+
+	@contextmanager
+	def stage(self, name, **details):
+
+		"""
+		Context manager recording the block it wraps as a Python step called 'name'. Any
+		keyword arguments are stored with it. The dict of the record is given to the block,
+		so that it can add details of its own.
+		"""
+
+		record = self._start_stage(name, "python", details)
+		start = usage_summary(resource.getrusage(resource.RUSAGE_SELF))
+		start_children = usage_summary(resource.getrusage(resource.RUSAGE_CHILDREN))
+		outcome = {"error": None}
+		try:
+			yield record
+		except BaseException as e:
+			outcome["error"] = repr(e)
+			raise
+		finally:
+			outcome.update(usage_difference(usage_summary(resource.getrusage(
+				resource.RUSAGE_SELF)), start))
+			outcome["children"] = usage_difference(usage_summary(resource.getrusage(
+				resource.RUSAGE_CHILDREN)), start_children, False)
+			self._finish_stage(record, outcome)
+
+
+	def popen(self, name, args, **kwargs):
+
+		"""
+		Starts 'args' as subprocess.Popen would, recording it as a stage called 'name' once
+		it has been waited for.
+		"""
+
+		return InstrumentedProcess(self, name, args, **kwargs)
+
+
+	def call(self, name, args, **kwargs):
+
+		"""
+		Runs 'args' as subprocess.call would, recording it as a stage called 'name', and
+		returns its exit status.
+		"""
+
+		return self.popen(name, args, **kwargs).wait()
+
+
+	def to_dict(self):
+
+		with self._lock:
+			stages = [dict(record) for record in self.stages]
+
+		finished = time.time()
+		total = usage_summary(resource.getrusage(resource.RUSAGE_SELF))
+		children = usage_summary(resource.getrusage(resource.RUSAGE_CHILDREN))
+
+		return {"command": self.command,
+			"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+			"finished": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(finished)),
+			"wall_seconds": finished - self.started,
+			"cpu_seconds": total["cpu_seconds"] + children["cpu_seconds"],
+			"peak_rss_bytes": total["peak_rss_bytes"],
+			"children_peak_rss_bytes": children["peak_rss_bytes"],
+			"failed_stages": [record["name"] for record in stages
+				if record.get("exit_status") or record.get("error")],
+			"stages": stages}
+
+
+	def save(self, path):
+
+		"""
+		Writes the report to 'path' as JSON, replacing any file there atomically.
+		"""
+
+		atomic_write(path, json.dumps(self.to_dict(), indent = 2, sort_keys = True))
+
+		return
+
+
+	def close(self):
+
+		if self._progress is not None:
+			self._progress.stop()
+			self._progress = None
+
+
+class ProgressLine(object):
+
+	"""
+	Keeps a single line on 'stream' (normally a terminal) showing how many stages of
+	'report' have finished and how long each running stage has taken so far, redrawing it
+	every 'interval' seconds.
+	"""
+
+	def __init__(self, report, stream, interval = 1.0):
+
+		self.report = report
+		self.stream = stream
+		self.interval = interval
+
+		self._lock = threading.Lock()
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target = self._tick)
+		self._thread.daemon = True
+		self._thread.start()
+
+
+	def _tick(self):
+
+		while not self._stopped.wait(self.interval):
+			self.draw()
+
+
+	def draw(self):
+
+		running = self.report.running()
+		finished = len(self.report.stages) - len(running)
+		line = "[%d done] " % finished + ", ".join("%s %ds" % (name, seconds)
+			for (name, seconds) in running)
+		line = line[:PROGRESS_WIDTH].ljust(PROGRESS_WIDTH)
+
+		with self._lock:
+			if not self._stopped.is_set():
+				self.stream.write("\r" + line)
+				self.stream.flush()
+
+
+	def stop(self):
+
+		with self._lock:
+			self._stopped.set()
+			self.stream.write("\n")
+			self.stream.flush()
+		self._thread.join()
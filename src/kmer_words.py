@@ -0,0 +1,142 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import gzip
+import subprocess
+
+
+BUFFER_SIZE = 2 ** 20
+
+# Name given to each k-mer word when it is written out as a read
+READ_NAME = "kmer-read"
+
+# Placeholder base quality for FASTQ output (the k-mer words have no real qualities)
+QUALITY_CHAR = "I"
+
+
+def peak_lookup(peak_ranges):
+
+	"""
+	Returns a list whose ith element is the index of the peak range (lower and upper limits
+	inclusive) containing count i, or -1 if no peak contains it.
+	"""
+
+	upper_limit = max(upper for (lower, upper) in peak_ranges)
+	lookup = [-1] * (upper_limit + 1)
+	for (peak_index, (lower, upper)) in enumerate(peak_ranges):
+		for count in xrange(max(lower, 0), upper + 1):
+			lookup[count] = peak_index
+
+	return lookup
+
+
+def open_words_file(path, compress = False):
+
+	if compress:
+		# Fast compression, as these are intermediate files read straight back by the assembler
+		return gzip.open(path, "wb", 1)
+
+	return open(path, "w", BUFFER_SIZE)
+
+
+def format_words(lines, first_read_number, words_format):
+
+	"""
+	Converts lines of 'jellyfish dump -ct' output into reads, one per k-mer word, numbered
+	from first_read_number. words_format may be "fastq", "fasta" or "dump" (left as is).
+	"""
+
+	if words_format == "dump":
+		return "".join(lines)
+
+	words = [line[:line.index("\t")] for line in lines]
+	numbers = xrange(first_read_number, first_read_number + len(words))
+
+	if words_format == "fasta":
+		return "".join(">%s_%d\n%s\n" % (READ_NAME, number, word) 
+			for (number, word) in zip(numbers, words))
+
+	quality = QUALITY_CHAR * len(words[0])
+
+	return "".join("@%s_%d\n%s\n+\n%s\n" % (READ_NAME, number, word, quality) 
+		for (number, word) in zip(numbers, words))
+
+
+def extract_peak_words(mer_count_file, peak_ranges, out_paths, jellyfish_bin_path, 
+	words_format = "fastq", compress = False, report = None):
+
+	"""
+	Dumps the k-mer words in 'mer_count_file' whose counts fall in any of 'peak_ranges',
+	reading the Jellyfish database only once. Each word is written to the element of 
+	'out_paths' corresponding to the peak its count falls in, as an assembler-ready read 
+	(see format_words), gzipped if compress is set. Returns the exit status of 'jellyfish 
+	dump', which is recorded as a stage of 'report' (an instrument.RunReport) if given.
+	"""
+
+	lookup = peak_lookup(peak_ranges)
+	lower_limit = min(lower for (lower, upper) in peak_ranges)
+	upper_limit = len(lookup) - 1
+
+	out_files = [open_words_file(path, compress) for path in out_paths]
+	reads_written = [0] * len(out_paths)
+	try:
+		dump_args = [jellyfish_bin_path, "dump", "-L", str(lower_limit), "-U",
+			str(upper_limit), "-ct", mer_count_file]
+		if report is not None:
+			dump = report.popen("jellyfish dump", dump_args, stdout = subprocess.PIPE,
+				bufsize = BUFFER_SIZE)
+		else:
+			dump = subprocess.Popen(dump_args, stdout = subprocess.PIPE, bufsize = BUFFER_SIZE)
+
+		# Sort each chunk of the dump by peak, then write each peak's share in one go
+		try:
+			while True:
+				lines = dump.stdout.readlines(BUFFER_SIZE)
+				if lines == []:
+					break
+
+				peak_lines = [[] for path in out_paths]
+				for line in lines:
+					count = int(line[line.rindex("\t") + 1:])
+					if count <= upper_limit and lookup[count] >= 0:
+						peak_lines[lookup[count]].append(line)
+
+				for (peak_index, selected) in enumerate(peak_lines):
+					if selected != []:
+						out_files[peak_index].write(format_words(selected, 
+							reads_written[peak_index] + 1, words_format))
+						reads_written[peak_index] += len(selected)
+
+		except:
+			# Stop the dump (and reap it) rather than leave it blocked writing to a pipe 
+			# which is no longer read
+			if dump.poll() is None:
+				dump.kill()
+			raise
+		finally:
+			dump.stdout.close()
+			exit_status = dump.wait()
+	finally:
+		for out_file in out_files:
+			out_file.close()
+
+	return exit_status
@@ -26,25 +26,58 @@
 import os.path
 import sys
 import subprocess
-import random
 import argparse
 import math
 import json
+import threading
 
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
-import scipy.signal as spysig
 
 import scripts.parse_dat_to_histo as parse_data
+from histogram import Histogram
+from extrema import ExtremaEngine
+from sampling import HistogramSampler
+from hist_cache import HistogramCache, DEFAULT_CACHE_DIR, atomic_write
+from scheduler import plan_jobs, run_concurrently
+import native_counter
+from kmer_words import extract_peak_words
+from alignments import read_alignments, write_repeat_runs, SHRED_MAPPING_QUALITY
+from masks import IntervalMask
+from fasta_index import IndexedFasta
+from config import Settings
+from instrument import RunReport
+from batch import read_manifest, run_batch, REPORT_NAME
+from checkpoint import StageManifest, MANIFEST_NAME, partial_path
+from inputs import expand_inputs, input_stem, input_extension, jellyfish_input_args
+from compression import base_extension
+from downsample import downsample_series, DEFAULT_MAX_POINTS
 
 
-def update_assembly_config(new_location):
-	config_location = os.path.join(os.path.dirname(__file__), "scripts/assembly_config")
-	with open(config_location, 'r') as assembly_config:
+# The directory holding this file, made absolute now, as batch runs change directory
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SETTINGS = Settings(os.path.join(SRC_DIR, "../settings/settings.json"))
+
+# Timings and resource usage of every stage of this run (see instrument.RunReport)
+REPORT = RunReport()
+
+# The version reported by each Jellyfish executable run so far (see counter_version)
+JELLYFISH_VERSIONS = {}
+
+
+def update_assembly_config(new_location, config_location):
+
+	"""
+	Writes a SOAPdenovo assembly config to config_location, made from the shared config in 
+	scripts/ (which is only ever read, as several runs may use it at once) with the location 
+	of the reads set to new_location.
+	"""
+
+	template_location = os.path.join(SRC_DIR, "scripts/assembly_config")
+	with open(template_location, 'r') as assembly_config:
 		lines = assembly_config.readlines()
 	lines[10] = new_location
-	with open(config_location , 'w') as assembly_config:
+	with open(config_location, 'w') as assembly_config:
 		assembly_config.writelines(lines)
 
 	return
@@ -57,14 +90,16 @@ def locate_binary(name, error_check = True):
 	if error_check:
 		if bin_path == "":
 			print "ERROR: Path to " + name + " executable has not been specified"
-			print "The path to it can be specified with the --" + name + "-bin flag, or it can"
-			print "be directly updated in the settings file (settings/settings.json)"
+			print "The path to it can be specified with the --" + name + "-bin flag (add"
+			print "--save-settings to keep it for later runs), or it can be directly updated in"
+			print "the settings file (settings/settings.json)"
 			sys.exit()
 
 		if not os.path.isfile(bin_path):
 			print "ERROR: " + name + " executable does not exist"
-			print "The path to it can be specified with the --" + name + "-bin flag, or it can"
-			print "be directly updated in the settings file (settings/settings.json)"
+			print "The path to it can be specified with the --" + name + "-bin flag (add"
+			print "--save-settings to keep it for later runs), or it can be directly updated in"
+			print "the settings file (settings/settings.json)"
 			sys.exit()
 
 	return bin_path
@@ -73,91 +108,157 @@ def locate_binary(name, error_check = True):
 def generate_settings():
 
 	"""
-	Reads settings file and returns a dictionary in which the keys are the individual options 
-	(stored as strings) and the values are the current value of that option. 
+	Returns a dictionary in which the keys are the individual options (stored as strings) 
+	and the values are the current value of that option. The settings file is only re-read 
+	if it has changed (see config.Settings).
 	"""
 
-	settings_location = os.path.join(os.path.dirname(__file__), "../settings/settings.json")
-
-	with open(settings_location, "r") as settings_file:
-		settings = json.load(settings_file)
-
-	return settings
+	return SETTINGS.as_dict()
 
 
 def update_settings(option, new_value):
 
 	"""
-	Saves the user's new value for 'option' in settings.json. 
+	Uses the user's new value for 'option' for the rest of this run. It is only saved in 
+	settings.json if save_settings is called.
 	"""
 
-	settings_location = os.path.join(os.path.dirname(__file__), "../settings/settings.json")
-
-	settings = generate_settings()
-
 	try:
-		settings[option] = new_value
-	except KeyError:
+		SETTINGS.override(option, new_value)
+	except Exception:
 		print "ERROR: Tried to update value not present in settings file"
 
-	with open(settings_location, "w") as settings_file:
-		json.dump(settings, settings_file)
+	return
+
+
+def save_settings():
+
+	"""
+	Saves the values given for this run in settings.json, replacing the file atomically.
+	"""
+
+	SETTINGS.save()
 
 	return
 
 
+def peak_words_path(reads_dir, peak_number, words_format = "fastq", compress_words = False):
+
+	"""
+	Returns the location of the file of k-mer words (as reads) for peak 'peak_number'.
+	"""
+
+	path = os.path.join(reads_dir, "peak_" + str(peak_number) + "_k_mers-read." + words_format)
+	if compress_words:
+		path += ".gz"
+
+	return path
+
+
 def process_peak(file_path, file_name, lower_limit, upper_limit, peak_number, reference_path, 
-	assembler, k_size, assembler_k, processors):
+	assembler, k_size, assembler_k, processors, peak_dir = None, words_format = "fastq", 
+	compress_words = False, words_extracted = False):
 
 	"""
 	Takes a file and computes k-mer words present in the section of the k-mer spectrum graph 
 	between lower_limit and upper_limit. These k-mer words are then assembled into contigs. If 
 	the reference sequence has been provided (i.e. the reads have been simulated from a 
 	reference for error checking), these contigs are mapped against it.
+
+	The k-mer words are written straight from the Jellyfish dump as reads in words_format 
+	("fastq" or "fasta"), gzipped if compress_words is set. If words_extracted is set, this 
+	has already been done (see find_repeats). 
+
+	If peak_dir is given, all work for the peak is done in that directory, so that several 
+	peaks can be processed at once. Each peak is assembled with an assembly config of its own 
+	(see assemble_peak). 
 	"""
 
 	if assembler_k >= k_size:
 		raise Exception("Assembler k-mer size must be smaller than overall k-mer size")
 
-	jellyfish_bin_path = locate_binary("jellyfish")
+	reads_dir = peak_dir or os.path.join(os.getcwd(), 
+		os.path.splitext(file_name)[0] + "_reads")
+	reads_path = peak_words_path(reads_dir, peak_number, words_format, compress_words)
 
-	subprocess.call(['sh', os.path.join(os.path.dirname(__file__), 
-		"scripts/compute_k_mer_words.sh"), file_name, str(lower_limit), str(upper_limit), 
-		str(peak_number), os.path.dirname(__file__), str(k_size), jellyfish_bin_path]) 
+	if not words_extracted:
+		if not os.path.isdir(reads_dir):
+			os.makedirs(reads_dir)
+		mer_count_file = os.path.splitext(file_name)[0] + "_mer_counts_" + str(k_size) + ".jf"
+		with REPORT.stage("extract k-mer words for peak " + str(peak_number)):
+			extract_peak_words(mer_count_file, [(lower_limit, upper_limit)], [reads_path], 
+				locate_binary("jellyfish"), words_format, compress_words, REPORT)
 
+	assemble_peak(file_path, peak_number, assembler, assembler_k, processors, reads_path, 
+		peak_dir, words_format)
+	
+	if reference_path != "":
+		align_peak(file_path, peak_number, reference_path, assembler_k, processors, peak_dir)
+
+	return
+
+
+def assemble_peak(file_path, peak_number, assembler, assembler_k, processors, reads_path, 
+	peak_dir = None, words_format = "fastq"):
+
+	"""
+	Assembles the k-mer words for peak 'peak_number' (stored at reads_path) into contigs, 
+	which are written to contigs.fastq in peak_dir (see process_peak). SOAPdenovo is given a 
+	config of the peak's own, written next to its reads. Returns the exit status of the 
+	assembly script.
+	"""
+
+	config_location = ""
 	if assembler == 'soap':
-		new_location = "q=" + os.path.abspath(file_path).split(".")[0] + "_reads/peak_" + \
-			str(peak_number) + "_k_mers-read.fastq\n"
-		update_assembly_config(new_location)
+		# SOAPdenovo takes FASTQ reads with 'q=' and FASTA reads with 'f='
+		new_location = {"fastq": "q=", "fasta": "f="}[words_format] + reads_path + "\n"
+		# A config of the peak's own, kept alongside its reads
+		config_location = os.path.join(os.path.dirname(os.path.abspath(reads_path)), 
+			"peak_" + str(peak_number) + "_assembly_config")
+		update_assembly_config(new_location, config_location)
 
 	assembler_bin_path = locate_binary(assembler)
 	gap_closer_bin_path = locate_binary("gap_closer", error_check = False)
 
-	subprocess.call(['sh', os.path.join(os.path.dirname(__file__), 
-		"scripts/assemble_repeats.sh"), os.path.abspath(file_path), str(peak_number), 
-		os.path.dirname(__file__), assembler, str(assembler_k), str(processors), 
-		assembler_bin_path, gap_closer_bin_path])
-	
-	if reference_path != "":
-		subprocess.call(['sh', os.path.join(os.path.dirname(__file__), 
-			"scripts/align_sim_to_ref.sh"), os.path.abspath(reference_path), 
-			os.path.abspath(file_path), str(peak_number), os.path.dirname(__file__), 
-			str(assembler_k), str(processors)])
+	return REPORT.call("assemble peak " + str(peak_number), ['sh', os.path.join(
+		SRC_DIR, "scripts/assemble_repeats.sh"), 
+		os.path.abspath(file_path), str(peak_number), 
+		SRC_DIR, assembler, str(assembler_k), str(processors), 
+		assembler_bin_path, gap_closer_bin_path, peak_dir or "", config_location, reads_path])
 
-	return
 
+def align_peak(file_path, peak_number, reference_path, assembler_k, processors, 
+	peak_dir = None):
+
+	"""
+	Maps the contigs assembled for peak 'peak_number' against the reference, writing the 
+	alignments to peak_<peak_number>_map in peak_dir. Returns the exit status of the 
+	alignment script.
+	"""
+
+	# Optional trailing argument to the script, giving the peak its own directory
+	peak_dir_args = []
+	if peak_dir is not None:
+		peak_dir_args = [peak_dir]
+
+	return REPORT.call("align peak " + str(peak_number), ['sh', os.path.join(
+		SRC_DIR, "scripts/align_sim_to_ref.sh"), 
+		os.path.abspath(reference_path), 
+		os.path.abspath(file_path), str(peak_number), SRC_DIR, 
+		str(assembler_k), str(processors)] + peak_dir_args)
 
-def ranges_from_extrema(extrema):
+
+def ranges_from_extrema(extrema, desired_border = None):
 	minima = extrema['Min']
 	intervals = [(y - x) for (x, y) in zip([m for m in minima], [m for m in minima[1:]])] 
 
 	peak_ranges = zip(minima, minima[1:])
 	peak_widths = [(j - i) for (i, j) in peak_ranges]
+	if desired_border is None:
+		desired_border = generate_settings()['desired_border']
 	new_ranges = []
 	for i in xrange(len(peak_ranges)):
 		new_ranges.append([0, 0])
-		settings = generate_settings()
-		desired_border = settings['desired_border']
 
 		new_ranges[i][0] = peak_ranges[i][0] + (desired_border * peak_widths[i])
 		new_ranges[i][1] = peak_ranges[i][1] - (desired_border * peak_widths[i])
@@ -166,14 +267,35 @@ def ranges_from_extrema(extrema):
 	return peak_ranges
 
 
-def calculate_peak_ranges(hist_dict, max_peak):
-	extrema = find_extrema(hist_dict, max_peak)
+def calculate_peak_ranges(hist, max_peak):
+	with REPORT.stage("find extrema", num_peaks = max_peak):
+		extrema = find_extrema(hist, max_peak)
 	
 	return ranges_from_extrema(extrema)
 
 
-def find_repeats(hist_dict, file_path, max_peak, assembler, k_size, assembler_k, 
-	processors, reference_path = ""):
+def ensure_reference_hash(reference_path):
+
+	"""
+	Generates the Smalt hash of the reference in the working directory, if it is not there 
+	already. This is done up front so that concurrently processed peaks do not each try to 
+	generate it.
+	"""
+
+	src = SRC_DIR
+	reference_name = os.path.splitext(os.path.basename(reference_path))[0]
+	hash_location = os.path.join(os.getcwd(), reference_name + ".hash")
+
+	if not (os.path.isfile(hash_location + ".smi") and os.path.isfile(hash_location + ".sma")):
+		REPORT.call("hash reference", ['sh', os.path.join(src, "scripts/generate_hash.sh"), 
+			hash_location, reference_path, src])
+
+	return
+
+
+def find_repeats(hist, file_path, max_peak, assembler, k_size, assembler_k, 
+	processors, reference_path = "", peak_jobs = 1, words_format = "fastq", 
+	compress_words = False, masked_fasta = False, resume = False):
 	
 	"""
 	Finds distinct peaks of k-mer spectrum, then uses Smalt to discover k-mer words associated
@@ -181,67 +303,188 @@ def find_repeats(hist_dict, file_path, max_peak, assembler, k_size, assembler_k,
 	of the peak. If the optinal reference sequence has been provided, it is shredded and mapped
 	against itself, to discover sequence of length 500 or more which are repetitive. This is 
 	used to test the de novo repetition detection. 
+
+	Up to peak_jobs peaks are processed at once, each in its own directory, with the 
+	processors split between them.
+
+	Repeat masks are saved as intervals under 'Masked Repeats' (see save_repeat_mask); 
+	masked copies of the reference are only written as well if masked_fasta is set.
+
+	Each stage (dumping the k-mer words, and assembling, aligning and masking each peak, 
+	then shredding the reference and masking the repeats found in it) is recorded in a 
+	checkpoint.StageManifest in the _reads directory as it completes. If resume is set, 
+	stages completed by an earlier run with the same inputs and parameters are skipped. 
 	"""
 	
-	file_path = os.path.abspath(file_path)
+	# Everything is named after the first read file, which is all the scripts are given
+	file_name = input_stem(file_path)
+	file_path = os.path.abspath(expand_inputs(file_path)[0])
 	if reference_path:
 		reference_path = os.path.abspath(reference_path)
-	src = os.path.dirname(__file__)
-	working_dir = file_path.split(".")[0] + "_reads"
+	src = SRC_DIR
+
+	peak_ranges = calculate_peak_ranges(hist, max_peak)
 
-	file_name = file_path.split("/")[-1]
+	# Fail here rather than in a worker thread if any executable cannot be found
+	locate_binary("jellyfish")
+	locate_binary(assembler)
+	reference_lengths = {}
+	if reference_path != "":
+		ensure_reference_hash(reference_path)
+		with IndexedFasta(reference_path) as reference:
+			reference_lengths = reference.lengths()
 
-	peak_ranges = calculate_peak_ranges(hist_dict, max_peak)
+	# The scripts place the _reads directory in the current working directory
+	working_dir = os.path.join(os.getcwd(), file_name + "_reads")
 
-	for (peak_number, (lower_limit, upper_limit)) in enumerate(peak_ranges, 2):
+	peak_dirs = {}
+	for peak_number in xrange(2, len(peak_ranges) + 2):
+		peak_dirs[peak_number] = os.path.join(working_dir, "peak_" + str(peak_number))
+		if not os.path.isdir(peak_dirs[peak_number]):
+			os.makedirs(peak_dirs[peak_number])
+
+	manifest = StageManifest(os.path.join(working_dir, MANIFEST_NAME), resume)
+
+	# Extract the k-mer words for every peak in a single pass over the Jellyfish database
+	mer_count_file = file_name + "_mer_counts_" + str(k_size) + ".jf"
+	words_paths = dict((peak_number, peak_words_path(peak_dirs[peak_number], peak_number, 
+		words_format, compress_words)) for peak_number in peak_dirs)
+
+	def dump_words(out_paths):
+		print "Extracting k-mer words for all peaks"
+		with REPORT.stage("extract k-mer words", num_peaks = len(peak_ranges)):
+			require_success("jellyfish dump", extract_peak_words(mer_count_file, peak_ranges, 
+				out_paths, locate_binary("jellyfish"), words_format, compress_words, REPORT))
+
+	manifest.run("dump", [mer_count_file], [words_paths[peak_number] for peak_number in 
+		sorted(peak_dirs)], dump_words, {"peak_ranges": peak_ranges, "k_size": k_size, 
+		"words_format": words_format, "compress_words": compress_words})
+
+	masks_dir = os.path.join(working_dir, "Masked Repeats")
+	if reference_path != "" and not os.path.isdir(masks_dir):
+		os.makedirs(masks_dir)
+
+	(num_jobs, job_processors) = plan_jobs(min(peak_jobs, len(peak_ranges)), processors)
+
+	def run_peak(peak_number):
 		print "Started processing peak" , peak_number
-		process_peak(file_path, file_name, lower_limit, upper_limit, peak_number, 
-			reference_path, assembler, k_size, assembler_k, processors)
+		peak_dir = peak_dirs[peak_number]
+		contigs_path = os.path.join(peak_dir, "contigs.fastq")
+		map_path = os.path.join(peak_dir, "peak_" + str(peak_number) + "_map")
+		mask_name = "peak_" + str(peak_number) + "_map"
+
+		manifest.run("assemble peak " + str(peak_number), [words_paths[peak_number]], 
+			[contigs_path], lambda out_paths: require_success("assemble peak " + 
+			str(peak_number), assemble_peak(file_path, peak_number, assembler, assembler_k, 
+			job_processors, words_paths[peak_number], peak_dir, words_format)), 
+			{"assembler": assembler, "assembler_k": assembler_k})
 		
 		if reference_path != "":
-			# Mask repeats found in each peak (replace their loci with Xs on a copy of 
-			# the reference fasta)
-			subprocess.call(['sh', os.path.join(src, "scripts/mask_repeats.sh"), 
-				reference_path, working_dir, src, 
-				(working_dir + "/peak_" + str(peak_number) +"/peak_" + str(peak_number) + \
-				"_map")])
+			manifest.run("align peak " + str(peak_number), [contigs_path, reference_path], 
+				[map_path], lambda out_paths: require_success("align peak " + 
+				str(peak_number), align_peak(file_path, peak_number, reference_path, 
+				assembler_k, job_processors, peak_dir)))
+
+			# Mask repeats found in each peak
+			manifest.run("mask peak " + str(peak_number), [map_path, reference_path], 
+				repeat_mask_paths(masks_dir, mask_name, masked_fasta), 
+				lambda out_paths: save_repeat_mask(IntervalMask.from_map(map_path), 
+				mask_name, out_paths, reference_path, reference_lengths), 
+				{"masked_fasta": masked_fasta})
 
 		print "Finished processing peak number" , peak_number
 
+	for (peak_number, result) in run_concurrently(run_peak, sorted(peak_dirs), num_jobs):
+		pass
+
 	if reference_path != "":	
+		shred_map_path = os.path.join(working_dir, "shred_map")
+		shred_repeats_paths = [os.path.join(working_dir, "shred_" + str(n) + "_repeats") 
+			for n in xrange(2, max_peak + 1)]
+
 		# 'Shred' reference and map to itself (to find all repeats for testing purposes):
-		update_assembly_config("q=" + reference_path + "\n")
-		subprocess.call(['sh', os.path.join(src, "scripts/ssaha_shred.sh"), 
-			reference_path, file_name.split(".")[0], src])
+		def shred_reference(out_paths):
+			require_success("shred and map reference", REPORT.call("shred and map reference", 
+				['sh', os.path.join(src, "scripts/ssaha_shred.sh"), reference_path, 
+				file_name, src]))
 
-		# Mask repeated regions from each mode in shredded reads
-		subprocess.call(['grep', ':00', working_dir + "/shred_map"], 
-			stdout = open(working_dir + "/shred_grep", "w"))
-		
-		with open(working_dir + "/shred_grep", "r") as f:
-			data = [line.split() for line in f.readlines()]
+		manifest.run("shred", [reference_path], [shred_map_path], shred_reference)
+
+		# Mask repeated regions from each mode in shredded reads. The shred map is streamed 
+		# once, keeping only alignments with mapping quality 0, and sorted into runs of n 
+		# alignments of the same shred
+		def group_shred_alignments(out_paths):
+			with REPORT.stage("group shred alignments"):
+				write_repeat_runs(read_alignments(shred_map_path, SHRED_MAPPING_QUALITY), 
+					max_peak, lambda n: out_paths[n - 2])
 
-		for n in xrange(2, max_peak + 1):
+		manifest.run("group shred alignments", [shred_map_path], shred_repeats_paths, 
+			group_shred_alignments, {"max_peak": max_peak})
+
+		for (n, repeats_path) in enumerate(shred_repeats_paths, 2):
 			print "Masking repeats occuring " + str(n) + " times"
-			iCount = 0
-			for i  in xrange(1, len(data) - n):
-				if all(x[2] == data[i][2] for x in data[i+1: i+n]) and \
-					(data[i][2] != data[i-1][2]) and (data[i][2] != data[i+n][2]):
-					
-					for line in data[i:i+n]:
-						with open(working_dir + "/shred_" + str(n) + "_repeats", "a") as out:
-							out.write(" ".join(x for x in line[:3]) + " " + \
-								" ".join(str(x).rjust(10) for x in line[3:8]) + " " + \
-								" ".join(str(x) for x in line[8:] ) + "\n")
-		
-			subprocess.call(['sh', os.path.join(src, "scripts/mask_repeats.sh"), 
-			reference_path, working_dir, src, os.path.abspath(working_dir + "/shred_" + \
-				str(n) + "_repeats")])
+			mask_name = "shred_" + str(n) + "_repeats"
+			manifest.run("mask shred " + str(n), [repeats_path, reference_path], 
+				repeat_mask_paths(masks_dir, mask_name, masked_fasta), 
+				lambda out_paths: save_repeat_mask(IntervalMask.from_map(repeats_path), 
+				mask_name, out_paths, reference_path, reference_lengths), 
+				{"masked_fasta": masked_fasta})
 
 	return 
 
 
-def calculate_ex_score(ex_dict):
+def require_success(stage_name, exit_status):
+
+	"""
+	Raises an exception if the external stage 'stage_name' did not exit successfully, so 
+	that it is not recorded as complete.
+	"""
+
+	if exit_status != 0:
+		raise Exception(stage_name + " failed with exit status " + str(exit_status))
+
+	return
+
+
+def repeat_mask_paths(masks_dir, mask_name, masked_fasta = False):
+
+	"""
+	Returns the locations to which the mask 'mask_name' is saved (see save_repeat_mask): 
+	<masks_dir>/<mask_name>_mask.npz, and <masks_dir>/<mask_name>_mask for the masked 
+	copy of the reference if masked_fasta is set.
+	"""
+
+	paths = [os.path.join(masks_dir, mask_name + "_mask.npz")]
+	if masked_fasta:
+		paths.append(os.path.join(masks_dir, mask_name + "_mask"))
+
+	return paths
+
+
+def save_repeat_mask(mask, mask_name, out_paths, reference_path, reference_lengths):
+
+	"""
+	Saves the intervals of 'mask' to out_paths[0] (in .npz format) and prints how much of
+	the reference (whose chromosome lengths are given by reference_lengths) they cover. A 
+	copy of the reference with the masked bases replaced by Xs is only written if a second 
+	path is given.
+	"""
+
+	with REPORT.stage("save " + mask_name + " mask") as record:
+		mask.save(out_paths[0])
+		coverage = mask.coverage_stats(reference_lengths)["total"]
+		record["masked_bases"] = coverage["masked_bases"]
+		print mask_name + ": masked " + str(coverage["masked_bases"]) + " bases (" + \
+			"%.2f" % (100 * coverage["fraction"]) + "% of reference) in " + \
+			str(coverage["intervals"]) + " intervals"
+
+		if len(out_paths) > 1:
+			mask.write_masked_fasta(reference_path, out_paths[1])
+
+	return
+
+
+def calculate_ex_score(ex_dict, desired_border = None):
 
 	"""
 	Returns a score describing how well the predicted extrema match with where we expect them 
@@ -251,12 +494,15 @@ def calculate_ex_score(ex_dict):
 	
 	diff_list = []
 
+	if len(ex_dict['Max']) < 2 or len(ex_dict['Min']) < 2:
+		return float("inf")
+
 	# Don't allow trivially 'periodic' extrema (normally very crowded around the origin):
 	if ex_dict['Max'][0] < 3:
 		return float("inf")
 
 	# Check that max is within peak range	
-	peak_ranges = ranges_from_extrema(ex_dict)
+	peak_ranges = ranges_from_extrema(ex_dict, desired_border)
 	for (mx, peak_range) in zip(ex_dict['Max'][1:], peak_ranges):
 		if (peak_range[0] < mx < peak_range[1]) == False:
 			return float("inf")
@@ -273,23 +519,20 @@ def calculate_ex_score(ex_dict):
 	return score
 
 
-def estimate_extrema(hist_dict, window_size, order_num, num_peaks_desired):
+def estimate_extrema(engine, window_size, order_num, num_peaks_desired):
  
 	"""
-	Smooths the data using a moving average. Uses Scipy.signals.argrelextrema to then detect
-	which points correspond to extrema. 
+	Smooths the data (held by an ExtremaEngine) using a moving average. Uses 
+	Scipy.signals.argrelextrema to then detect which points correspond to extrema. Both 
+	steps are cached by the engine for each (window_size, order_num) pair. 
 	"""
 
-	window = np.ones(int(window_size))/float(window_size)
-	moving_average = np.convolve(hist_dict.values(), window, 'same')
-	smoothed_data = dict(zip(hist_dict.keys(), [int(x) for x in moving_average]))
+	(min_list, max_list) = engine.candidate_extrema(window_size, order_num)
 
 	store_dict = {'Min': [], 'Max': []}
 
-	min_list = spysig.argrelextrema(np.array(smoothed_data.values()), np.less_equal, 
-		order = order_num)[0].tolist()[1:]
-	max_list = spysig.argrelextrema(np.array(smoothed_data.values()), np.greater_equal, 
-		order = order_num)[0].tolist()[1:]
+	if min_list == []:
+		return store_dict
 
 	store_dict['Min'].append(min_list[0])
 	iCount = 0
@@ -307,9 +550,15 @@ def estimate_extrema(hist_dict, window_size, order_num, num_peaks_desired):
 				break
 		else:
 			store_dict['Max'].append(max_list[max_index])
+
+		# No maximum follows the last minimum, so there are no more peaks (and no minimum 
+		# after them) to find
+		if max_index == len(max_list):
+			break
+
 		while min_list[min_index] < store_dict['Max'][-1]:
 			min_index += 1
-			if min_index == len(max_list):
+			if min_index == len(min_list):
 				break
 		else:
 			store_dict['Min'].append(min_list[min_index])
@@ -318,7 +567,7 @@ def estimate_extrema(hist_dict, window_size, order_num, num_peaks_desired):
 	return store_dict
 
 		
-def find_extrema(hist_dict, num_peaks_desired):
+def find_extrema(hist, num_peaks_desired):
 	
 	"""
 	Returns a dict with 2 keys (Max and Min) with the values for each of these keys being 
@@ -326,10 +575,14 @@ def find_extrema(hist_dict, num_peaks_desired):
 	minimum.
 	"""
 
-	hist_dict = pad_data(hist_dict)
+	(occurrences, frequencies) = pad_data(hist)
+
+	# Share smoothed data and extrema between the searches for each number of peaks
+	engine = ExtremaEngine(frequencies)
+
 	score_list = []
 	for i in xrange(max(2, num_peaks_desired), num_peaks_desired + 4):
-		score_list.append([find_extrema_main(hist_dict, i), i]) 
+		score_list.append([find_extrema_main(engine, i), i]) 
 	sorted_scores = sorted(score_list, key = lambda x: x[0][1])
 
 	extrema = sorted_scores[0][0][0]
@@ -340,9 +593,12 @@ def find_extrema(hist_dict, num_peaks_desired):
 	return {'Max': extrema['Max'][:num_peaks_desired], 'Min': extrema['Min'][:num_peaks_desired + 1]}
 
 
-def find_extrema_main(hist_dict, num_peaks_desired):
+def find_extrema_main(engine, num_peaks_desired):
 	(window_size, order_num) = (10, 10)
 
+	# Read once, rather than for every (window, order) pair scored
+	desired_border = generate_settings()['desired_border']
+
 	while True:
 		score_list = []
 		for (w, o) in [(window_size, order_num), (window_size + 5, order_num), 
@@ -350,8 +606,10 @@ def find_extrema_main(hist_dict, num_peaks_desired):
 			(window_size, order_num - 1)]:
 
 			if (w > 0) and (o > 0):
-				score_list.append(((w, o), 
-					calculate_ex_score(estimate_extrema(hist_dict, w, o, num_peaks_desired))))
+				if (w, o, num_peaks_desired) not in engine.scores:
+					engine.scores[(w, o, num_peaks_desired)] = calculate_ex_score(
+						estimate_extrema(engine, w, o, num_peaks_desired), desired_border)
+				score_list.append(((w, o), engine.scores[(w, o, num_peaks_desired)]))
 
 		sort_scores = sorted(score_list, key = lambda x: x[1])
 
@@ -363,12 +621,12 @@ def find_extrema_main(hist_dict, num_peaks_desired):
 		
 		# Current estimate is the best we can do
 		elif sort_scores[0][0] == (window_size, order_num):
-			extrema = estimate_extrema(hist_dict, window_size, order_num, num_peaks_desired)
+			extrema = estimate_extrema(engine, window_size, order_num, num_peaks_desired)
 			return [extrema, sort_scores[0][1]]
 
 		# Perfect score, so return
 		elif sort_scores[0][1] == 0.0:
-			extrema = estimate_extrema(hist_dict, sort_scores[0][0][0], sort_scores[0][0][1], 
+			extrema = estimate_extrema(engine, sort_scores[0][0][0], sort_scores[0][0][1], 
 				num_peaks_desired)
 			return [extrema, sort_scores[0][1]]
 
@@ -379,46 +637,150 @@ def find_extrema_main(hist_dict, num_peaks_desired):
 
 
 		
-def pad_data(hist_dict):
+def pad_data(hist):
 
 	"""
 	This function is required when, for example, simulated data is being used, as frequency 
 	values are not generated for all occurrence values.	That is, not all points on the 
 	x-axis will be used when the graph is plotted. This causes problems when trying to use 
 	data points as if they are spaced at unit length along the x-axis. To combat this problem, 
-	this function returns a dict which contains frequency values for all x values (most of 
-	which could well be 0). This allows the data to be used in the correct manner. 
+	this function returns arrays (occurrences, frequencies) which contain frequency values 
+	for all x values in the dense range of the histogram (most of which could well be 0). 
+	This allows the data to be used in the correct manner. 
 	"""
 
-	for i in xrange(1, sorted(hist_dict.keys())[-1]):
-		hist_dict.setdefault(i,0)	
-
-	return hist_dict
+	return hist.padded()
 
 
 def compute_genome_size(hists_dict):
 
-	genome_size_list = []
-	for size in hists_dict.keys():
-		# Calculate more than the first extremum in order to more accurately estimate the peaks
-		mode = find_extrema(hists_dict[size], 3)['Max'][0]
- 		# Genome Size = total num of k-mer words / first mode of occurences
-		genome_size = compute_num_kmer_words(hists_dict[size]) / mode
-		genome_size_list.append((size, genome_size))
-	
-	return genome_size_list
+	return [(estimate["k"], estimate["genome_size"]) for estimate in 
+		estimate_genome_sizes(hists_dict)["estimates"] if "genome_size" in estimate]
+
+
+def estimate_genome_sizes(hists_dict):
+
+	"""
+	Estimates the genome size from the Histogram for each k-mer size in hists_dict, taking 
+	the mode of each spectrum to be the first maximum found by find_extrema. Returns a dict holding a list of 
+	estimates (one dict per k-mer size, with an 'error' instead of a 'genome_size' if no 
+	suitable extrema could be found), and the trend in the estimates across k-mer sizes 
+	(see genome_size_trend).
+	"""
+
+	estimates = []
+	for size in sorted(hists_dict.keys()):
+		estimate = {"k": size, "kmer_words": compute_num_kmer_words(hists_dict[size])}
+		try:
+			# Calculate more than the first extremum in order to more accurately estimate 
+			# the peaks
+			with REPORT.stage("find extrema", k = size, num_peaks = 3):
+				estimate["mode"] = find_extrema(hists_dict[size], 3)['Max'][0]
+		except Exception as e:
+			estimate["error"] = str(e)
+		else:
+			# Genome Size = total num of k-mer words / first mode of occurences
+			estimate["genome_size"] = estimate["kmer_words"] / estimate["mode"]
+		estimates.append(estimate)
+
+	trend = genome_size_trend([estimate["k"] for estimate in estimates 
+		if "genome_size" in estimate], [estimate["genome_size"] for estimate in estimates 
+		if "genome_size" in estimate])
+
+	return {"estimates": estimates, "trend": trend}
+
+
+def genome_size_trend(k_sizes, genome_sizes):
+
+	"""
+	Returns a dict describing how the genome size estimates vary with k-mer size: their mean, 
+	coefficient of variation and the slope of the least squares line through them (in base 
+	pairs per unit increase in k). Estimates which drift with k suggest that errors or 
+	repeats are distorting the spectra. Values which cannot be computed are None.
+	"""
 
+	trend = {"mean": None, "coefficient_of_variation": None, "slope": None}
+	if len(genome_sizes) == 0:
+		return trend
 
-def plot_graph(hists_dict, graph_title, use_dots, max_peak = None):
+	genome_sizes = np.asarray(genome_sizes, dtype = np.float64)
+	trend["mean"] = float(genome_sizes.mean())
+	if trend["mean"] != 0:
+		trend["coefficient_of_variation"] = float(genome_sizes.std() / trend["mean"])
+	if len(set(k_sizes)) > 1:
+		trend["slope"] = float(np.polyfit(np.asarray(k_sizes, dtype = np.float64), 
+			genome_sizes, 1)[0])
+
+	return trend
+
+
+# File a plot is saved to when it cannot be shown
+DEFAULT_PLOT_NAME = "k_mer_spectrum.png"
+
+
+def has_display():
+
+	if sys.platform == "darwin" or sys.platform.startswith("win"):
+		return True
+
+	return os.environ.get("DISPLAY", "") != "" or os.environ.get("WAYLAND_DISPLAY", "") != ""
+
+
+def import_pyplot(headless = False):
+
+	"""
+	Imports matplotlib.pyplot on first use, so that subcommands which never plot do not pay
+	for loading it. The non-interactive Agg backend is used if headless is set (i.e. plots 
+	are only to be saved to files), or if there is no display (unless a backend has been 
+	chosen through MPLBACKEND).
+	"""
+
+	import matplotlib
+	if headless or (not has_display() and "MPLBACKEND" not in os.environ):
+		matplotlib.use("Agg")
+
+	import matplotlib.pyplot as plt
+
+	return plt
+
+
+def plot_graph(hists_dict, graph_title, use_dots, max_peak = None, out_path = "", 
+	max_points = DEFAULT_MAX_POINTS):
+
+	with REPORT.stage("plot", out_path = out_path):
+		plot_spectra(hists_dict, graph_title, use_dots, max_peak, out_path, max_points)
+
+	return
+
+
+def plot_spectra(hists_dict, graph_title, use_dots, max_peak = None, out_path = "", 
+	max_points = DEFAULT_MAX_POINTS):
+
+	"""
+	Plots the spectrum of each Histogram in hists_dict, within the axis limits given in the 
+	settings. If out_path is given, the plot is saved there (in the format given by its 
+	extension, e.g. .png, .svg or .pdf) without needing a display; otherwise it is shown, 
+	or saved as DEFAULT_PLOT_NAME if there is no display. Each spectrum is cut down to about 
+	max_points points (see downsample.downsample_series), so that long tails neither slow 
+	down drawing nor bloat vector files; 0 plots every point.
+	"""
+
+	plt = import_pyplot(headless = out_path != "")
+	settings = generate_settings()
+
+	# A figure of its own, so that several plots can be drawn in turn by one process
+	figure = plt.figure()
 
 	k_mer_sizes = hists_dict.keys()
 	for size in k_mer_sizes:
-		padded_data = pad_data(hists_dict[size])
+		(occurrences, frequencies) = downsample_series(*hists_dict[size].items(), 
+			max_points = max_points, lower = settings['x_lower'], upper = settings['x_upper'], 
+			log_scale = settings['x_scale'] == "log")
 
 		if use_dots:
-			plt.plot(padded_data.keys(), padded_data.values(), 'o')
+			plt.plot(occurrences, frequencies, 'o')
 		else:
-			plt.plot(padded_data.keys(), padded_data.values())
+			plt.plot(occurrences, frequencies)
 
 		if max_peak is not None:
 
@@ -437,8 +799,6 @@ def plot_graph(hists_dict, graph_title, use_dots, max_peak = None):
 					for x in ordinates:
 						plt.axvline(x, c = 'r')
 
-	settings = generate_settings()
-				
 	plt.xlim(settings['x_lower'], settings['x_upper'])
 	plt.ylim(settings['y_lower'], settings['y_upper'])
 	plt.xscale(settings['x_scale'])
@@ -450,96 +810,147 @@ def plot_graph(hists_dict, graph_title, use_dots, max_peak = None):
 	plt.legend(hists_dict.keys())
 	plt.tick_params(labelright = True)
 
-	plt.show()
+	if out_path != "":
+		plt.savefig(out_path)
+		print "Saved plot to " + out_path
+	elif plt.get_backend().lower() == "agg":
+		out_path = os.path.join(os.getcwd(), DEFAULT_PLOT_NAME)
+		print "No display available, so saving plot to " + out_path
+		plt.savefig(out_path)
+	else:
+		plt.show()
+
+	plt.close(figure)
 	
 	return
 
 
-def compute_num_kmer_words(hist_dict):
+def check_reads_extensions(path_spec):
 
-	total_kmer_words = 0
-	total_kmer_words = sum(occurrence * hist_dict[occurrence] for occurrence in hist_dict)
-	
-	return total_kmer_words
+	"""
+	Raises an exception unless every file given by 'path_spec' is FASTA or FASTQ, judged by 
+	its extension (ignoring any compression extension).
+	"""
+
+	for path in expand_inputs(path_spec):
+		if base_extension(path) not in ["fasta", "fastq"]:
+			raise Exception("Incorrect file extension: " + path + " must be either .fasta or " + 
+				".fastq (which may be compressed with gzip, bzip2 or xz)")
+
+	return
+
+
+def compute_num_kmer_words(hist):
+
+	return hist.total_kmer_words()
 	
 
-def generate_sample(hist_dict, sample_size):
+def generate_sample(hist, sample_size, seed = None):
 	
 	"""
-	Generates and returns a sample of size 'sample_size' from 'hist_dict'. Each iteration 
-	samples a single occurrence/frequency pair, and stores them in dict 'sample'. This dict 
-	is then returned in the same format as a hist_dict.
+	Generates and returns a sample of size 'sample_size' from 'hist'. All k-mer words are 
+	drawn in a single batch, and the number falling in each occurrence is returned as a 
+	Histogram. To draw many samples from the same histogram (e.g. for bootstrapping), use a 
+	HistogramSampler directly so that the cumulative distribution is only computed once.
 	""" 
 	
-	sample = {}
-	total_kmer_reads = compute_num_kmer_words(hist_dict)
-	
-	for i in xrange(sample_size):
-		x = random.randint(1,total_kmer_reads)
-		iCount = hist_dict[1]
-		j = 1
-		for j in hist_dict.keys():
-			iCount += j * hist_dict[j]
-			if iCount > x:
-				break
-			j += 1
-		
-		# Increment occurrence frequency count by 1, add occurrence to sample with value 1
-		# if previously unobserved
-		sample[j] = sample.get(j,0) + 1 
-	
-	return sample
+	return HistogramSampler(hist, seed).sample(sample_size)
 
 
-def compute_hist_from_fast(input_file_path, k_size, processors, hash_size):
-	
+def count_mer_database(input_file_path, k_size, processors, hash_size):
+
 	"""
-	Uses Jellyfish to count k-mers of length k_size from input file. 
+	Uses 'jellyfish count' to count k-mers of length k_size from the input files (see 
+	inputs.expand_inputs) into a Jellyfish database, and returns its path. 
 	"""
 
 	if (processors == 1) and (hash_size == 100000000):
-		print "Number of processors used and hash size have both been left at their default"+ \
-			"\nvalues. This is not a problem, but was probably not what you intended."
+		print "Number of processors used and hash size have both been left at their " + \
+			"default\nvalues. This is not a problem, but was probably not what you intended."
 
-	print "Computing histogram data for k = " + str(k_size) + " for first time"
-	print "Counting k-mers for k = " + str(k_size)
+	mer_count_file = input_stem(input_file_path) + "_mer_counts_" + str(k_size) + ".jf"
+	generators_path = mer_count_file + ".generators"
 
-	file_name = input_file_path.split("/")[-1].split(".")[0]
-	mer_count_file = file_name + "_mer_counts_" + str(k_size) + ".jf"
-	current_dir = os.path.dirname(__file__)
+	# Count occurences of k-mers of size "k_size" in input files. The database is only 
+	# moved into place once complete, as its existence is taken to mean it need not be 
+	# counted again
+	try:
+		exit_status = REPORT.call("jellyfish count (k = " + str(k_size) + ")", 
+			[locate_binary("jellyfish"), "count", "-m", str(k_size), "-s", str(hash_size), 
+			"-t", str(processors), "-C"] + jellyfish_input_args(input_file_path, processors, 
+			generators_path) + ['-o', partial_path(mer_count_file)])
+	finally:
+		if os.path.isfile(generators_path):
+			os.remove(generators_path)
+	require_success("jellyfish count", exit_status)
+	os.rename(partial_path(mer_count_file), mer_count_file)
 
-	jellyfish_bin_path = locate_binary("jellyfish")
+	return mer_count_file
 
-	# Count occurences of k-mers of size "k_size" in input file  
-	subprocess.call([jellyfish_bin_path, "count", "-m", str(k_size), "-s", str(hash_size), 
-		"-t", str(processors), "-C", input_file_path, '-o', mer_count_file])
 
-	print "Processing histogram for k = " + str(k_size)
+def compute_hist_from_fast(input_file_path, k_size, processors, hash_size, 
+	counter = "jellyfish", native_memory = 1024 ** 3):
 	
-	file_name = str(input_file_path.split("/")[-1].split(".")[0]) + "_" + str(k_size) + "mer"
+	"""
+	Uses Jellyfish (or, if counter is "native", the built-in counter with a memory limit 
+	of native_memory bytes) to count k-mers of length k_size from the input files (see 
+	inputs.expand_inputs), and returns the resulting Histogram. Compressed files are 
+	decompressed as they are counted (see inputs.jellyfish_input_args). The output of 
+	'jellyfish histo' is parsed straight from its pipe, and a copy is saved as a .hgram file 
+	in the background. 
+	"""
+
+	print "Computing histogram data for k = " + str(k_size) + " for first time"
+	print "Counting k-mers for k = " + str(k_size)
+
+	if counter == "native":
+		with REPORT.stage("count k-mers", k = k_size, counter = "native"):
+			hist = native_counter.count_histogram(input_file_path, k_size, processors, 
+				native_memory)
+		histo_output = hist.to_string()
+
+	else:
+		mer_count_file = count_mer_database(input_file_path, k_size, processors, hash_size)
+		jellyfish_bin_path = locate_binary("jellyfish")
+
+		print "Processing histogram for k = " + str(k_size)
 	
-	with open(file_name + ".hgram","w") as out_file:
-		# Computes histogram data and stores in "out_file"
-		subprocess.call([jellyfish_bin_path, "histo", mer_count_file], stdout = out_file)
+		# Computes histogram data, reading it directly from Jellyfish's output
+		histo = REPORT.popen("jellyfish histo (k = " + str(k_size) + ")", 
+			[jellyfish_bin_path, "histo", mer_count_file], stdout = subprocess.PIPE)
+		histo_output = histo.communicate()[0]
+		hist = Histogram.from_string(histo_output)
+
+	file_name = input_stem(input_file_path) + "_" + str(k_size) + "mer"
+
+	# Not a daemon thread, so the .hgram file is always completed before exiting
+	threading.Thread(target = atomic_write, args = (file_name + ".hgram", histo_output)).start()
 	
 	print "Finished for k = " + str(k_size)
+
+	return hist
 	
 
-def generate_histogram(input_file_path, k_mer_size, processors, hash_size, force_jellyfish):
+def generate_histogram(input_file_path, k_mer_size, processors, hash_size, force_jellyfish, 
+	counter = "jellyfish", native_memory = 1024 ** 3):
 	
 	"""
 	Essentially ensures that a .hgram file exists and is stored at the correct location for
-	the file stored at 'input_file_path'. 
+	the file stored at 'input_file_path'. If k-mers had to be counted or a .dat file parsed, 
+	the resulting Histogram is returned (while the .hgram file may still be being written), 
+	otherwise None is returned.
 	"""
 	
-	file_name = input_file_path.split("/")[-1].split(".")[0]
-	extension = input_file_path.split("/")[-1].split(".")[-1]
+	file_name = input_stem(input_file_path)
+	extension = input_extension(input_file_path)
 	
 	if os.path.isfile(file_name + "_" + str(k_mer_size) + "mer.hgram") and not force_jellyfish:
 		return
 	
 	elif extension in ["data","dat"]:
-		parse_data.parse(os.path.abspath(input_file_path), k_mer_size)
+		with REPORT.stage("parse .dat file", k = k_mer_size):
+			return parse_data.parse(expand_inputs(input_file_path)[0], file_name + "_" + 
+				str(k_mer_size) + "mer.hgram")
 		
 	elif extension == "hgram":
 		if str(k_mer_size) != file_name[-len(str(k_mer_size)) - 3:-3]:
@@ -548,57 +959,185 @@ def generate_histogram(input_file_path, k_mer_size, processors, hash_size, force
 			return
 	
 	else:
-		compute_hist_from_fast(input_file_path, k_mer_size, processors, hash_size)
+		return compute_hist_from_fast(input_file_path, k_mer_size, processors, hash_size, 
+			counter, native_memory)
 
-def calculate_hist_dict(input_file_path, k_size, processors, hash_size, force_jellyfish):
+def open_histogram_cache():
 
 	"""
-	Returns dictionary consisting of keys corresponding to occurrences and values 
-	corresponding to frequencies.
+	Returns the HistogramCache stored at the location given in the settings file.
+	"""
+
+	settings = generate_settings()
+
+	return HistogramCache(settings['cache_dir'] or DEFAULT_CACHE_DIR, settings['cache_max_bytes'])
+
+
+def counter_version(counter = "jellyfish"):
+
+	"""
+	Returns the version string reported by the Jellyfish executable (or the version of the 
+	native counter), so that histograms counted by different versions are cached separately. 
+	Each executable is only asked once per run. Returns None if Jellyfish cannot be found, 
+	as a cached histogram may still be used (see calculate_hist_dict). 
+	"""
+
+	if counter == "native":
+		return native_counter.COUNTER_VERSION
+
+	jellyfish_bin_path = locate_binary("jellyfish", error_check = False)
+	if not os.path.isfile(jellyfish_bin_path):
+		return None
+
+	if jellyfish_bin_path not in JELLYFISH_VERSIONS:
+		version = REPORT.popen("jellyfish version", [jellyfish_bin_path, "--version"], 
+			stdout = subprocess.PIPE).communicate()[0]
+		JELLYFISH_VERSIONS[jellyfish_bin_path] = version.strip()
+
+	return JELLYFISH_VERSIONS[jellyfish_bin_path]
+
+
+def calculate_hist_dict(input_file_path, k_size, processors, hash_size, force_jellyfish, 
+	use_cache = True, hash_input = False, counter = "jellyfish", native_memory = 1024 ** 3):
+
+	"""
+	Returns a Histogram of the frequency with which each occurrence is observed. If use_cache 
+	is set, histograms are looked up in (and saved to) the histogram cache, keyed by the 
+	identity of the input file (or a hash of its contents if hash_input is set). Where 
+	Jellyfish cannot be found (e.g. on a node without it), a histogram cached from the same 
+	reads by any version of Jellyfish is used; Jellyfish is only needed on a miss. 
 	"""
 	
-	generate_histogram(input_file_path, k_size, processors, hash_size, force_jellyfish)
-		
-	file_name = str(input_file_path.split("/")[-1].split(".")[0]) + "_" + str(k_size) + "mer" 
-	extension = str(input_file_path.split("/")[-1].split(".")[-1])
+	file_name = input_stem(input_file_path) + "_" + str(k_size) + "mer" 
+	extension = input_extension(input_file_path)
+
+	cache = None
+	if use_cache:
+		cache = open_histogram_cache()
+		(family, version) = (None, None)
+		if extension in ["hgram", "data", "dat"]:
+			key = cache.key(input_file_path, k_size, content_hash = hash_input)
+		else:
+			version = counter_version(counter)
+			key = cache.key(input_file_path, k_size, hash_size, version, hash_input)
+			# Shared by the entries for these reads from every version of the counter
+			family = cache.key(input_file_path, k_size, hash_size, counter, hash_input)
+
+		if not force_jellyfish:
+			with REPORT.stage("read cached histogram", k = k_size) as record:
+				if family is not None and version is None:
+					hist = cache.get_family(family)
+				else:
+					hist = cache.get(key)
+				record["found"] = hist is not None
+			if hist is not None:
+				return hist
+
+	# Having missed the cache, a .hgram already in the working directory may be stale
+	hist = generate_histogram(input_file_path, k_size, processors, hash_size, 
+		force_jellyfish or use_cache, counter, native_memory)
 	
-	if extension == "hgram":
-		hgram_name = input_file_path
+	if hist is None:
+		with REPORT.stage("read .hgram file", k = k_size):
+			if extension == "hgram":
+				# Read through the parser, as the input may be compressed
+				hist = parse_data.parse(expand_inputs(input_file_path)[0])
+			else:
+				hist = Histogram.from_hgram(file_name + ".hgram")
+
+	if cache is not None:
+		cache.put(key, hist, ",".join(os.path.abspath(path) for path in 
+			expand_inputs(input_file_path)), family)
+
+	return hist
+
+
+def calculate_hists_dict(input_file_path, k_sizes, processors, hash_size, force_jellyfish, 
+	use_cache = True, hash_input = False, max_hash_total = 0, counter = "jellyfish", 
+	native_memory = 1024 ** 3):
+
+	"""
+	Returns a dict with each k-mer size in 'k_sizes' as a key, and the Histogram for that 
+	k-mer size as its value. If k-mers have to be counted, several k-mer sizes are counted 
+	at once: the processors are split between the concurrent Jellyfish runs, and no more 
+	runs are started than fit within max_hash_total hash entries (if non-zero). The native 
+	counter runs its own pool of processes, so counts one k-mer size at a time. 
+	"""
+
+	extension = input_extension(input_file_path)
+	if extension in ["hgram", "data", "dat"] and len(expand_inputs(input_file_path)) > 1:
+		raise Exception("Only one histogram file may be given")
+	if extension not in ["hgram", "data", "dat"] and counter == "jellyfish":
+		# Fail here rather than in a worker thread if Jellyfish cannot be found
+		locate_binary("jellyfish")
+
+	if counter == "native":
+		(num_jobs, job_processors) = (1, processors)
 	else:
-		hgram_name = file_name + ".hgram"
-		
-	with open(hgram_name, 'r') as hgram_data:
+		(num_jobs, job_processors) = plan_jobs(len(k_sizes), processors, hash_size, 
+			max_hash_total)
+	if num_jobs > 1:
+		print "Computing histograms for " + str(num_jobs) + " k-mer sizes at a time, using " + \
+			str(job_processors) + " processors each"
 
-		store_dict = {}
-		for line in hgram_data.readlines():
-			occ_and_freq = line.split(" ")
-			store_dict[int(occ_and_freq[0])] = int(occ_and_freq[1])
-	
-	return store_dict
+	hists_dict = {}
+	for (size, hist) in run_concurrently(lambda size: calculate_hist_dict(input_file_path, 
+		size, job_processors, hash_size, force_jellyfish, use_cache, hash_input, counter, 
+		native_memory), k_sizes, num_jobs):
+
+		if num_jobs > 1:
+			print "Histogram ready for k = " + str(size)
+		hists_dict[size] = hist
+
+	return hists_dict
 
 
-def argument_parsing():
+def argument_parsing(argv = None):
 	
 	"""
 	Uses argparse module to create an argument parser. Its first argument is the function which 
-	the user wishes to execute.  
+	the user wishes to execute. The command line is parsed from argv if given (e.g. for each 
+	sample of a batch), and otherwise from sys.argv.
 	"""
 
 	# Most basic parser - all it asks for is path to some data
 	basic_options = argparse.ArgumentParser(add_help = False,
 		description = "A tool for computing genomic characteristics using k-mers")
 
-	basic_options.add_argument("path", type = str, help = "location at which the data is stored")
+	basic_options.add_argument("path", type = str, help = "location at which the data is \
+		stored. Several read files may be given separated by commas, as glob patterns (e.g. \
+		'reads/*.fastq.gz'), or both, and may be compressed with gzip, bzip2 or xz")
 	basic_options.add_argument("-p", "--processors", 
 		help = "maximum number of CPUs used (default: 1)", default = 1, type = int)
 	basic_options.add_argument("-s", "--hash-size", 
 		help = "number of entries in Jellyfish's hash table. Only relevant if Jellyfish has to \
 		count k-mers (default: 100,000,000)", 
 		default = 100000000, type = int)
+	basic_options.add_argument("-c", "--counter", help = "k-mer counter to use when k-mers \
+		have to be counted (default: jellyfish)", type = str, default = "jellyfish", 
+		choices = ["jellyfish", "native"])
+	basic_options.add_argument("--native-memory", help = "approximate memory limit in MB for \
+		the native k-mer counter (default: 1024)", default = 1024, type = int)
+	basic_options.add_argument("--max-hash-total", help = "maximum total number of hash \
+		entries used by Jellyfish runs counting different k-mer sizes at once, or 0 for no \
+		limit (default: 0)", default = 0, type = int)
 	basic_options.add_argument("-f", "--force-jellyfish", help =  "force Jellyfish to be run on\
 		new data even if k-mers already appear to have been counted", action = "store_true")
+	basic_options.add_argument("--no-cache", help = "neither read histograms from nor save \
+		them to the histogram cache", action = "store_true")
+	basic_options.add_argument("--hash-input", help = "identify input files in the histogram \
+		cache by a hash of their contents, rather than their path, size and modification time",
+		action = "store_true")
 	basic_options.add_argument("--jellyfish-bin", help = "location of Jellyfish executable", 
 		type = str, nargs = "?", default = "")
+	basic_options.add_argument("--save-settings", help = "save settings given on the command \
+		line (such as executable locations and axis limits) in the settings file for later \
+		runs", action = "store_true")
+	basic_options.add_argument("--report", help = "file in which to save a JSON report of \
+		the time, CPU, memory and I/O used by each stage of this run", type = str, 
+		default = "")
+	basic_options.add_argument("--progress", help = "show the running stages on a line of \
+		their own on stderr", action = "store_true")
 	
 	# Actual parser which is used
 	parser = argparse.ArgumentParser()
@@ -622,6 +1161,14 @@ def argument_parsing():
 	some_repeats.add_argument("-d", "--assembler_k",  
 		help = "k-mer size for assembler (must be smaller than overall k-mer size)",
 		type = int, default = 31)
+	some_repeats.add_argument("--words-format", help = "format in which to write k-mer \
+		words for the assembler (default: fastq)", type = str, default = "fastq", 
+		choices = ["fastq", "fasta"])
+	some_repeats.add_argument("--gzip-words", help = "gzip the k-mer words written for the \
+		assembler", action = "store_true")
+	some_repeats.add_argument("--masked-fasta", help = "also write a copy of the reference \
+		with the repeats replaced by Xs for each mask (masks are always saved as intervals)", 
+		action = "store_true")
 	some_repeats.add_argument("--spades-bin", help = "location of SPAdes executable",
 		type = str, nargs = "?", default = "")
 	some_repeats.add_argument("--soap-bin", help = "location of SOAPdenovo executable",
@@ -652,12 +1199,23 @@ def argument_parsing():
 		default = 0)
 	plot_subparser.add_argument("-y", "--ylim", help = "set new y-axis limit", type = int, 
 		default = 0)
+	plot_subparser.add_argument("-O", "--output", help = "file to save the plot to, without \
+		needing a display, in the format given by its extension (e.g. .png, .svg or .pdf)", 
+		type = str, default = "")
+	plot_subparser.add_argument("--max-points", help = "approximate number of points \
+		plotted for each spectrum, keeping its peaks and troughs, or 0 to plot every point \
+		(default: " + str(DEFAULT_MAX_POINTS) + ")", type = int, default = DEFAULT_MAX_POINTS)
 	plot_subparser.set_defaults(func = "plot")
 
 	size_subparser.set_defaults(func = "size")
 
 	repeats_subparser.add_argument("max_peak", 
 		help = "highest peak number to consider", type = int)
+	repeats_subparser.add_argument("-j", "--peak-jobs", 
+		help = "number of peaks to process at once, sharing the processors between them \
+		(default: 1)", type = int, default = 1)
+	repeats_subparser.add_argument("--resume", help = "skip the stages already completed by \
+		an earlier run with the same inputs and parameters", action = "store_true")
 	repeats_subparser.set_defaults(func = "repeats")
 
 	indiv_repeats_subparser.add_argument("peak_name", type = str, 
@@ -666,7 +1224,18 @@ def argument_parsing():
 	indiv_repeats_subparser.add_argument("u_lim", type = int, help = "upper limit of range")
 	indiv_repeats_subparser.set_defaults(func = "indiv-repeats")
 
-	args = parser.parse_args()
+	batch_subparser = subparsers.add_parser("batch", help = "run the samples listed in a \
+		manifest, each in a directory of its own (see batch.py for the format)")
+	batch_subparser.add_argument("manifest", type = str, help = "location of the manifest")
+	batch_subparser.add_argument("-p", "--processors", help = "maximum number of CPUs used by \
+		all samples together (default: 1)", default = 1, type = int)
+	batch_subparser.add_argument("-m", "--memory", help = "approximate memory limit in MB \
+		for all samples together, or 0 for no limit (default: 0)", default = 0, type = int)
+	batch_subparser.add_argument("-o", "--out-dir", help = "directory in which to make each \
+		sample's directory (default: batch_output)", type = str, default = "batch_output")
+	batch_subparser.set_defaults(func = "batch")
+
+	args = parser.parse_args(argv)
 
 	return args
 
@@ -675,8 +1244,54 @@ def main():
 
 	args = argument_parsing()
 
-	# Dict in which to store k-mer size as key, and hist_dict for that k-mer size as value:
-	hists_dict = {}
+	if args.func == "batch":
+		samples = read_manifest(args.manifest, argument_parsing, os.path.abspath(args.out_dir))
+		if any(sample.args.func == "plot" for sample in samples):
+			# Imported once here, rather than again by each sample's process
+			import_pyplot(headless = True)
+		failed = run_batch(samples, run_sample, os.path.abspath(args.out_dir), 
+			args.processors, args.memory * 1024 ** 2)
+		if failed != []:
+			print str(len(failed)) + " of " + str(len(samples)) + " samples failed: " + \
+				", ".join(failed)
+			sys.exit(1)
+		return
+
+	if args.progress:
+		REPORT.show_progress()
+	try:
+		run(args)
+	finally:
+		# The report is saved even if the run fails, as the failing stage is recorded in it
+		REPORT.close()
+		if args.report != "":
+			REPORT.save(args.report)
+
+	return
+
+
+def run_sample(sample):
+
+	"""
+	Runs one sample of a batch (see batch.run_batch), saving its report in its directory. 
+	This runs in a process of its own, so starts a fresh report.
+	"""
+
+	global REPORT
+	REPORT = RunReport([sys.argv[0]] + sample.argv)
+
+	# Samples run unattended, so plots are always saved (in the sample's directory)
+	if sample.args.func == "plot" and sample.args.output == "":
+		sample.args.output = DEFAULT_PLOT_NAME
+	try:
+		run(sample.args)
+	finally:
+		REPORT.save(sample.args.report or REPORT_NAME)
+
+	return
+
+
+def run(args):
 
 	if args.jellyfish_bin != "":
 		update_settings("jellyfish_bin", args.jellyfish_bin)
@@ -690,12 +1305,7 @@ def main():
 			if args.gap_closer_bin != "":
 				update_settings("gap_closer_bin", args.gap_closer_bin)
 
-	for size in args.k:
-		hists_dict[size] = calculate_hist_dict(args.path, size, args.processors, 
-			args.hash_size, args.force_jellyfish)
-
 	if args.func == "plot":
-
 		if args.xlim != 0:
 			if args.xlim < 0:
 				print "New x-axis limit is negative - probably not what you meant"
@@ -706,42 +1316,67 @@ def main():
 				print "New y-axis limit is negative - probably not what you meant"
 			update_settings("y_upper", args.ylim)	
 
+	# Settings given on the command line only apply to this run unless explicitly saved
+	if args.save_settings:
+		save_settings()
+
+	# Dict in which to store k-mer size as key, and Histogram for that k-mer size as value:
+	hists_dict = calculate_hists_dict(args.path, args.k, args.processors, args.hash_size, 
+		args.force_jellyfish, not args.no_cache, args.hash_input, args.max_hash_total, 
+		args.counter, args.native_memory * 1024 ** 2)
+
+	if args.func == "plot":
 		graph_title = args.title or args.path # If user has entered title then set title
-		plot_graph(hists_dict, graph_title, args.dots, args.lines)
+		plot_graph(hists_dict, graph_title, args.dots, args.lines, args.output, 
+			args.max_points)
 
 	if args.func == "size":
-		for size in compute_genome_size(hists_dict):
-			print "Size calculated to be " + str(size[1]) + " base pairs (using " + \
-				str(size[0]) + "mers)"
+		estimation = estimate_genome_sizes(hists_dict)
+		for estimate in estimation["estimates"]:
+			if "genome_size" in estimate:
+				print "Size calculated to be " + str(estimate["genome_size"]) + \
+					" base pairs (using " + str(estimate["k"]) + "mers)"
+			else:
+				print "Size could not be calculated using " + str(estimate["k"]) + "mers: " + \
+					estimate["error"]
+
+		trend = estimation["trend"]
+		if trend["slope"] is not None:
+			print "Sizes change by " + "%.1f" % trend["slope"] + " base pairs per unit " + \
+				"increase in k (coefficient of variation " + \
+				"%.2f" % (100 * trend["coefficient_of_variation"]) + "%)"
 
 	if args.func == "repeats":
 
-		extension = ".".join(args.path.split("/")[-1].split(".")[1:])
-
-		if extension not in ["fasta", "fastq"]:
-			raise Exception("Incorrect file extension: file must be either .fasta or .fastq")
+		check_reads_extensions(args.path)
 
 		for size in hists_dict.keys():
-			file_name = args.path.split("/")[-1].split(".")[0]
+			file_name = input_stem(args.path)
+			# The histogram may have come from the cache, a .hgram file or the native 
+			# counter, but the k-mer words are extracted from a Jellyfish database
 			if not os.path.isfile(file_name + "_mer_counts_" + str(size) + ".jf"):
-				compute_hist_from_fast(args.path, size, args.processors, args.hash_size)
+				print "Counting k-mers for k = " + str(size) + " into a Jellyfish database"
+				count_mer_database(args.path, size, args.processors, args.hash_size)
 			find_repeats(hists_dict[size], args.path, args.max_peak, args.assembler, size, 
-				args.assembler_k, args.processors, args.reference)
+				args.assembler_k, args.processors, args.reference, args.peak_jobs, 
+				args.words_format, args.gzip_words, args.masked_fasta, args.resume)
 			print "Finished finding repeats"
 
 	if args.func == "indiv-repeats":
-		extension = ".".join(args.path.split("/")[-1].split(".")[1:])
-
-		if extension not in ["fasta", "fastq"]:
-			raise Exception("Incorrect file extension: file must be either .fasta or .fastq")
+		check_reads_extensions(args.path)
 
 		for size in hists_dict.keys():
-			file_name = args.path.split("/")[-1].split(".")[0]
+			file_name = input_stem(args.path)
+			# The histogram may have come from the cache, a .hgram file or the native 
+			# counter, but the k-mer words are extracted from a Jellyfish database
 			if not os.path.isfile(file_name + "_mer_counts_" + str(size) + ".jf"):
-				compute_hist_from_fast(args.path, size, args.processors, args.hash_size)
+				print "Counting k-mers for k = " + str(size) + " into a Jellyfish database"
+				count_mer_database(args.path, size, args.processors, args.hash_size)
 
-			process_peak(args.path, file_name, args.l_lim, args.u_lim, args.peak_name, 
-				args.reference, args.assembler, size, args.assembler_k, args.processors)
+			# Everything is named after the first read file, which is all the scripts are given
+			process_peak(expand_inputs(args.path)[0], file_name, args.l_lim, args.u_lim, args.peak_name, 
+				args.reference, args.assembler, size, args.assembler_k, args.processors, 
+				None, args.words_format, args.gzip_words)
 			print "Finished finding repeats"
 
 
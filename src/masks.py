@@ -0,0 +1,371 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+
+import numpy as np
+
+from alignments import read_alignments
+
+
+BUFFER_SIZE = 2 ** 20
+
+MASK_CHAR = "X"
+
+# Bits of the combined state of two masks at a position (see _combine)
+IN_FIRST = 1
+IN_SECOND = 2
+
+
+def normalise_intervals(starts, ends):
+
+	"""
+	Returns arrays (starts, ends) of the union of the half-open intervals [starts, ends),
+	sorted, with overlapping or touching intervals merged and empty ones dropped.
+	"""
+
+	starts = np.asarray(starts, dtype = np.int64)
+	ends = np.asarray(ends, dtype = np.int64)
+
+	non_empty = ends > starts
+	starts = starts[non_empty]
+	ends = ends[non_empty]
+	if len(starts) == 0:
+		return (starts, ends)
+
+	order = np.argsort(starts, kind = "mergesort")
+	starts = starts[order]
+	reach = np.maximum.accumulate(ends[order])
+
+	# A new interval begins wherever nothing before it reaches its start
+	first = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1])))
+	last = np.concatenate((first[1:] - 1, [len(starts) - 1]))
+
+	return (starts[first], reach[last])
+
+
+def _combine(first, second, keep):
+
+	"""
+	Sweeps over the boundaries of two normalised interval sets, returning the normalised
+	intervals over which keep(state) is True, where state has the IN_FIRST bit set inside
+	an interval of 'first' and the IN_SECOND bit set inside one of 'second'.
+	"""
+
+	positions = np.concatenate((first[0], first[1], second[0], second[1]))
+	if len(positions) == 0:
+		return normalise_intervals([], [])
+
+	changes = np.concatenate((np.repeat(IN_FIRST, len(first[0])),
+		np.repeat(-IN_FIRST, len(first[1])), np.repeat(IN_SECOND, len(second[0])),
+		np.repeat(-IN_SECOND, len(second[1]))))
+
+	order = np.argsort(positions, kind = "mergesort")
+	(boundaries, first_at) = np.unique(positions[order], return_index = True)
+	states = np.cumsum(np.add.reduceat(changes[order], first_at))
+
+	# The state holds from each boundary up to the next
+	selected = keep(states[:-1])
+
+	return normalise_intervals(boundaries[:-1][selected], boundaries[1:][selected])
+
+
+def format_intervals(chromosome_name, starts, ends):
+
+	"""
+	Returns intervals as text, with 1-based start, inclusive end and length after the
+	chromosome name (the same layout as QC/compare.py).
+	"""
+
+	return "".join("%-20s %12d %12d %12d\n" % (chromosome_name, start + 1, end, end - start)
+		for (start, end) in zip(starts.tolist(), ends.tolist()))
+
+
+class IntervalMask(object):
+
+	"""
+	A set of masked regions of a reference, stored as sorted, non-overlapping, half-open
+	(0-based) intervals for each chromosome, rather than as a copy of the reference with
+	the masked bases replaced by Xs.
+	"""
+
+	def __init__(self, intervals = None):
+
+		# Maps chromosome name to normalised arrays (starts, ends)
+		self.intervals = {}
+		for (name, (starts, ends)) in (intervals or {}).items():
+			if len(starts) > 0:
+				self.intervals[name] = (np.asarray(starts, dtype = np.int64),
+					np.asarray(ends, dtype = np.int64))
+
+
+	@classmethod
+	def from_intervals(cls, names, starts, ends):
+
+		"""
+		Builds a mask from parallel sequences of chromosome names and half-open (0-based)
+		interval bounds, in any order and possibly overlapping.
+		"""
+
+		ids = {}
+		name_ids = np.fromiter((ids.setdefault(name, len(ids)) for name in names),
+			dtype = np.int64)
+		starts = np.asarray(starts, dtype = np.int64)
+		ends = np.asarray(ends, dtype = np.int64)
+
+		intervals = {}
+		for (name, name_id) in ids.items():
+			selected = name_ids == name_id
+			intervals[name] = normalise_intervals(starts[selected], ends[selected])
+
+		return cls(intervals)
+
+
+	@classmethod
+	def from_alignments(cls, alignments):
+
+		"""
+		Builds a mask covering the reference region of each Alignment in 'alignments'.
+		"""
+
+		names = []
+		starts = []
+		ends = []
+		for alignment in alignments:
+			names.append(alignment.subject)
+			starts.append(min(alignment.subject_start, alignment.subject_end) - 1)
+			ends.append(max(alignment.subject_start, alignment.subject_end))
+
+		return cls.from_intervals(names, starts, ends)
+
+
+	@classmethod
+	def from_map(cls, map_path, mapping_quality = None):
+
+		"""
+		Builds a mask directly from a Smalt SSAHA-format alignment map (see
+		alignments.read_alignments), without writing out a masked copy of the reference.
+		"""
+
+		return cls.from_alignments(read_alignments(map_path, mapping_quality))
+
+
+	@classmethod
+	def load(cls, path):
+
+		data = np.load(path)
+		names = data["names"].tolist()
+		offsets = data["offsets"]
+
+		return cls(dict((name, (data["starts"][offsets[i]:offsets[i + 1]],
+			data["ends"][offsets[i]:offsets[i + 1]])) for (i, name) in enumerate(names)))
+
+
+	def save(self, path):
+
+		"""
+		Saves the mask to 'path' in NumPy .npz format, via a temporary file so that an
+		interrupted save never leaves a partial mask behind.
+		"""
+
+		names = self.chromosomes()
+		lengths = [len(self.intervals[name][0]) for name in names]
+		offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+
+		empty = np.zeros(0, dtype = np.int64)
+		tmp_path = path + ".tmp"
+		with open(tmp_path, "wb") as f:
+			np.savez(f, names = np.array(names, dtype = str), offsets = offsets,
+				starts = np.concatenate([self.intervals[name][0] for name in names] + [empty]),
+				ends = np.concatenate([self.intervals[name][1] for name in names] + [empty]))
+		os.rename(tmp_path, path)
+
+
+	def chromosomes(self):
+
+		return sorted(self.intervals.keys())
+
+
+	def get(self, name):
+
+		"""
+		Returns arrays (starts, ends) of the intervals masked on chromosome 'name'.
+		"""
+
+		if name in self.intervals:
+			return self.intervals[name]
+
+		return normalise_intervals([], [])
+
+
+	def _combine(self, other, keep):
+
+		names = set(self.intervals.keys()) | set(other.intervals.keys())
+
+		return IntervalMask(dict((name, _combine(self.get(name), other.get(name), keep))
+			for name in names))
+
+
+	def union(self, other):
+
+		return self._combine(other, lambda states: states != 0)
+
+
+	def intersection(self, other):
+
+		return self._combine(other, lambda states: states == IN_FIRST | IN_SECOND)
+
+
+	def difference(self, other):
+
+		return self._combine(other, lambda states: states == IN_FIRST)
+
+
+	__or__ = union
+	__and__ = intersection
+	__sub__ = difference
+
+
+	def __eq__(self, other):
+
+		if not isinstance(other, IntervalMask):
+			return NotImplemented
+
+		return self.chromosomes() == other.chromosomes() and \
+			all(np.array_equal(self.intervals[name][0], other.intervals[name][0]) and
+				np.array_equal(self.intervals[name][1], other.intervals[name][1])
+				for name in self.intervals)
+
+
+	def __ne__(self, other):
+
+		result = self.__eq__(other)
+		if result is NotImplemented:
+			return result
+
+		return not result
+
+
+	def num_intervals(self):
+
+		return sum(len(starts) for (starts, ends) in self.intervals.values())
+
+
+	def masked_bases(self, name = None):
+
+		"""
+		Returns the number of bases masked on chromosome 'name', or on all chromosomes.
+		"""
+
+		if name is not None:
+			(starts, ends) = self.get(name)
+			return int((ends - starts).sum())
+
+		return sum(self.masked_bases(name) for name in self.intervals)
+
+
+	def coverage_stats(self, chromosome_lengths = None):
+
+		"""
+		Returns a dict mapping each chromosome (and "total") to a dict of the number of
+		intervals and masked bases on it, along with the fraction of the chromosome masked
+		if 'chromosome_lengths' (a dict of chromosome name to length) is given.
+		"""
+
+		names = self.chromosomes()
+		if chromosome_lengths is not None:
+			names = sorted(set(names) | set(chromosome_lengths.keys()))
+
+		stats = {}
+		for name in names:
+			stats[name] = {"intervals": len(self.get(name)[0]),
+				"masked_bases": self.masked_bases(name)}
+		stats["total"] = {"intervals": self.num_intervals(),
+			"masked_bases": self.masked_bases()}
+
+		if chromosome_lengths is not None:
+			for name in chromosome_lengths:
+				stats[name]["fraction"] = stats[name]["masked_bases"] / \
+					float(max(chromosome_lengths[name], 1))
+			stats["total"]["fraction"] = stats["total"]["masked_bases"] / \
+				float(max(sum(chromosome_lengths.values()), 1))
+
+		return stats
+
+
+	def write_intervals(self, out_path):
+
+		with open(out_path, "w", BUFFER_SIZE) as out:
+			for name in self.chromosomes():
+				out.write(format_intervals(name, *self.intervals[name]))
+
+
+	def write_masked_fasta(self, reference_path, out_path, mask_char = MASK_CHAR):
+
+		"""
+		Writes a copy of the FASTA reference at 'reference_path' to 'out_path', with every
+		masked base replaced by mask_char and the line layout otherwise unchanged. Records
+		are matched to chromosomes by the first word of their header. Only one record is
+		held in memory at a time.
+		"""
+
+		def write_record(header, lines):
+			if header is None:
+				return
+			out.write(header)
+
+			name = (header[1:].split() or [""])[0]
+			if name not in self.intervals:
+				out.write("".join(lines))
+				return
+
+			line_lengths = np.array([len(line.rstrip("\r\n")) for line in lines],
+				dtype = np.int64)
+			sequence = np.frombuffer("".join(line.rstrip("\r\n") for line in lines),
+				dtype = np.uint8).copy()
+
+			(starts, ends) = self.intervals[name]
+			coverage = np.zeros(len(sequence) + 1, dtype = np.int64)
+			np.add.at(coverage, np.minimum(starts, len(sequence)), 1)
+			np.add.at(coverage, np.minimum(ends, len(sequence)), -1)
+			sequence[np.cumsum(coverage[:-1]) > 0] = ord(mask_char)
+
+			masked = sequence.tostring()
+			line_ends = np.cumsum(line_lengths).tolist()
+			line_starts = [0] + line_ends[:-1]
+			out.write("".join(masked[start:end] + "\n"
+				for (start, end) in zip(line_starts, line_ends)))
+
+		with open(reference_path, "r", BUFFER_SIZE) as ref, \
+			open(out_path, "w", BUFFER_SIZE) as out:
+			header = None
+			lines = []
+			for line in ref:
+				if line.startswith(">"):
+					write_record(header, lines)
+					header = line
+					lines = []
+				else:
+					lines.append(line)
+			write_record(header, lines)
+
+		return
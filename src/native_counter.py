@@ -0,0 +1,343 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import os
+import math
+import shutil
+import resource
+import tempfile
+import collections
+import multiprocessing
+
+import numpy as np
+
+from histogram import Histogram
+from inputs import expand_inputs
+from compression import open_decompressed, detect_compression
+
+
+COUNTER_VERSION = "native-1"
+
+# Largest k for which a 2-bit encoded k-mer fits in a 64 bit integer
+MAX_K = 32
+
+# Counts above this are folded into a single bin, as with 'jellyfish histo --high'
+DEFAULT_HIGH = 10000
+
+DEFAULT_BATCH_BASES = 4 * 10**6
+
+# Most shard files kept open at once, however high the limit on open files, and the number
+# of open files left for everything else (the inputs, pipes to the workers, imports, etc.)
+MAX_OPEN_SHARDS = 1024
+RESERVED_FILES = 64
+
+# Generous ratio of the decompressed to the compressed size of reads, used to size shards
+COMPRESSION_RATIO = 5
+
+# A, C, G and T (in either case) are encoded as 0-3; anything else breaks the k-mer
+BASE_CODES = np.empty(256, dtype = np.uint8)
+BASE_CODES.fill(4)
+for (code, bases) in enumerate(["Aa", "Cc", "Gg", "Tt"]):
+	for base in bases:
+		BASE_CODES[ord(base)] = code
+
+
+def read_sequences(input_file_path):
+
+	"""
+	Generator which yields each sequence in a FASTA or FASTQ file (which may be compressed)
+	as a string. FASTA records may span several lines; FASTQ records are expected to have
+	one line of sequence.
+	"""
+
+	with open_decompressed(input_file_path) as f:
+		first_line = f.readline()
+
+		if first_line.startswith("@"):
+			line_number = 0
+			for line in f:
+				line_number += 1
+				if line_number % 4 == 1:
+					yield line.rstrip()
+
+		elif first_line.startswith(">"):
+			sequence = []
+			for line in f:
+				if line.startswith(">"):
+					yield "".join(sequence)
+					sequence = []
+				else:
+					sequence.append(line.rstrip())
+			yield "".join(sequence)
+
+		elif first_line != "":
+			raise Exception("Input file is neither FASTA nor FASTQ: " + input_file_path)
+
+
+def read_batches(input_file_path, batch_bases = DEFAULT_BATCH_BASES):
+
+	"""
+	Generator which yields lists of sequences containing roughly batch_bases bases in total,
+	from each of the files given by 'input_file_path' (see inputs.expand_inputs) in turn.
+	"""
+
+	batch = []
+	num_bases = 0
+	for path in expand_inputs(input_file_path):
+		for sequence in read_sequences(path):
+			batch.append(sequence)
+			num_bases += len(sequence)
+			if num_bases >= batch_bases:
+				yield batch
+				batch = []
+				num_bases = 0
+
+	if batch != []:
+		yield batch
+
+
+def canonical_kmers(sequences, k_size):
+
+	"""
+	Returns an array of the 2-bit encoded canonical k-mers (the smaller of each k-mer and
+	its reverse complement) in 'sequences'. K-mers containing anything other than A, C, G
+	or T are skipped.
+	"""
+
+	# Joining with an invalid base stops k-mers spanning two sequences
+	joined = "N".join(sequences)
+	codes = BASE_CODES[np.frombuffer(joined, dtype = np.uint8)]
+	num_kmers = len(codes) - k_size + 1
+	if num_kmers <= 0:
+		return np.zeros(0, dtype = np.uint64)
+
+	invalid = codes > 3
+	invalid_before = np.concatenate(([0], np.cumsum(invalid)))
+	valid = (invalid_before[k_size:] - invalid_before[:num_kmers]) == 0
+
+	codes = np.where(invalid, 0, codes).astype(np.uint64)
+	complements = np.uint64(3) - codes
+	two = np.uint64(2)
+
+	forward = np.zeros(num_kmers, dtype = np.uint64)
+	reverse = np.zeros(num_kmers, dtype = np.uint64)
+	for j in xrange(k_size):
+		forward = (forward << two) | codes[j:j + num_kmers]
+		reverse = (reverse << two) | complements[k_size - 1 - j:k_size - 1 - j + num_kmers]
+
+	return np.minimum(forward, reverse)[valid]
+
+
+def shard_of(kmers, num_shards):
+
+	# Multiplicative hashing, so that shards are evenly sized whatever the k-mer composition
+	mixed = (kmers * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+
+	return (mixed % np.uint64(num_shards)).astype(np.int64)
+
+
+def split_by(kmers, bins, num_bins):
+
+	"""
+	Returns a list of num_bins arrays, the ith holding the k-mers in 'kmers' whose entry in
+	'bins' is i.
+	"""
+
+	order = np.argsort(bins, kind = "mergesort")
+	boundaries = np.cumsum(np.bincount(bins, minlength = num_bins))[:-1]
+
+	return np.split(kmers[order], boundaries)
+
+
+def num_groups(num_shards, shards_per_group):
+
+	return int(math.ceil(num_shards / float(shards_per_group)))
+
+
+def _partition_batch(args):
+
+	(sequences, k_size, num_shards, shards_per_group) = args
+	kmers = canonical_kmers(sequences, k_size)
+	groups = shard_of(kmers, num_shards) // shards_per_group
+
+	return split_by(kmers, groups, num_groups(num_shards, shards_per_group))
+
+
+def write_parts(parts, files):
+
+	for (f, kmers) in zip(files, parts):
+		kmers.tofile(f)
+
+	return
+
+
+def split_group(group_path, shard_paths, first_shard, num_shards,
+	chunk_size = DEFAULT_BATCH_BASES):
+
+	"""
+	Moves the k-mers in the file stored at group_path into the files at shard_paths, which
+	hold shards first_shard onwards (of num_shards), reading chunk_size k-mers at a time.
+	"""
+
+	shard_files = [open(path, "wb") for path in shard_paths]
+	try:
+		with open(group_path, "rb") as group_file:
+			while True:
+				kmers = np.fromfile(group_file, dtype = np.uint64, count = chunk_size)
+				if len(kmers) == 0:
+					break
+				write_parts(split_by(kmers, shard_of(kmers, num_shards) - first_shard,
+					len(shard_paths)), shard_files)
+	finally:
+		for shard_file in shard_files:
+			shard_file.close()
+
+	os.remove(group_path)
+
+	return
+
+
+def _count_shard(shard_path):
+
+	"""
+	Returns an array whose ith element is the number of distinct k-mers in the shard which
+	occur i times.
+	"""
+
+	kmers = np.fromfile(shard_path, dtype = np.uint64)
+	os.remove(shard_path)
+	if len(kmers) == 0:
+		return np.zeros(1, dtype = np.int64)
+
+	kmers.sort()
+	starts = np.flatnonzero(np.concatenate(([True], kmers[1:] != kmers[:-1])))
+	counts = np.diff(np.concatenate((starts, [len(kmers)])))
+
+	return np.bincount(counts)
+
+
+def choose_num_shards(input_file_path, processors, memory_limit):
+
+	"""
+	Returns enough shards that every worker can hold one in memory (allowing twice the space
+	of the k-mers for sorting) while staying within memory_limit bytes overall.
+	"""
+
+	# Each input byte gives at most one 8 byte k-mer
+	estimated_bytes = 0
+	for path in expand_inputs(input_file_path):
+		scale = 1 if detect_compression(path) is None else COMPRESSION_RATIO
+		estimated_bytes += 8 * scale * os.path.getsize(path)
+	per_worker_limit = max(1, memory_limit // (2 * processors))
+
+	return max(processors, int(math.ceil(estimated_bytes / float(per_worker_limit))))
+
+
+def max_open_shards():
+
+	"""
+	Returns how many shard files may be open at once: no more than MAX_OPEN_SHARDS, and
+	RESERVED_FILES fewer than this process may open.
+	"""
+
+	(soft_limit, hard_limit) = resource.getrlimit(resource.RLIMIT_NOFILE)
+	if soft_limit == resource.RLIM_INFINITY:
+		return MAX_OPEN_SHARDS
+
+	return max(1, min(MAX_OPEN_SHARDS, soft_limit - RESERVED_FILES))
+
+
+def count_histogram(input_file_path, k_size, processors = 1, memory_limit = 1024 ** 3,
+	high = DEFAULT_HIGH, tmp_dir = None, batch_bases = DEFAULT_BATCH_BASES):
+
+	"""
+	Counts the canonical k-mers of length k_size in the FASTA/FASTQ files given by
+	'input_file_path' (see inputs.expand_inputs), for use when Jellyfish is not available,
+	and returns the Histogram of their counts (the same as 'jellyfish histo' gives after
+	'jellyfish count -C').
+
+	Reads are streamed from the files in batches (compressed files being decompressed by a
+	process of their own as they are read), and a pool of 'processors' worker
+	processes converts each batch into 2-bit encoded canonical k-mers. These are
+	partitioned by hash into shard files on disk, so that only one shard per worker needs
+	to be held in memory while the k-mers in it are counted. When there are more shards
+	than files may be open at once (see max_open_shards), the k-mers are partitioned in two
+	passes: first into groups of shards, then each group into its shards.
+	"""
+
+	if not 1 <= k_size <= MAX_K:
+		raise Exception("Native counter only supports k-mer sizes from 1 to " + str(MAX_K))
+
+	num_shards = choose_num_shards(input_file_path, processors, memory_limit)
+	open_limit = max_open_shards()
+	if num_shards > open_limit ** 2:
+		raise Exception("Native counter would need " + str(num_shards) + " shard files, " +
+			"more than the limit on open files allows: raise the memory limit")
+
+	# With more shards than can be open at once, k-mers are first partitioned into groups
+	# of shards, each of which is then split into its shards
+	shards_per_group = 1 if num_shards <= open_limit else open_limit
+	shard_dir = tempfile.mkdtemp(prefix = "k_mer_shards_", dir = tmp_dir)
+	shard_paths = [os.path.join(shard_dir, "shard_" + str(i)) for i in xrange(num_shards)]
+	group_paths = shard_paths
+	if shards_per_group > 1:
+		group_paths = [os.path.join(shard_dir, "group_" + str(i))
+			for i in xrange(num_groups(num_shards, shards_per_group))]
+
+	pool = multiprocessing.Pool(processors)
+	try:
+		group_files = [open(path, "wb") for path in group_paths]
+
+		# Keep a bounded number of batches in flight, so the whole input is never in memory
+		in_flight = collections.deque()
+		for batch in read_batches(input_file_path, batch_bases):
+			in_flight.append(pool.apply_async(_partition_batch,
+				((batch, k_size, num_shards, shards_per_group),)))
+			if len(in_flight) >= 2 * processors:
+				write_parts(in_flight.popleft().get(), group_files)
+		while in_flight:
+			write_parts(in_flight.popleft().get(), group_files)
+
+		for group_file in group_files:
+			group_file.close()
+
+		if shards_per_group > 1:
+			for (group, group_path) in enumerate(group_paths):
+				first_shard = group * shards_per_group
+				split_group(group_path, shard_paths[first_shard:first_shard +
+					shards_per_group], first_shard, num_shards, batch_bases)
+
+		count_of_counts = np.zeros(1, dtype = np.int64)
+		for shard_counts in pool.imap_unordered(_count_shard, shard_paths):
+			if len(shard_counts) > len(count_of_counts):
+				count_of_counts = np.concatenate((count_of_counts,
+					np.zeros(len(shard_counts) - len(count_of_counts), dtype = np.int64)))
+			count_of_counts[:len(shard_counts)] += shard_counts
+
+	finally:
+		pool.terminate()
+		shutil.rmtree(shard_dir, ignore_errors = True)
+
+	occurrences = np.arange(len(count_of_counts), dtype = np.int64)
+	occurrences[occurrences > high] = high + 1
+
+	return Histogram.from_arrays(occurrences, count_of_counts)
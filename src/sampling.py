@@ -0,0 +1,100 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import numpy as np
+
+from histogram import Histogram
+
+
+class HistogramSampler(object):
+
+	"""
+	Draws k-mer words at random from a Histogram, where each occurrence is weighted by the
+	number of k-mer words it accounts for (occurrence * frequency).
+
+	The cumulative distribution is computed once on construction, so any number of samples
+	can then be drawn from it. Passing the same seed gives the same samples.
+	"""
+
+	def __init__(self, hist, seed = None):
+
+		(occurrences, frequencies) = hist.items()
+		words = occurrences * frequencies
+		observed = words > 0
+
+		self.occurrences = occurrences[observed]
+		self.cumulative_words = np.cumsum(words[observed])
+
+		if len(self.cumulative_words) == 0:
+			raise Exception("Cannot sample from an empty histogram")
+
+		self.total_kmer_words = int(self.cumulative_words[-1])
+		self.probabilities = words[observed] / float(self.total_kmer_words)
+		self.random_state = np.random.RandomState(seed)
+
+
+	def sample_counts(self, sample_size):
+
+		"""
+		Returns an array holding the number of the 'sample_size' draws which fell in each
+		occurrence (aligned with self.occurrences).
+		"""
+
+		return self.random_state.multinomial(sample_size, self.probabilities)
+
+
+	def sample(self, sample_size):
+
+		"""
+		Draws 'sample_size' k-mer words in a single batch, and returns the number of draws
+		which fell in each occurrence as a Histogram.
+		"""
+
+		return Histogram.from_arrays(self.occurrences, self.sample_counts(sample_size))
+
+
+	def iter_draws(self, sample_size, chunk_size = 10**6):
+
+		"""
+		Generator which yields the occurrences of 'sample_size' individual draws, in arrays
+		of at most 'chunk_size' elements, so that very large samples need not be held in
+		memory at once.
+		"""
+
+		remaining = sample_size
+		while remaining > 0:
+			n = min(chunk_size, remaining)
+			words = self.random_state.randint(1, self.total_kmer_words + 1, size = n,
+				dtype = np.int64)
+			yield self.occurrences[np.searchsorted(self.cumulative_words, words)]
+			remaining -= n
+
+
+	def bootstrap(self, sample_size, num_samples):
+
+		"""
+		Generator which yields 'num_samples' independent samples of size 'sample_size',
+		each as a Histogram.
+		"""
+
+		for i in xrange(num_samples):
+			yield self.sample(sample_size)
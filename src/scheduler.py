@@ -0,0 +1,117 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+import time
+from multiprocessing.pool import ThreadPool
+
+
+def plan_jobs(num_tasks, processors, memory_per_job = 0, memory_limit = 0):
+
+	"""
+	Decides how many tasks to run at once, and how many processors to give each of them.
+	Returns a tuple (num_jobs, processors_per_job).
+
+	At most 'processors' jobs run at once, and if memory_limit is non-zero, no more jobs
+	run at once than fit within it at memory_per_job each. At least one job always runs.
+	"""
+
+	num_jobs = max(1, min(num_tasks, processors))
+
+	if memory_limit > 0 and memory_per_job > 0:
+		num_jobs = max(1, min(num_jobs, memory_limit // memory_per_job))
+
+	return (num_jobs, max(1, processors // num_jobs))
+
+
+def run_concurrently(function, tasks, num_jobs):
+
+	"""
+	Generator which calls 'function' on each of 'tasks' using up to 'num_jobs' threads,
+	yielding (task, result) pairs in the order in which they finish. This is intended for
+	functions which spend their time waiting on external processes.
+	"""
+
+	if num_jobs <= 1:
+		for task in tasks:
+			yield (task, function(task))
+		return
+
+	pool = ThreadPool(num_jobs)
+	try:
+		for pair in pool.imap_unordered(lambda task: (task, function(task)), tasks):
+			yield pair
+	finally:
+		pool.close()
+		pool.join()
+
+
+def fits(demand, in_use, limits):
+
+	"""
+	Returns whether a task needing 'demand' (a tuple of amounts of each resource, such as
+	(processors, memory)) can start while 'in_use' is taken by running tasks, without going
+	over 'limits'. A limit of 0 means that resource is unlimited. A task which needs more
+	than a limit on its own can still start once nothing else is running.
+	"""
+
+	if not any(in_use):
+		return True
+
+	return all(limit <= 0 or used + needed <= limit
+		for (needed, used, limit) in zip(demand, in_use, limits))
+
+
+def run_within_limits(start, tasks, demands, limits, poll_interval = 0.5):
+
+	"""
+	Generator which starts each of 'tasks' with start(task) as soon as its demand (the
+	corresponding element of 'demands', see fits) fits within 'limits' alongside the tasks
+	already running, yielding (task, result) pairs in the order in which they finish. Tasks
+	are considered in order, but a later task may start ahead of one which does not fit yet.
+
+	start(task) must return an object whose poll() method returns None while the task is
+	running, and its result once it has finished. This is intended for tasks run in
+	processes of their own (e.g. subprocess.Popen objects).
+	"""
+
+	pending = list(zip(tasks, demands))
+	running = []
+	in_use = tuple(0 for limit in limits)
+
+	while pending or running:
+		for (task, demand) in list(pending):
+			if fits(demand, in_use, limits):
+				pending.remove((task, demand))
+				running.append((task, demand, start(task)))
+				in_use = tuple(used + needed for (used, needed) in zip(in_use, demand))
+
+		finished = False
+		for (task, demand, handle) in list(running):
+			result = handle.poll()
+			if result is not None:
+				running.remove((task, demand, handle))
+				in_use = tuple(used - needed for (used, needed) in zip(in_use, demand))
+				finished = True
+				yield (task, result)
+
+		if not finished:
+			time.sleep(poll_interval)
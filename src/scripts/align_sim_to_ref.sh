@@ -21,13 +21,17 @@
 ################################################################################
 
 
+# Stop at the first command which fails, exiting with its status, so that the caller
+# can tell the run failed
+set -e
+
 REFERENCE=$1
 REFERENCE_NAME=${REFERENCE##*/}
 REFERENCE_NAME=${REFERENCE_NAME%*.*}
 
 REPEATS=$2
 REPEATS_NAME=${REPEATS##*/}
-REPEATS_NAME=${REPEATS_NAME%*.*}
+REPEATS_NAME=${REPEATS_NAME%%.*}
 
 PEAK_NUM=$3 
 MAIN_LOC=$4
@@ -42,7 +46,10 @@ WORKING_DIR=$PWD"/"$REPEATS_NAME"_reads"
 K_SIZE=$5
 NUM_PROCESSORS=$6
 
-cd $WORKING_DIR"/peak_"$PEAK_NUM
+# Optional: directory holding this peak's contigs
+PEAK_DIR=${7:-$WORKING_DIR"/peak_"$PEAK_NUM}
+
+cd "$PEAK_DIR"
 
 # Generate hash of reference if requried (but hopefully will already be there)
 if [ ! -f $HASH_LOCATION".smi" ] || [ ! -f $HASH_LOCATION".sma" ]; then
@@ -50,9 +57,8 @@ if [ ! -f $HASH_LOCATION".smi" ] || [ ! -f $HASH_LOCATION".sma" ]; then
 fi
 
 $SMALT_BIN map -m 200 -f ssaha -n $NUM_PROCESSORS -O -d 0 \
-	$HASH_LOCATION "contigs.fastq" > "peak_"$PEAK_NUM"_map"
+	$HASH_LOCATION "contigs.fastq" > "peak_"$PEAK_NUM"_map.tmp"
+mv "peak_"$PEAK_NUM"_map.tmp" "peak_"$PEAK_NUM"_map"
 
 #grep "alignment:S:00" "peak_"$PEAK_NUM"_map" > "grepped"
 #mv "grepped" "peak_"$PEAK_NUM"_map"
-
-cd ../..
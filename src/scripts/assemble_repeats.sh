@@ -18,9 +18,13 @@
 ################################################################################
 
 
+# Stop at the first command which fails, exiting with its status, so that the caller
+# can tell the run failed
+set -e
+
 REPEATS=$1
 REPEATS_NAME=${REPEATS##*/}
-REPEATS_NAME=${REPEATS_NAME%*.*}
+REPEATS_NAME=${REPEATS_NAME%%.*}
 
 PEAK_NUM=$2
 
@@ -29,18 +33,28 @@ RENAME_FASTQ_BIN=$MAIN_LOC"/../bin/rename_fastq"
 
 ASSEMBLER=$4 # Can be either 'soap' or 'spades'
 
-WORKING_DIR=$PWD"/"$REPEATS_NAME"_reads"
-
-ASSEMBLY_CONFIG_LOCATION=$MAIN_LOC"/scripts/assembly_config"
-
-cd $WORKING_DIR
-
 K_SIZE=$5
 NUM_PROCESSORS=$6
 
 ASSEMBLER_BIN=$7
 GAP_CLOSER_BIN=$8
 
+# Optional: a directory of this peak's own, and its own assembly config. When these are
+# given, several peaks may be assembled at once.
+PEAK_DIR=$9
+ASSEMBLY_CONFIG_LOCATION=${10:-$MAIN_LOC"/scripts/assembly_config"}
+
+# Optional: the k-mer words to assemble (FASTQ or FASTA, possibly gzipped)
+READS=${11:-"peak_"$PEAK_NUM"_k_mers-read.fastq"}
+
+if [ -n "$PEAK_DIR" ]; then
+	WORKING_DIR=$PEAK_DIR
+else
+	WORKING_DIR=$PWD"/"$REPEATS_NAME"_reads"
+fi
+
+cd "$WORKING_DIR"
+
 if [ $ASSEMBLER = "soap" ]; then
 	$ASSEMBLER_BIN all -s $ASSEMBLY_CONFIG_LOCATION -K $K_SIZE -k $K_SIZE -o "k"$K_SIZE \
 		-p $NUM_PROCESSORS > "k"$K_SIZE".all.err"
@@ -58,18 +72,20 @@ if [ $ASSEMBLER = "soap" ]; then
 fi
 
 if [ $ASSEMBLER = "spades" ]; then
-	$ASSEMBLER_BIN --s1 "peak_"$PEAK_NUM"_k_mers-read.fastq" -t $NUM_PROCESSORS \
+	# Left behind if an earlier run was interrupted
+	rm -rf "out-spades"
+	$ASSEMBLER_BIN --s1 "$READS" -t $NUM_PROCESSORS \
 		-o "out-spades"
 	mv "out-spades/contigs.fasta" "k"$K_SIZE".fasta"
 	rm -rf "out-spades"
 fi
 
-rm "peak_"$PEAK_NUM"_k_mers-read.fasta"
-
-$RENAME_FASTQ_BIN -name contig -len 200 "k"$K_SIZE".fasta" "contigs.fastq"
+# Only moved into place once complete, so that an interrupted run is never taken as finished
+$RENAME_FASTQ_BIN -name contig -len 200 "k"$K_SIZE".fasta" "contigs.fastq.tmp"
+mv "contigs.fastq.tmp" "contigs.fastq"
 rm "k"$K_SIZE".fasta"
 
-mkdir "peak_"$PEAK_NUM
-find . -maxdepth 1 -type f -exec mv {} ./"peak_"$PEAK_NUM/ \;
-
-cd ..
+if [ -z "$PEAK_DIR" ]; then
+	mkdir -p "peak_"$PEAK_NUM
+	find . -maxdepth 1 -type f -exec mv {} ./"peak_"$PEAK_NUM/ \;
+fi
@@ -0,0 +1,100 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Times the native k-mer counter against Jellyfish on the same input, and checks that both
+# give the same histogram. Run from the src directory as:
+#
+#     python -m scripts.benchmark_counters <reads> <k> [-p processors] [--jellyfish-bin path]
+
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import native_counter
+from histogram import Histogram
+
+
+def time_jellyfish(jellyfish_bin_path, input_file_path, k_size, processors, hash_size):
+
+	work_dir = tempfile.mkdtemp(prefix = "k_mer_benchmark_")
+	mer_count_file = os.path.join(work_dir, "mer_counts.jf")
+
+	try:
+		start = time.time()
+		subprocess.check_call([jellyfish_bin_path, "count", "-m", str(k_size), "-s",
+			str(hash_size), "-t", str(processors), "-C", input_file_path, "-o",
+			mer_count_file])
+		histo_output = subprocess.Popen([jellyfish_bin_path, "histo", mer_count_file],
+			stdout = subprocess.PIPE).communicate()[0]
+		elapsed = time.time() - start
+	finally:
+		shutil.rmtree(work_dir, ignore_errors = True)
+
+	return (Histogram.from_string(histo_output), elapsed)
+
+
+def time_native(input_file_path, k_size, processors, memory_limit):
+
+	start = time.time()
+	hist = native_counter.count_histogram(input_file_path, k_size, processors, memory_limit)
+
+	return (hist, time.time() - start)
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description = "Benchmark the native k-mer counter \
+		against Jellyfish")
+	parser.add_argument("path", type = str, help = "FASTA/FASTQ file to count")
+	parser.add_argument("k", type = int, help = "k-mer size")
+	parser.add_argument("-p", "--processors", type = int, default = 1)
+	parser.add_argument("-s", "--hash-size", type = int, default = 100000000)
+	parser.add_argument("--native-memory", type = int, default = 1024,
+		help = "memory limit in MB for the native counter")
+	parser.add_argument("--jellyfish-bin", type = str, default = "",
+		help = "location of Jellyfish executable (omit to time the native counter alone)")
+	args = parser.parse_args()
+
+	(native_hist, native_time) = time_native(args.path, args.k, args.processors,
+		args.native_memory * 1024 ** 2)
+	print "native:    %8.2fs  %d distinct k-mers" % (native_time, native_hist.distinct_kmers())
+
+	if args.jellyfish_bin != "":
+		(jellyfish_hist, jellyfish_time) = time_jellyfish(args.jellyfish_bin, args.path,
+			args.k, args.processors, args.hash_size)
+		print "jellyfish: %8.2fs  %d distinct k-mers" % (jellyfish_time,
+			jellyfish_hist.distinct_kmers())
+
+		if native_hist == jellyfish_hist:
+			print "Histograms match"
+		else:
+			print "ERROR: Histograms differ"
+
+	return
+
+
+if __name__ == "__main__":
+	main()
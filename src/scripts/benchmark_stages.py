@@ -0,0 +1,297 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Times each analysis and I/O stage on synthetic data (see scripts/synthetic.py) at several
+# scales, measuring wall time, CPU time and memory, and saves the results as JSON so that
+# runs on different versions can be compared. Run from the src directory as:
+#
+#     python -m scripts.benchmark_stages [-s small medium] [--json results.json]
+#         [--compare previous.json]
+#
+# Each stage runs in its own forked process, so that the peak memory of one stage does not
+# hide that of the next. If any stage raises an exception, the results are still saved,
+# but the run exits with a non-zero status.
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+import main
+import scripts.parse_dat_to_histo as parse_data
+from histogram import Histogram
+from scripts import synthetic
+
+
+K_SIZE = 21
+
+# Shape of the synthetic spectra: evenly spaced peaks, well clear of the error peak, which
+# find_extrema finds at every scale (for the default seed, and most others)
+SPECTRUM_SHAPE = {"coverage": 50, "heterozygosity": 0, "repeat_fraction": 0.3,
+	"dispersion": 10}
+
+SCALES = {
+	"small": {"distinct_kmers": 10**5, "tail_length": 10**3, "reference_length": 2 * 10**4},
+	"medium": {"distinct_kmers": 10**6, "tail_length": 10**4, "reference_length": 10**5},
+	"large": {"distinct_kmers": 10**7, "tail_length": 10**5, "reference_length": 5 * 10**5},
+}
+
+
+def prepare_inputs(work_dir, scale, seed):
+
+	"""
+	Writes the synthetic inputs for 'scale' to work_dir, returning a dict of the spectrum
+	and the paths of the files written.
+	"""
+
+	parameters = SCALES[scale]
+	hist = synthetic.synthetic_spectrum(parameters["distinct_kmers"],
+		tail_length = parameters["tail_length"], seed = seed, **SPECTRUM_SHAPE)
+
+	hgram_path = os.path.join(work_dir, "synthetic_" + str(K_SIZE) + "mer.hgram")
+	with open(hgram_path, "w") as f:
+		f.write(hist.to_string())
+
+	# The same spectrum in the .dat format read by parse_dat_to_histo
+	dat_path = os.path.join(work_dir, "synthetic_dat.dat")
+	(occurrences, frequencies) = hist.items()
+	with open(dat_path, "w") as f:
+		f.write("hist:     0            0\n")
+		f.write("".join("hist: %5d %12d\n" % pair
+			for pair in zip(occurrences.tolist(), frequencies.tolist())))
+
+	reference = synthetic.synthetic_reference(parameters["reference_length"], seed = seed)
+	reference_path = os.path.join(work_dir, "synthetic_reference.fasta")
+	synthetic.write_fasta([("synthetic", reference)], reference_path)
+
+	reads_path = os.path.join(work_dir, "synthetic_reads.fastq")
+	num_reads = synthetic.write_reads(reference, reads_path, seed = seed)
+
+	return {"hist": hist, "hgram_path": hgram_path, "dat_path": dat_path,
+		"reference_path": reference_path, "reads_path": reads_path, "num_reads": num_reads}
+
+
+STAGES = [
+	("hgram_read", lambda data: Histogram.from_hgram(data["hgram_path"])),
+	("hgram_write", lambda data: data["hist"].to_string()),
+	("parse_dat_to_histo", lambda data: parse_data.parse(data["dat_path"])),
+	("pad_data", lambda data: main.pad_data(data["hist"])),
+	("find_extrema", lambda data: main.find_extrema(data["hist"], 3)),
+	("generate_sample", lambda data: main.generate_sample(data["hist"],
+		data["hist"].total_kmer_words() // 10, seed = 1)),
+	("calculate_hist_dict_hgram", lambda data: main.calculate_hist_dict(data["hgram_path"],
+		K_SIZE, 1, 10**6, False, use_cache = False)),
+	("calculate_hist_dict_reads", lambda data: main.calculate_hist_dict(data["reads_path"],
+		K_SIZE, 2, 10**6, True, use_cache = False, counter = "native")),
+]
+
+
+def current_rss():
+
+	"""
+	Returns the resident set size of this process in bytes, or None if it is not known.
+	"""
+
+	try:
+		with open("/proc/self/statm", "r") as f:
+			return int(f.read().split()[1]) * resource.getpagesize()
+	except (IOError, IndexError, ValueError):
+		return None
+
+
+def maxrss_bytes(who):
+
+	# ru_maxrss is in bytes on OS X, but kilobytes elsewhere
+	scale = 1 if sys.platform == "darwin" else 1024
+
+	return resource.getrusage(who).ru_maxrss * scale
+
+
+def _measure(stage, data, connection):
+
+	try:
+		baseline = current_rss()
+		start_usage = resource.getrusage(resource.RUSAGE_SELF)
+		start_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+		start = time.time()
+
+		# A stage which raises is still timed and reported, but fails the run (see
+		# failed_stages)
+		error = None
+		try:
+			stage(data)
+		except Exception as e:
+			error = repr(e)
+
+		wall = time.time() - start
+		end_usage = resource.getrusage(resource.RUSAGE_SELF)
+		end_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+		cpu = (end_usage.ru_utime - start_usage.ru_utime) + \
+			(end_usage.ru_stime - start_usage.ru_stime) + \
+			(end_children.ru_utime - start_children.ru_utime) + \
+			(end_children.ru_stime - start_children.ru_stime)
+		peak = maxrss_bytes(resource.RUSAGE_SELF)
+
+		connection.send({"wall_seconds": wall, "cpu_seconds": cpu, "error": error,
+			"peak_rss_mb": peak / 1024.0 ** 2,
+			"rss_increase_mb": None if baseline is None else (peak - baseline) / 1024.0 ** 2,
+			"children_peak_rss_mb": maxrss_bytes(resource.RUSAGE_CHILDREN) / 1024.0 ** 2})
+	finally:
+		connection.close()
+
+
+def measure_stage(stage, data):
+
+	"""
+	Runs stage(data) in a forked process, returning a dict of its wall time, CPU time
+	(including any processes it started) and memory use.
+	"""
+
+	(receiver, sender) = multiprocessing.Pipe(False)
+	process = multiprocessing.Process(target = _measure, args = (stage, data, sender))
+	process.start()
+	sender.close()
+	result = receiver.recv()
+	process.join()
+
+	return result
+
+
+def run_benchmarks(scales, repeats, seed):
+
+	results = {}
+	for scale in scales:
+		work_dir = tempfile.mkdtemp(prefix = "k_mer_benchmark_")
+		cwd = os.getcwd()
+		try:
+			# Stages which write files write them to the working directory
+			os.chdir(work_dir)
+			data = prepare_inputs(work_dir, scale, seed)
+
+			stages = {}
+			for (name, stage) in STAGES:
+				runs = [measure_stage(stage, data) for i in xrange(repeats)]
+				stages[name] = min(runs, key = lambda run: run["wall_seconds"])
+				print "%-8s %-28s %s" % (scale, name, format_result(stages[name]))
+
+			results[scale] = {"inputs": {"distinct_kmers": data["hist"].distinct_kmers(),
+				"max_occurrence": data["hist"].max_occurrence,
+				"reference_length": SCALES[scale]["reference_length"],
+				"num_reads": data["num_reads"]}, "stages": stages}
+		finally:
+			os.chdir(cwd)
+			shutil.rmtree(work_dir, ignore_errors = True)
+
+	return results
+
+
+def format_result(result):
+
+	formatted = "%9.3fs wall %9.3fs cpu %9.1f MB peak" % (result["wall_seconds"],
+		result["cpu_seconds"], result["peak_rss_mb"])
+	if result["error"] is not None:
+		formatted += "  (" + result["error"] + ")"
+
+	return formatted
+
+
+def compare_results(previous, current):
+
+	"""
+	Prints the ratio of the current to the previous wall time of each stage run in both.
+	"""
+
+	print
+	print "Wall time relative to " + previous.get("label", "previous run") + ":"
+	for (scale, scale_results) in sorted(current["scales"].items()):
+		old_stages = previous.get("scales", {}).get(scale, {}).get("stages", {})
+		for (name, result) in sorted(scale_results["stages"].items()):
+			old = old_stages.get(name, {})
+			if old.get("wall_seconds"):
+				print "%-8s %-28s %6.2fx" % (scale, name,
+					result["wall_seconds"] / old["wall_seconds"])
+
+	return
+
+
+def failed_stages(results):
+
+	"""
+	Returns a list of the (scale, stage, error) of every stage which raised an exception.
+	"""
+
+	return [(scale, name, result["error"])
+		for (scale, scale_results) in sorted(results["scales"].items())
+		for (name, result) in sorted(scale_results["stages"].items())
+		if result["error"] is not None]
+
+
+def main_benchmark():
+
+	parser = argparse.ArgumentParser(description = "Benchmark each analysis and I/O stage \
+		on synthetic data")
+	parser.add_argument("-s", "--scales", type = str, nargs = "+", default = ["small"],
+		choices = sorted(SCALES.keys()), help = "sizes of data to use (default: small)")
+	parser.add_argument("-n", "--repeats", type = int, default = 1,
+		help = "number of times to run each stage, keeping the fastest (default: 1)")
+	parser.add_argument("--seed", type = int, default = 1)
+	parser.add_argument("--label", type = str, default = "",
+		help = "name for this run in the results (e.g. a version or commit)")
+	parser.add_argument("--json", type = str, default = "",
+		help = "file in which to save the results")
+	parser.add_argument("--compare", type = str, default = "",
+		help = "results of a previous run to compare against")
+	args = parser.parse_args()
+
+	results = {"label": args.label, "python": sys.version.split()[0],
+		"numpy": np.__version__, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"repeats": args.repeats, "seed": args.seed,
+		"scales": run_benchmarks(args.scales, args.repeats, args.seed)}
+
+	if args.json != "":
+		with open(args.json, "w") as f:
+			json.dump(results, f, indent = 2, sort_keys = True)
+
+	if args.compare != "":
+		with open(args.compare, "r") as f:
+			compare_results(json.load(f), results)
+
+	failures = failed_stages(results)
+	if failures != []:
+		for (scale, name, error) in failures:
+			sys.stderr.write("FAILED: " + scale + " " + name + ": " + error + "\n")
+		sys.exit(1)
+
+	return
+
+
+if __name__ == "__main__":
+	main_benchmark()
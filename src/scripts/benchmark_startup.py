@@ -0,0 +1,150 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Times how long each subcommand of main.py takes to start up, i.e. to load main.py and
+# the modules that subcommand imports lazily, each in a fresh interpreter. Run from the src
+# directory as:
+#
+#     python -m scripts.benchmark_startup [-n repeats] [--json results.json]
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+# Modules which main.py only imports once a subcommand needs them
+SUBCOMMAND_IMPORTS = {
+	"plot": ["matplotlib.pyplot"],
+	"size": [],
+	"repeats": [],
+	"indiv-repeats": [],
+}
+
+# Reports the time taken to import main.py, then each of the given modules, in one process
+IMPORT_TIMER = """
+import sys, time, json
+start = time.time()
+import main
+timings = {"main": time.time() - start}
+for module in sys.argv[1:]:
+	start = time.time()
+	__import__(module)
+	timings[module] = time.time() - start
+print json.dumps(timings)
+"""
+
+
+def src_dir():
+
+	return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_env():
+
+	env = dict(os.environ)
+	# Stop the benchmark from depending on whether a display happens to be available
+	env.setdefault("MPLBACKEND", "Agg")
+
+	return env
+
+
+def time_help(subcommand, repeats):
+
+	"""
+	Returns the wall time of each of 'repeats' runs of 'main.py <subcommand> --help'.
+	"""
+
+	times = []
+	with open(os.devnull, "w") as devnull:
+		for i in xrange(repeats):
+			start = time.time()
+			subprocess.check_call([sys.executable, "main.py", subcommand, "--help"],
+				cwd = src_dir(), env = child_env(), stdout = devnull)
+			times.append(time.time() - start)
+
+	return times
+
+
+def time_imports(modules, repeats):
+
+	"""
+	Returns a list of dicts (one per repeat) of the time taken to import main.py and each
+	of 'modules' in a fresh interpreter.
+	"""
+
+	runs = []
+	for i in xrange(repeats):
+		output = subprocess.check_output([sys.executable, "-c", IMPORT_TIMER] + modules,
+			cwd = src_dir(), env = child_env())
+		runs.append(json.loads(output))
+
+	return runs
+
+
+def median(values):
+
+	values = sorted(values)
+
+	return values[len(values) // 2]
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description = "Benchmark the start up time of each \
+		subcommand")
+	parser.add_argument("-n", "--repeats", type = int, default = 5,
+		help = "number of fresh interpreters to time for each subcommand (default: 5)")
+	parser.add_argument("--json", type = str, default = "",
+		help = "file in which to save the results")
+	args = parser.parse_args()
+
+	results = {"python": sys.version.split()[0], "repeats": args.repeats, "subcommands": {}}
+
+	print "%-15s %10s %10s %10s" % ("subcommand", "--help", "main", "total")
+	for subcommand in sorted(SUBCOMMAND_IMPORTS):
+		help_times = time_help(subcommand, args.repeats)
+		import_runs = time_imports(SUBCOMMAND_IMPORTS[subcommand], args.repeats)
+
+		totals = [sum(run.values()) for run in import_runs]
+		results["subcommands"][subcommand] = {
+			"help_seconds": median(help_times),
+			"import_seconds": dict((module, median([run[module] for run in import_runs]))
+				for module in import_runs[0]),
+			"total_import_seconds": median(totals),
+		}
+
+		print "%-15s %9.3fs %9.3fs %9.3fs" % (subcommand, median(help_times),
+			median([run["main"] for run in import_runs]), median(totals))
+
+	if args.json != "":
+		with open(args.json, "w") as f:
+			json.dump(results, f, indent = 2, sort_keys = True)
+
+	return
+
+
+if __name__ == "__main__":
+	main()
@@ -1,76 +1,98 @@
 ################################################################################
-# Copyright (c) 2015 Genome Research Ltd. 
-#  
-# Author: George Hall <gh10@sanger.ac.uk> 
-# 
-# This file is part of K-mer Toolkit. 
-# 
-# K-mer Toolkit is free software: you can redistribute it and/or modify it under 
-# the terms of the GNU General Public License as published by the Free Software 
-# Foundation; either version 3 of the License, or (at your option) any later 
-# version. 
-#  
-# This program is distributed in the hope that it will be useful, but WITHOUT 
-# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
-# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more 
-# details. 
-#  
-# You should have received a copy of the GNU General Public License along with 
-# this program. If not, see <http://www.gnu.org/licenses/>. 
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
 ################################################################################
 
 
-def parse(input_file_path, k_mer_size):
+import numpy as np
 
+from histogram import Histogram, DEFAULT_DENSE_LIMIT, count_fields
+from hist_cache import atomic_write
+from compression import open_decompressed
+
+
+# Bytes of text read (and parsed) at a time
+CHUNK_SIZE = 2 ** 24
+
+
+def parse_pairs(text, source):
+
+	"""
+	Returns the numbers in 'text', a run of complete lines in either of the formats read by
+	parse, as an array of (occurrence, frequency) rows.
 	"""
-	Takes file stored at 'input_file_path' in .dat format (i.e. formatted such as:)
-	
+
+	text = text.replace("hist:", "     ")
+	values = np.fromstring(text, dtype = np.int64, sep = " ")
+
+	# NumPy stops quietly at anything it cannot read as a number
+	if len(values) != count_fields(text) or len(values) % 2 != 0:
+		raise Exception("Malformed histogram data: " + source)
+
+	return values.reshape(-1, 2)
+
+
+def parse(input_file_path, out_path = None, chunk_size = CHUNK_SIZE,
+	dense_limit = DEFAULT_DENSE_LIMIT):
+
+	"""
+	Returns a Histogram of the data in the file stored at 'input_file_path', which may be
+	either in .dat format (i.e. formatted such as:)
+
 	hist:     0            0
 	hist:     1      7919008
 	hist:     2       404988
 	hist:     3       109952
-	
-	and saves the data in the same format as is returned by compute_histogram(),
-	for example if the above file were passed, it would be saved in the format:
-	
+
+	or in the format output by 'jellyfish histo' (as saved in .hgram files), for example:
+
 	1 7919008
 	2 404988
 	3 109952
-	
-	A file passed in as foo.* will be saved in '/lustre/scratch110/sanger/gh10/hgram_data'
-	as foo_nmer.hgram, where n = k_mer_size.
-	
-	It is worth noting that, as the k-mers corresponding to the file which is being read have 
-	already been counted, the k_mer_size variable is used merely to catalogue the k-mer size 
-	used. It is the user's responsibility to  record this number. 
 
+	The file may be compressed with gzip, bzip2 or xz. It is read chunk_size bytes at a
+	time, each chunk being parsed by NumPy in one go, so the whole text is never held in
+	memory at once. If out_path is given, the histogram is also saved there in .hgram format.
 	"""
-	
-	file_name = input_file_path.split("/")[-1].split(".")[0] + "_" + str(k_mer_size) + "mer"
-	
-	with open("/".join(input_file_path.split("/")[:-1]) + "/" + file_name + ".hgram", 'w') \
-		as to_write: 
-	
-		with open(input_file_path,"r") as f:
-			file_lines = f.readlines()
-	
-		line_count = sum(1 for line in file_lines)
-	
-		iCount = 0
-		for line in file_lines:
-			storeStr = ""
-			iCount += 1
-			
-			for word in line.split(" "):
-				if len(word) == 0 or str(word) in ['0', '0\n']:
-					pass
-				elif word[0].isdigit() and storeStr == "":
-					storeStr += str(word) + " "
-				elif word[0].isdigit():
-					storeStr += str(word)[:-1]
-			if iCount == line_count:
-				storeStr += "0" 
-
-			if len(storeStr) > 0:
-				to_write.write(storeStr + "\n")
 
+	pairs = []
+	with open_decompressed(input_file_path) as f:
+		remainder = ""
+		while True:
+			chunk = f.read(chunk_size)
+			if chunk == "":
+				break
+
+			# Only whole lines are parsed, with any partial last line kept for the next chunk
+			end = chunk.rfind("\n") + 1
+			if end == 0:
+				remainder += chunk
+				continue
+			pairs.append(parse_pairs(remainder + chunk[:end], input_file_path))
+			remainder = chunk[end:]
+
+		pairs.append(parse_pairs(remainder, input_file_path))
+
+	pairs = np.concatenate(pairs)
+	hist = Histogram.from_arrays(pairs[:, 0], pairs[:, 1], dense_limit)
+
+	if out_path is not None:
+		atomic_write(out_path, hist.to_string())
+
+	return hist
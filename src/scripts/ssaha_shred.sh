@@ -21,6 +21,10 @@
 ################################################################################
 
 
+# Stop at the first command which fails, exiting with its status, so that the caller
+# can tell the run failed
+set -e
+
 REFERENCE=$1
 REFERENCE_NAME=${REFERENCE##*/}
 REFERENCE_NAME=${REFERENCE_NAME%*.*}
@@ -48,7 +52,5 @@ if [ ! -f $HASH_LOCATION".smi" ] || [ ! -f $HASH_LOCATION".sma" ]; then
 fi
 
 $SMALT_BIN map -m 20 -f ssaha -n $NUM_CPUS -O -d 0 \
-	$HASH_LOCATION $REFERENCE_NAME"-shred-"$SHRED_SIZE"bp.fasta" > "shred_map"
-
-cd ..
-
+	$HASH_LOCATION $REFERENCE_NAME"-shred-"$SHRED_SIZE"bp.fasta" > "shred_map.tmp"
+mv "shred_map.tmp" "shred_map"
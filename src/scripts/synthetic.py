@@ -0,0 +1,159 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+# Generators of synthetic data with a known shape, for benchmarking: k-mer spectra built
+# from a mixture of negative binomials, and small reference/read set pairs.
+
+
+import numpy as np
+from scipy.special import gammaln
+
+from histogram import Histogram
+
+
+BASES = np.array(list("ACGT"))
+
+
+def negative_binomial_pmf(occurrences, mean, dispersion):
+
+	"""
+	Returns the probability of each of 'occurrences' under a negative binomial distribution
+	with the given mean and dispersion (smaller dispersions give wider peaks).
+	"""
+
+	occurrences = np.asarray(occurrences, dtype = np.float64)
+	p = dispersion / float(dispersion + mean)
+
+	return np.exp(gammaln(occurrences + dispersion) - gammaln(dispersion) -
+		gammaln(occurrences + 1) + dispersion * np.log(p) + occurrences * np.log(1 - p))
+
+
+def synthetic_spectrum(distinct_kmers = 10**6, coverage = 30, heterozygosity = 0.01,
+	repeat_fraction = 0.05, max_copies = 5, error_fraction = 0.5, dispersion = 20,
+	tail_length = 10**4, background_fraction = 0.02, background_exponent = 1.5, seed = None):
+
+	"""
+	Returns a Histogram shaped like the k-mer spectrum of a real read set:
+
+	- an error peak of error_fraction * distinct_kmers k-mers, falling away geometrically
+	  from occurrence 1;
+	- a heterozygous peak at coverage / 2, holding 'heterozygosity' of the genomic k-mers;
+	- the main (homozygous) peak at 'coverage';
+	- repeat peaks at 2 to max_copies times coverage, together holding repeat_fraction of
+	  the genomic k-mers, with each successive peak half the size of the one before;
+	- a background of high-copy k-mers (e.g. from satellites or organelles), falling away
+	  as a power law with background_exponent, which stretches out to tail_length.
+
+	Each peak is a negative binomial with the given dispersion, and the final frequencies
+	are Poisson draws around the expected values.
+	"""
+
+	random_state = np.random.RandomState(seed)
+	max_occurrence = max(tail_length, int(coverage * (max_copies + 2)))
+	occurrences = np.arange(1, max_occurrence + 1)
+
+	repeat_weights = 0.5 ** np.arange(max_copies - 1)
+	repeat_weights = repeat_fraction * repeat_weights / max(repeat_weights.sum(), 1)
+
+	peaks = [(coverage / 2.0, heterozygosity),
+		(float(coverage), 1 - heterozygosity - repeat_fraction)]
+	peaks += [(coverage * float(copies), weight)
+		for (copies, weight) in zip(xrange(2, max_copies + 1), repeat_weights)]
+
+	expected = np.zeros(len(occurrences))
+	for (mean, weight) in peaks:
+		expected += weight * distinct_kmers * negative_binomial_pmf(occurrences, mean,
+			dispersion)
+
+	error_ratio = 0.3
+	expected += error_fraction * distinct_kmers * (1 - error_ratio) * \
+		error_ratio ** (occurrences - 1)
+
+	expected += background_fraction * distinct_kmers * \
+		occurrences.astype(np.float64) ** -background_exponent
+
+	return Histogram.from_arrays(occurrences, random_state.poisson(expected))
+
+
+def synthetic_reference(length = 10**5, repeat_length = 1000, repeat_copies = (2, 3, 5),
+	seed = None):
+
+	"""
+	Returns a random reference sequence of roughly 'length' bases containing, for each n in
+	repeat_copies, a distinct repeat_length base sequence copied n times at random places.
+	"""
+
+	random_state = np.random.RandomState(seed)
+	sequence = BASES[random_state.randint(0, 4, size = length)]
+
+	for copies in repeat_copies:
+		repeat = BASES[random_state.randint(0, 4, size = repeat_length)]
+		for start in random_state.randint(0, max(length - repeat_length, 1), size = copies):
+			sequence[start:start + repeat_length] = repeat
+
+	return "".join(sequence)
+
+
+def write_fasta(sequences, out_path, line_length = 60):
+
+	"""
+	Writes 'sequences' (a list of (name, sequence) pairs) to out_path in FASTA format.
+	"""
+
+	with open(out_path, "w") as out:
+		for (name, sequence) in sequences:
+			out.write(">" + name + "\n")
+			out.write("".join(sequence[i:i + line_length] + "\n"
+				for i in xrange(0, len(sequence), line_length)))
+
+	return
+
+
+def write_reads(reference, out_path, coverage = 20, read_length = 100, error_rate = 0.01,
+	seed = None):
+
+	"""
+	Writes reads sampled uniformly from both strands of 'reference' to out_path in FASTQ
+	format, to the given coverage, with substitution errors at error_rate. Returns the
+	number of reads written.
+	"""
+
+	random_state = np.random.RandomState(seed)
+	complement = {"A": "T", "C": "G", "G": "C", "T": "A"}
+	num_reads = int(coverage * len(reference) / read_length)
+	quality = "I" * read_length
+
+	with open(out_path, "w") as out:
+		for (read_number, start) in enumerate(random_state.randint(0,
+			len(reference) - read_length + 1, size = num_reads)):
+			read = np.array(list(reference[start:start + read_length]))
+
+			errors = random_state.random_sample(read_length) < error_rate
+			read[errors] = BASES[random_state.randint(0, 4, size = errors.sum())]
+
+			read = "".join(read)
+			if random_state.randint(2):
+				read = "".join(complement[base] for base in reversed(read))
+
+			out.write("@read_%d\n%s\n+\n%s\n" % (read_number + 1, read, quality))
+
+	return num_reads
@@ -0,0 +1,45 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+
+from alignments import read_alignments, format_alignment
+
+
+def test_repeat_lines_keep_the_original_tokens(tmpdir):
+
+	lines = ["alignment:F:00 95 shred_1 chr1 1 100 2001 2100 F 100 99.999 100\n",
+		"alignment:R:00 80 shred_1 chr2 3 90 51 138 C 88 97.5 100 extra tokens\n",
+		"alignment:F:07 80 shred_2 chr2 3 90 51 138 F 88 97.50 100\n"]
+	map_path = tmpdir.join("map")
+	map_path.write("header line\n" + "".join(lines))
+
+	alignments = list(read_alignments(str(map_path), "00"))
+
+	assert [alignment.fields() for alignment in alignments] == \
+		[line.split() for line in lines[:2]]
+	for (alignment, line) in zip(alignments, lines):
+		fields = line.split()
+		assert format_alignment(alignment) == " ".join(fields[:3]) + " " + \
+			" ".join(x.rjust(10) for x in fields[3:8]) + " " + " ".join(fields[8:]) + "\n"
+	assert (alignments[1].subject, alignments[1].subject_start, alignments[1].identity) == \
+		("chr2", 51, 97.5)
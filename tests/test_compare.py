@@ -0,0 +1,87 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+
+import os
+
+import numpy as np
+
+from QC import compare
+
+
+def write_masks(directory):
+
+	"""
+	Writes three masks of the same random reference, with different line widths and line
+	endings, and returns their paths.
+	"""
+
+	random_state = np.random.RandomState(5)
+	names = ["chr1 description", "chr2", "chr3"]
+	sequences = [random_state.choice(list("ACGT"), n) for n in [5000, 1, 1237]]
+
+	paths = []
+	for (width, newline) in [(60, "\n"), (61, "\n"), (70, "\r\n")]:
+		records = []
+		for (name, sequence) in zip(names, sequences):
+			sequence = sequence.copy()
+			for run in xrange(random_state.randint(0, 30)):
+				start = random_state.randint(0, len(sequence))
+				sequence[start:start + random_state.randint(1, 500)] = "X"
+			records.append(">" + name + newline + newline.join("".join(sequence[i:i + width])
+				for i in xrange(0, len(sequence), width)) + newline)
+
+		paths.append(os.path.join(directory, "mask_%d.fa" % width))
+		with open(paths[-1], "w") as mask_file:
+			mask_file.write("".join(records))
+
+	return paths
+
+
+def test_records_found_in_any_size_of_chunk(tmpdir):
+
+	paths = write_masks(str(tmpdir))
+	whole = compare.MaskedReference(paths[2], 10 ** 6)
+
+	assert whole.names == ["chr1 description", "chr2", "chr3"]
+	for chunk_size in [1, 2, 7, 64]:
+		chunked = compare.MaskedReference(paths[2], chunk_size)
+		assert (chunked.names, chunked.sequence_starts, chunked.sequence_ends) == \
+			(whole.names, whole.sequence_starts, whole.sequence_ends)
+
+
+def test_comparison_independent_of_block_size(tmpdir):
+
+	paths = write_masks(str(tmpdir))
+	pairs = [(paths[0], paths[1]), (paths[0], paths[2]), (paths[1], paths[2])]
+
+	outputs = []
+	for block_size in [10 ** 6, 1, 3, 60, 61, 1000]:
+		out_dir = tmpdir.mkdir("blocks_%d" % block_size)
+		summaries = [comparison.summary() for comparison in compare.compare_masks(pairs,
+			str(out_dir), block_size)]
+		outputs.append((summaries, dict((name, out_dir.join(name).read())
+			for name in os.listdir(str(out_dir)))))
+
+	assert all(output == outputs[0] for output in outputs[1:])
+	assert len(outputs[0][1]) == 9
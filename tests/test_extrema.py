@@ -0,0 +1,154 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+import numpy as np
+import scipy.signal as spysig
+
+import main
+from extrema import ExtremaEngine
+
+
+class FixedCandidates(object):
+
+	"""
+	Stands in for an ExtremaEngine whose candidate extrema are given.
+	"""
+
+	def __init__(self, min_list, max_list):
+
+		self.lists = (min_list, max_list)
+
+
+	def candidate_extrema(self, window_size, order_num):
+
+		return self.lists
+
+
+def original_walk(min_list, max_list, num_peaks_desired):
+
+	"""
+	The walk through the candidate extrema done by the original estimate_extrema, except
+	that it stops once the maxima run out, rather than repeating the last minimum, and
+	bounds the minimum index by the number of minima rather than of maxima.
+	"""
+
+	store_dict = {'Min': [], 'Max': []}
+	if min_list == []:
+		return store_dict
+
+	store_dict['Min'].append(min_list[0])
+	(iCount, min_index, max_index) = (0, 1, 0)
+	while iCount < num_peaks_desired:
+		if max_index >= len(max_list) or min_index >= len(min_list):
+			break
+		while max_list[max_index] < store_dict['Min'][-1]:
+			max_index += 1
+			if max_index == len(max_list):
+				break
+		else:
+			store_dict['Max'].append(max_list[max_index])
+		if max_index == len(max_list):
+			break
+		while min_list[min_index] < store_dict['Max'][-1]:
+			min_index += 1
+			if min_index == len(min_list):
+				break
+		else:
+			store_dict['Min'].append(min_list[min_index])
+		iCount += 1
+
+	return store_dict
+
+
+def outcome(function, *args):
+
+	try:
+		return function(*args)
+	except Exception as e:
+		return type(e)
+
+
+def test_smoothing_matches_convolution():
+
+	random_state = np.random.RandomState(0)
+	for n in [1, 5, 30, 200]:
+		frequencies = random_state.randint(0, 10 ** 6, n)
+		engine = ExtremaEngine(frequencies)
+		for window_size in [1, 2, 5, 10, 29, 30, 40, 250]:
+			window = np.ones(window_size) / float(window_size)
+			expected = [int(x) for x in np.convolve(frequencies, window, 'same')][:n]
+			assert engine.smoothed(window_size).tolist() == expected
+
+
+def test_candidates_lie_within_the_data():
+
+	engine = ExtremaEngine(np.random.RandomState(1).randint(0, 100, 30))
+	(min_list, max_list) = engine.candidate_extrema(40, 10)
+
+	assert all(0 <= position < 30 for position in min_list + max_list)
+
+
+def test_candidates_match_argrelextrema():
+
+	random_state = np.random.RandomState(2)
+	for trial in xrange(20):
+		engine = ExtremaEngine(random_state.randint(0, 50, random_state.randint(5, 300)))
+		for (window_size, order_num) in [(1, 1), (10, 10), (15, 3), (40, 25)]:
+			smoothed = engine.smoothed(window_size)
+			expected = (spysig.argrelextrema(smoothed, np.less_equal,
+				order = order_num)[0].tolist()[1:], spysig.argrelextrema(smoothed,
+				np.greater_equal, order = order_num)[0].tolist()[1:])
+			assert engine.candidate_extrema(window_size, order_num) == expected
+
+
+def test_walk_matches_original():
+
+	random_state = np.random.RandomState(3)
+	for trial in xrange(5000):
+		(min_list, max_list) = [sorted(random_state.choice(100, random_state.randint(0, 12),
+			replace = False).tolist()) for i in xrange(2)]
+		num_peaks = random_state.randint(1, 6)
+
+		assert outcome(main.estimate_extrema, FixedCandidates(min_list, max_list), 10, 10,
+			num_peaks) == outcome(original_walk, min_list, max_list, num_peaks)
+
+
+def test_no_repeated_minimum_when_maxima_run_out():
+
+	extrema = main.estimate_extrema(FixedCandidates([5, 20], [10]), 10, 10, 3)
+
+	assert extrema == {'Min': [5, 20], 'Max': [10]}
+
+
+def test_minima_walk_is_bounded_by_the_minima():
+
+	# Stepping past the second minimum used to be checked against the number of maxima, so
+	# the walk stopped early and recorded the second maximum twice
+	extrema = main.estimate_extrema(FixedCandidates([5, 20, 40, 60], [10, 30]), 10, 10, 5)
+
+	assert extrema == {'Min': [5, 20, 40], 'Max': [10, 30]}
+
+	# ... or ran off the end of the minima when there were more maxima than minima
+	extrema = main.estimate_extrema(FixedCandidates([5, 20], [10, 30, 50]), 10, 10, 5)
+
+	assert extrema == {'Min': [5, 20], 'Max': [10, 30]}
@@ -0,0 +1,55 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+import main
+from scripts import synthetic
+
+
+def sweep_spectra():
+
+	"""
+	Returns a dict of fixed synthetic spectra for a sweep of k-mer sizes, the k-mer coverage
+	falling with k as it does for reads of 100 bases at 60x.
+	"""
+
+	return dict((k, synthetic.synthetic_spectrum(10 ** 5, 60 * (100 - k + 1) / 100.0,
+		heterozygosity = 0, repeat_fraction = 0.3, dispersion = 10, tail_length = 10 ** 3,
+		seed = k)) for k in range(21, 32, 2))
+
+
+def test_size_finds_the_modes_find_extrema_finds():
+
+	hists_dict = sweep_spectra()
+	estimates = main.estimate_genome_sizes(hists_dict)["estimates"]
+
+	assert [estimate["k"] for estimate in estimates] == sorted(hists_dict)
+	for estimate in estimates:
+		try:
+			expected = main.find_extrema(hists_dict[estimate["k"]], 3)['Max'][0]
+		except Exception:
+			expected = None
+		assert estimate.get("mode") == expected
+		if expected is not None:
+			assert estimate["genome_size"] == estimate["kmer_words"] / expected
+
+	assert any("mode" in estimate for estimate in estimates)
@@ -0,0 +1,74 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+
+import os
+import stat
+
+import hist_cache
+from hist_cache import HistogramCache
+from histogram import Histogram
+
+
+HIST = Histogram.from_dict({1: 100, 2: 40, 5: 3})
+
+
+def test_entries_get_the_permissions_of_new_files(tmpdir):
+
+	cache = HistogramCache(str(tmpdir))
+	cache.put("key", HIST)
+
+	mode = stat.S_IMODE(os.stat(cache._entry_path("key")).st_mode)
+	assert mode == hist_cache.NEW_FILE_MODE
+
+
+def test_damaged_entry_is_a_miss(tmpdir):
+
+	cache = HistogramCache(str(tmpdir))
+	cache.put("key", HIST, family = "reads")
+	with open(cache._entry_path("key"), "wb") as entry_file:
+		entry_file.write("not an array")
+
+	assert cache.get("key") is None
+	assert "key" not in cache._read_index()
+	assert not os.path.exists(cache._entry_path("key"))
+	assert cache.get_family("reads") is None
+
+	cache.put("key", HIST)
+	assert cache.get("key") == HIST
+
+
+def test_hits_only_record_use_after_an_interval(tmpdir):
+
+	cache = HistogramCache(str(tmpdir))
+	cache.put("key", HIST)
+	written = os.stat(cache.index_path).st_ino
+
+	assert cache.get("key") == HIST
+	assert os.stat(cache.index_path).st_ino == written
+
+	index = cache._read_index()
+	index["key"]["last_used"] -= 2 * hist_cache.LAST_USED_INTERVAL
+	hist_cache.atomic_write_json(cache.index_path, index)
+	assert cache.get("key") == HIST
+	assert cache._read_index()["key"]["last_used"] > index["key"]["last_used"]
@@ -0,0 +1,67 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+import sys
+import time
+import subprocess
+
+from instrument import RunReport
+
+
+def child(code):
+
+	return [sys.executable, "-c", code]
+
+
+def test_each_process_reports_its_own_peak():
+
+	report = RunReport()
+	report.call("big", child("s = ' ' * (200 * 2 ** 20)"))
+	report.call("small", child("pass"))
+
+	(big, small) = report.stages
+	assert big["peak_rss_bytes"] > 200 * 2 ** 20
+	assert small["peak_rss_bytes"] < big["peak_rss_bytes"] / 2
+
+
+def test_process_reaped_by_poll_is_recorded():
+
+	report = RunReport()
+	process = report.popen("fails", child("import sys; sys.exit(3)"))
+	while process.poll() is None:
+		time.sleep(0.01)
+
+	assert process.wait() == 3
+	assert report.stages[0]["exit_status"] == 3
+	assert report.stages[0]["cpu_seconds"] >= 0
+	assert report.to_dict()["failed_stages"] == ["fails"]
+
+
+def test_communicate_is_recorded():
+
+	report = RunReport()
+	process = report.popen("echo", child("print 'hi'" if sys.version_info[0] == 2 else
+		"print('hi')"), stdout = subprocess.PIPE)
+
+	assert process.communicate()[0].strip() == b"hi"
+	assert report.stages[0]["exit_status"] == 0
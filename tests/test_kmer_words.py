@@ -0,0 +1,49 @@
+################################################################################
+# Copyright (c) 2015 Genome Research Ltd.
+#
+# Author: George Hall <gh10@sanger.ac.uk>
+#
+# This file is part of K-mer Toolkit.
+#
+# K-mer Toolkit is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+
+
+
+
+import os
+import sys
+import signal
+
+import pytest
+
+from instrument import RunReport
+from kmer_words import extract_peak_words
+
+
+def test_dump_is_stopped_when_its_output_cannot_be_parsed(tmpdir):
+
+	# Stands in for 'jellyfish dump', writing a malformed line and then never finishing
+	jellyfish = tmpdir.join("jellyfish")
+	jellyfish.write("#!" + sys.executable + "\n" +
+		"import sys\nsys.stdout.write('ACGT\\tbad\\n')\nwhile True:\n" +
+		"\tsys.stdout.write('ACGT\\t5\\n' * 1000)\n")
+	jellyfish.chmod(0755)
+
+	report = RunReport()
+	with pytest.raises(ValueError):
+		extract_peak_words("counts.jf", [(2, 10)], [str(tmpdir.join("words.fastq"))],
+			str(jellyfish), report = report)
+
+	assert report.stages[0]["exit_status"] == -signal.SIGKILL